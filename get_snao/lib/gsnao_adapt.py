@@ -0,0 +1,205 @@
+#
+# gsnao_adapt.py
+#  adaptive concurrency of pc-snipe (AIMD)
+#
+
+"""
+    get_snao
+        One of pc-snipe driver of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import datetime
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import gsnao_common_defs as C
+
+#
+# module scope values
+#
+
+# exit codes of pc-snipe counted as timeout (PC or DNS not answering)
+TIMEOUT_CODES = [
+    C.ERRCODE_NOSNMP,
+    C.ERRCODE_SYS_DNS
+]
+
+# exit codes of pc-snipe counted as Snipe-IT error
+API_ERROR_CODES = [
+    C.ERRCODE_SYS_API
+]
+
+# decrease when the timeout rate is over this
+TIMEOUT_RATE_MAX = 0.2
+
+# decrease when the Snipe-IT error rate is over this
+API_ERROR_RATE_MAX = 0.05
+
+# multiplicative decrease
+DECREASE_TIMEOUT = 0.75
+DECREASE_API     = 0.5
+
+# additive increase
+INCREASE = 1
+
+#
+# functions
+#
+
+"""
+| new_controller(conf)
+|  Make a concurrency controller
+|  If PcSnipeConcurrencyMin and PcSnipeConcurrencyMax are not set, the
+|  concurrency is fixed to PcSnipeConcurrency.
+|
+| Parameters
+| ----------
+| conf : dict
+|     config data
+|
+| Return value
+| ------------
+| ctl : dict
+|     ctl['limit']   : current concurrency (float)
+|     ctl['min']     : lower bound
+|     ctl['max']     : upper bound
+|     ctl['target']  : PcSnipeTargetLatency
+|     ctl['samples'] : [elapsed, exit code] since the last decision
+"""
+def new_controller(conf):
+    fixed = int(conf[C.CF_PCS_CONCURRENCY])
+    cmin = int(conf[C.CF_PCS_CONC_MIN])
+    cmax = int(conf[C.CF_PCS_CONC_MAX])
+    if cmin == 0 or cmax == 0:
+        # adaptive mode is disabled
+        cmin = fixed
+        cmax = fixed
+
+    return {
+        'limit'   : float(min(max(fixed, cmin), cmax)),
+        'min'     : cmin,
+        'max'     : cmax,
+        'target'  : float(conf[C.CF_PCS_TARGET_LATENCY]),
+        'samples' : []
+    }
+
+# END OF new_controller()
+
+"""
+| limit(ctl)
+|  Get number of pc-snipe to be run at the same time
+|
+| Parameters
+| ----------
+| ctl : dict
+|     controller from new_controller()
+|
+| Return value
+| ------------
+| limit : int
+"""
+def limit(ctl):
+    return int(ctl['limit'])
+
+# END OF limit()
+
+"""
+| log_decision(ctl, old, reason)
+|  Log a change of concurrency to stderr
+|
+| Parameters
+| ----------
+| ctl : dict
+|     controller from new_controller()
+| old : int
+|     concurrency before the change
+| reason : str
+|     observed values
+|
+| Return value
+| ------------
+| (void)
+"""
+def log_decision(ctl, old, reason):
+    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    fmt = '{} get_snao: concurrency {} -> {} ({})'
+    print(fmt.format(now, old, limit(ctl), reason), file=sys.stderr)
+
+# END OF log_decision()
+
+"""
+| observe(ctl, elapsed, ecode)
+|  Record a finished pc-snipe and adjust the concurrency
+|  Every 'limit' completions, the concurrency is decreased
+|  multiplicatively if Snipe-IT errors or timeouts are frequent or the
+|  median latency is over PcSnipeTargetLatency, and increased by one
+|  otherwise.
+|
+| Parameters
+| ----------
+| ctl : dict
+|     controller from new_controller()
+| elapsed : float
+|     seconds the pc-snipe took
+| ecode : int
+|     exit code of the pc-snipe
+|
+| Return value
+| ------------
+| (void)
+"""
+def observe(ctl, elapsed, ecode):
+    if ctl['min'] == ctl['max']:
+        return
+
+    ctl['samples'].append([elapsed, ecode])
+    if len(ctl['samples']) < max(1, limit(ctl)):
+        return
+
+    samples = ctl['samples']
+    ctl['samples'] = []
+    count = len(samples)
+    timeouts = len([x for x in samples if x[1] in TIMEOUT_CODES])
+    api_errors = len([x for x in samples if x[1] in API_ERROR_CODES])
+    latencies = sorted([x[0] for x in samples])
+    median = latencies[count // 2]
+
+    old = limit(ctl)
+    if api_errors / count > API_ERROR_RATE_MAX:
+        ctl['limit'] *= DECREASE_API
+    elif timeouts / count > TIMEOUT_RATE_MAX or median > ctl['target']:
+        ctl['limit'] *= DECREASE_TIMEOUT
+    else:
+        ctl['limit'] += INCREASE
+    ctl['limit'] = float(min(max(ctl['limit'], ctl['min']), ctl['max']))
+
+    if limit(ctl) != old:
+        reason = 'median {:.1f}s, timeouts {}/{}, api errors {}/{}'.format(
+            median, timeouts, count, api_errors, count)
+        log_decision(ctl, old, reason)
+
+# END OF observe()
@@ -38,13 +38,17 @@ ERRCODE_ARG       = 1
 ERRCODE_CONF      = 2
 ERRCODE_DMAP      = 3
 ERRCODE_NOASSET   = 5
+ERRCODE_NOIP      = 6
+ERRCODE_NOSNMP    = 7
 ERRCODE_DIFF      = 9
 ERRCODE_OS        = 10
+ERRCODE_QUEUED    = 11
 
 # system error
 ERRCODE_SYS_CONF  = 99
 ERRCODE_SYS_DMAP  = 98
 ERRCODE_SYS_API   = 97
+ERRCODE_SYS_DNS   = 96
 ERRCODE_SYS_PCS   = 91
 ERRCODE_SYS_OTHER = 90
 
@@ -60,6 +64,8 @@ CF_PCS_CMD = 'PcSnipeCmd'
 CF_PCS_CONF = 'PcSnipeConf'
 CF_AUTOCOL_KEY = 'AutoCollectKey'
 CF_AUTOCOL_VAL = 'AutoCollectValue'
+CF_AUTOCOL_MODE = 'AutoCollectMode'
+CF_AUTOCOL_COLUMN = 'AutoCollectColumn'
 CF_SEARCH_W = 'SnipeIT_SearchWindow'
 CF_PCS_PREFIX = 'PcSnipePrefix'
 CF_API_URL = 'SnipeIT_API_URL'
@@ -68,6 +74,23 @@ CF_COMPUTERNAME = DMAP_COMPUTERNAME
 CF_MAPPINGFILE = 'MappingFile'
 CF_PCS_CONCURRENCY = 'PcSnipeConcurrency'
 CF_API_TIMEO = 'SnipeIT_API_Timeout'
+CF_API_POOLSIZE = 'SnipeIT_API_PoolSize'
+CF_API_RETRIES = 'SnipeIT_API_Retries'
+CF_API_RATE = 'SnipeIT_API_RateLimit'
+CF_API_RATEFILE = 'SnipeIT_API_RateFile'
+CF_SEARCH_CONCURRENCY = 'SnipeIT_SearchConcurrency'
+CF_JOURNAL_FILE = 'UpdateJournalFile'
+CF_DNS_CONCURRENCY = 'DNS_Concurrency'
+CF_DNSDOMAIN = 'DNS_Domain'
+CF_PCS_MODE = 'PcSnipeMode'
+CF_PCS_CONC_MIN = 'PcSnipeConcurrencyMin'
+CF_PCS_CONC_MAX = 'PcSnipeConcurrencyMax'
+CF_PCS_TARGET_LATENCY = 'PcSnipeTargetLatency'
+CF_HISTORY_FILE = 'HistoryFile'
+CF_GROUP_BY = 'PcSnipeGroupBy'
+CF_GROUP_PREFIX = 'PcSnipeGroupPrefix'
+CF_GROUP_CONCURRENCY = 'PcSnipeGroupConcurrency'
+CF_GROUP_LIMITS = 'PcSnipeGroupLimits'
 
 #######################
 # config default values
@@ -79,8 +102,23 @@ DEF_PCS_CMD      = DEF_PCS_PREFIX + '/bin/pc-snipe'
 DEF_PCS_CONF     = DEF_PCS_PREFIX + '/etc/pc-snipe.conf'
 DEF_AUTOCOL_KEY  = False
 DEF_AUTOCOL_VAL  = False
+DEF_AUTOCOL_MODE = 'search'
+DEF_AUTOCOL_COLUMN = ''
 DEF_PCS_CONCURRENCY = 5
 DEF_API_TIMEO    = 30
+DEF_API_POOLSIZE = '10'
+DEF_API_RETRIES  = '2'
+DEF_SEARCH_CONCURRENCY = '4'
+DEF_DNS_CONCURRENCY = '16'
+DEF_PCS_MODE     = 'process'
+DEF_PCS_CONC_MIN = '0'
+DEF_PCS_CONC_MAX = '0'
+DEF_PCS_TARGET_LATENCY = '30'
+DEF_HISTORY_FILE = ''
+DEF_GROUP_BY     = 'none'
+DEF_GROUP_PREFIX = '24'
+DEF_GROUP_CONCURRENCY = '0'
+DEF_GROUP_LIMITS = ''
 
 ###########
 # JSON keys
@@ -94,6 +132,41 @@ JSON_STATUS       = 'status'
 JSON_MSG          = 'messages'
 JSON_ROWS         = 'rows'
 JSON_TOTAL        = 'total'
+JSON_NAME         = 'name'
+JSON_BEFORE       = 'before'
+JSON_AFTER        = 'after'
+JSON_DBCOLUMN     = 'db_column_name'
+JSON_LOCATION     = 'location'
+JSON_RTD_LOCATION = 'rtd_location'
+JSON_REPLAYED     = 'replayed'
+JSON_PENDING      = 'pending'
+JSON_DROPPED      = 'dropped'
 JVAL_ERR          = 'error'
 JVAL_SUCCESS      = 'success'
 
+#############
+# PcSnipeMode
+#
+PMODE_PROCESS = 'process'
+PMODE_POOL    = 'pool'
+
+################
+# PcSnipeGroupBy
+#
+GMODE_NONE     = 'none'
+GMODE_SUBNET   = 'subnet'
+GMODE_LOCATION = 'location'
+
+#################
+# AutoCollectMode
+#
+AMODE_SEARCH = 'search'
+AMODE_FILTER = 'filter'
+
+###########################
+# search_by_col() stats keys
+#
+STAT_MODE       = 'mode'
+STAT_DOWNLOADED = 'downloaded'
+STAT_USED       = 'used'
+
@@ -37,6 +37,7 @@ myprefix = os.path.join(os.path.dirname(__file__), '..')
 sys.path.append(myprefix)
 
 from lib import gsnao_common_defs as C
+from lib import gsnao_group
 
 #
 # functions
@@ -70,10 +71,25 @@ def read_conf(conf):
         C.CF_PCS_CONF        : C.DEF_PCS_CONF,
         C.CF_AUTOCOL_KEY     : C.DEF_AUTOCOL_KEY,
         C.CF_AUTOCOL_VAL     : C.DEF_AUTOCOL_VAL,
+        C.CF_AUTOCOL_MODE    : C.DEF_AUTOCOL_MODE,
+        C.CF_AUTOCOL_COLUMN  : C.DEF_AUTOCOL_COLUMN,
         C.CF_SEARCH_W        : C.DEF_SITWINDOW,
         C.CF_PCS_CONCURRENCY : C.DEF_PCS_CONCURRENCY,
         C.CF_API_TIMEO       : C.DEF_API_TIMEO,
         C.CF_PCS_PREFIX      : C.DEF_PCS_PREFIX,
+        C.CF_API_POOLSIZE    : C.DEF_API_POOLSIZE,
+        C.CF_API_RETRIES     : C.DEF_API_RETRIES,
+        C.CF_SEARCH_CONCURRENCY : C.DEF_SEARCH_CONCURRENCY,
+        C.CF_DNS_CONCURRENCY : C.DEF_DNS_CONCURRENCY,
+        C.CF_PCS_MODE        : C.DEF_PCS_MODE,
+        C.CF_PCS_CONC_MIN    : C.DEF_PCS_CONC_MIN,
+        C.CF_PCS_CONC_MAX    : C.DEF_PCS_CONC_MAX,
+        C.CF_PCS_TARGET_LATENCY : C.DEF_PCS_TARGET_LATENCY,
+        C.CF_HISTORY_FILE    : C.DEF_HISTORY_FILE,
+        C.CF_GROUP_BY        : C.DEF_GROUP_BY,
+        C.CF_GROUP_PREFIX    : C.DEF_GROUP_PREFIX,
+        C.CF_GROUP_CONCURRENCY : C.DEF_GROUP_CONCURRENCY,
+        C.CF_GROUP_LIMITS    : C.DEF_GROUP_LIMITS,
     }
 
     # read configuration file
@@ -156,6 +172,78 @@ def read_conf(conf):
                         err_msgs.append(err_msg)
                         continue
 
+                elif key == C.CF_AUTOCOL_MODE:
+                    # case CF_AUTOCOL_MODE
+                    if value != C.AMODE_SEARCH and value != C.AMODE_FILTER:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_PCS_CONC_MIN or key == C.CF_PCS_CONC_MAX:
+                    # case CF_PCS_CONC_MIN / CF_PCS_CONC_MAX
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_PCS_TARGET_LATENCY:
+                    # case CF_PCS_TARGET_LATENCY
+                    if value.isdecimal() is False or int(value) < 1:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_HISTORY_FILE:
+                    # case CF_HISTORY_FILE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_GROUP_BY:
+                    # case CF_GROUP_BY
+                    if value != C.GMODE_NONE and value != C.GMODE_SUBNET \
+                       and value != C.GMODE_LOCATION:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_GROUP_PREFIX:
+                    # case CF_GROUP_PREFIX
+                    if value.isdecimal() is False or int(value) > 32:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_GROUP_CONCURRENCY:
+                    # case CF_GROUP_CONCURRENCY
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_GROUP_LIMITS:
+                    # case CF_GROUP_LIMITS (checked after PcSnipeGroupBy)
+                    pass
+
+                elif key == C.CF_PCS_MODE:
+                    # case CF_PCS_MODE
+                    if value != C.PMODE_PROCESS and value != C.PMODE_POOL:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_AUTOCOL_COLUMN:
+                    # case CF_AUTOCOL_COLUMN
+                    if re.match(r'^[A-Za-z0-9_]+$', value) == None:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
                 elif key == C.CF_SEARCH_W:
                     # case CF_SEARCH_W
                     if value.isdecimal() is False or int(value) < 1:
@@ -176,6 +264,34 @@ def read_conf(conf):
                         err_msg = err_tmpl.format(line_num, key)
                         err_msgs.append(err_msg)
                         continue
+
+                elif key == C.CF_SEARCH_CONCURRENCY:
+                    # case CF_SEARCH_CONCURRENCY
+                    if value.isdecimal() is False or int(value) < 1:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_DNS_CONCURRENCY:
+                    # case CF_DNS_CONCURRENCY
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_API_POOLSIZE:
+                    # case CF_API_POOLSIZE
+                    if value.isdecimal() is False or int(value) < 1:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_API_RETRIES:
+                    # case CF_API_RETRIES
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
                 else:
                     # not a config element
                     err_msg = err_tmpl.format(line_num, key)
@@ -200,6 +316,19 @@ def read_conf(conf):
             err_msg = err_tmpl.format('--', 'no ' + kn + ' found')
             err_msgs.append(err_msg)
 
+    # check bounds of adaptive concurrency
+    cmin = int(config_list[C.CF_PCS_CONC_MIN])
+    cmax = int(config_list[C.CF_PCS_CONC_MAX])
+    if cmin > 0 and cmax > 0 and cmin > cmax:
+        err_msg = err_tmpl.format('--', C.CF_PCS_CONC_MIN + ' > ' + C.CF_PCS_CONC_MAX)
+        err_msgs.append(err_msg)
+
+    # check group limits, whose format depends on PcSnipeGroupBy
+    if gsnao_group.parse_limits(config_list[C.CF_GROUP_LIMITS],
+                                config_list[C.CF_GROUP_BY]) == None:
+        err_msg = err_tmpl.format('--', C.CF_GROUP_LIMITS)
+        err_msgs.append(err_msg)
+
     # return if error detected
     if len(err_msgs) > 0:
         return [1, err_msgs]
@@ -231,7 +360,10 @@ def merge_config(gsconf, psconf, dmap):
     # merge from psconf
     merge_ps = [
         C.CF_API_URL,
-        C.CF_KEYFILE
+        C.CF_KEYFILE,
+        C.CF_API_RATE,
+        C.CF_API_RATEFILE,
+        C.CF_JOURNAL_FILE
     ]
     for x in merge_ps:
         gsconf[x] = psconf[x]
@@ -0,0 +1,284 @@
+#
+# gsnao_group.py
+#  concurrency caps per group of assets (subnet or location)
+#
+
+"""
+    get_snao
+        One of pc-snipe driver of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import ipaddress
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import gsnao_common_defs as C
+
+#
+# functions
+#
+
+"""
+| parse_limits(value, group_by)
+|  Parse PcSnipeGroupLimits
+|  The value is comma separated 'group:limit', where group is a CIDR
+|  (PcSnipeGroupBy=subnet) or a location name (PcSnipeGroupBy=location).
+|
+| Parameters
+| ----------
+| value : str
+|     value of PcSnipeGroupLimits
+| group_by : str
+|     value of PcSnipeGroupBy
+|
+| Return value
+| ------------
+| limits : list / None
+|     [[group, limit], ...] in the order of the value
+|     group is ipaddress.IPv4Network if group_by is subnet
+|     None if the format is wrong
+"""
+def parse_limits(value, group_by):
+    limits = []
+    if value == '':
+        return limits
+
+    for item in value.split(','):
+        arr = item.strip().rsplit(':', 1)
+        if len(arr) != 2 or arr[0] == '' or \
+           arr[1].isdecimal() is False or int(arr[1]) < 1:
+            return None
+        group = arr[0]
+        if group_by == C.GMODE_SUBNET:
+            try:
+                group = ipaddress.IPv4Network(group, strict=False)
+            except ValueError:
+                return None
+        limits.append([group, int(arr[1])])
+
+    return limits
+
+# END OF parse_limits()
+
+"""
+| group_key(conf, limits, asset)
+|  Get the group of an asset
+|  With PcSnipeGroupBy=subnet, the group is the first CIDR of
+|  PcSnipeGroupLimits that contains the resolved IP address, or the
+|  network of PcSnipeGroupPrefix bits. With PcSnipeGroupBy=location,
+|  it is the location (or default location) of the asset.
+|
+| Parameters
+| ----------
+| conf : dict
+|     config data
+| limits : list
+|     from parse_limits()
+| asset : dict
+|     an element of assets list
+|
+| Return value
+| ------------
+| key : str / None
+|     None if the asset belongs to no group
+"""
+def group_key(conf, limits, asset):
+    group_by = conf[C.CF_GROUP_BY]
+
+    if group_by == C.GMODE_SUBNET:
+        if asset.get('ip', '') == '':
+            return None
+        try:
+            ip = ipaddress.IPv4Address(asset['ip'])
+        except ValueError:
+            return None
+        for group, limit in limits:
+            if ip in group:
+                return str(group)
+        net = ipaddress.IPv4Network('{}/{}'.format(
+            ip, conf[C.CF_GROUP_PREFIX]), strict=False)
+        return str(net)
+
+    elif group_by == C.GMODE_LOCATION:
+        raw = asset.get('raw')
+        if type(raw) is not dict:
+            return None
+        for col in [C.JSON_LOCATION, C.JSON_RTD_LOCATION]:
+            try:
+                name = raw[col][C.JSON_NAME]
+            except (KeyError, TypeError):
+                continue
+            if name:
+                return str(name)
+        return None
+
+    return None
+
+# END OF group_key()
+
+"""
+| new_groups(conf, atags)
+|  Make group data of assets for the scheduler
+|  If PcSnipeGroupBy is none, no asset belongs to a group.
+|
+| Parameters
+| ----------
+| conf : dict
+|     config data
+| atags : list
+|     asset tags
+|
+| Return value
+| ------------
+| grp : dict
+|     grp['keys']    : group of each element of atags
+|     grp['limits']  : {group : cap}
+|     grp['default'] : cap of groups not in PcSnipeGroupLimits (0: none)
+|     grp['running'] : {group : number of assets in progress}
+"""
+def new_groups(conf, atags):
+    grp = {
+        'keys'    : [None] * len(atags),
+        'limits'  : {},
+        'default' : int(conf[C.CF_GROUP_CONCURRENCY]),
+        'running' : {}
+    }
+    if conf[C.CF_GROUP_BY] == C.GMODE_NONE:
+        return grp
+
+    # already checked by read_conf()
+    limits = parse_limits(conf[C.CF_GROUP_LIMITS], conf[C.CF_GROUP_BY])
+    for group, limit in limits:
+        grp['limits'][str(group)] = limit
+
+    for i, asset in enumerate(atags):
+        grp['keys'][i] = group_key(conf, limits, asset)
+
+    return grp
+
+# END OF new_groups()
+
+"""
+| group_cap(grp, key)
+|  Get the cap of a group
+|  (private function)
+|
+| Parameters
+| ----------
+| grp : dict
+|     from new_groups()
+| key : str / None
+|     group
+|
+| Return value
+| ------------
+| cap : int
+|     0 if not capped
+"""
+def group_cap(grp, key):
+    if key == None:
+        return 0
+    return grp['limits'].get(key, grp['default'])
+
+# END OF group_cap()
+
+"""
+| pick(grp, queue)
+|  Pick the first asset in the queue whose group is under its cap
+|  Assets of a busy group are skipped, so that other groups keep
+|  running.
+|
+| Parameters
+| ----------
+| grp : dict
+|     from new_groups()
+| queue : list
+|     indexes of atags not started yet
+|
+| Return value
+| ------------
+| pos : int
+|     position in the queue, -1 if every group is busy
+"""
+def pick(grp, queue):
+    busy = set()
+    for pos, i in enumerate(queue):
+        key = grp['keys'][i]
+        if key in busy:
+            continue
+        cap = group_cap(grp, key)
+        if cap == 0 or grp['running'].get(key, 0) < cap:
+            return pos
+        busy.add(key)
+
+    return -1
+
+# END OF pick()
+
+"""
+| start(grp, i)
+|  Count an asset in progress
+|
+| Parameters
+| ----------
+| grp : dict
+|     from new_groups()
+| i : int
+|     index of atags
+|
+| Return value
+| ------------
+| (void)
+"""
+def start(grp, i):
+    key = grp['keys'][i]
+    if key != None:
+        grp['running'][key] = grp['running'].get(key, 0) + 1
+
+# END OF start()
+
+"""
+| finish(grp, i)
+|  Count an asset done
+|
+| Parameters
+| ----------
+| grp : dict
+|     from new_groups()
+| i : int
+|     index of atags
+|
+| Return value
+| ------------
+| (void)
+"""
+def finish(grp, i):
+    key = grp['keys'][i]
+    if key != None:
+        grp['running'][key] -= 1
+
+# END OF finish()
@@ -0,0 +1,257 @@
+#
+# gsnao_history.py
+#  collection history of assets for scheduling
+#
+
+"""
+    get_snao
+        One of pc-snipe driver of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import time
+import json
+import fcntl
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import gsnao_common_defs as C
+
+#
+# module scope values
+#
+
+HISTORY_VERSION = 1
+
+# exit codes of pc-snipe meaning the PC was offline
+OFFLINE_CODES = [
+    C.ERRCODE_NOSNMP,
+    C.ERRCODE_SYS_DNS
+]
+
+# weight of the last duration in the expected duration
+HISTORY_WEIGHT = 0.5
+
+# entries not collected for this seconds are removed (e.g. retired PCs)
+HISTORY_MAX_AGE = 90 * 24 * 3600
+
+# keys of a history entry
+#  H_DURATION : expected seconds of a collection from an online PC
+#  H_LAST     : seconds the last collection took
+#  H_STATUS   : exit code of the last collection
+#  H_FINISHED : time the last collection finished
+H_DURATION = 'duration'
+H_LAST     = 'last'
+H_STATUS   = 'status'
+H_FINISHED = 'finished'
+
+#
+# functions
+#
+
+"""
+| read_history(path)
+|  Read the history file
+|
+| Parameters
+| ----------
+| path : str
+|     path to the history file
+|
+| Return value
+| ------------
+| history : dict
+|     {asset tag : history entry}
+|     empty if no valid history
+"""
+def read_history(path):
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data['version'] != HISTORY_VERSION:
+            return {}
+        history = {}
+        for atag, entry in data['assets'].items():
+            history[atag] = {
+                H_DURATION : float(entry[H_DURATION]),
+                H_LAST     : float(entry[H_LAST]),
+                H_STATUS   : int(entry[H_STATUS]),
+                H_FINISHED : float(entry[H_FINISHED])
+            }
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return {}
+
+    return history
+
+# END OF read_history()
+
+"""
+| expected_duration(entry, default)
+|  Get the expected seconds of the next collection of an asset
+|  An asset offline at the last run is expected to time out again.
+|
+| Parameters
+| ----------
+| entry : dict / None
+|     history entry of the asset
+| default : float
+|     seconds for an asset without history
+|
+| Return value
+| ------------
+| duration : float
+"""
+def expected_duration(entry, default):
+    if entry == None:
+        return default
+    if entry[H_STATUS] in OFFLINE_CODES:
+        return entry[H_LAST]
+    return entry[H_DURATION]
+
+# END OF expected_duration()
+
+"""
+| order_assets(history, atags)
+|  Sort assets in descending order of the expected duration, so that
+|  slow collections do not start at the end of the run.
+|  Assets without history are expected to take the median duration of
+|  the others. Assets of the same duration keep the order of atags.
+|
+| Parameters
+| ----------
+| history : dict
+|     from read_history()
+| atags : list
+|     asset tags
+|
+| Return value
+| ------------
+| atags : list
+|     sorted asset tags
+"""
+def order_assets(history, atags):
+    known = sorted([history[x['atag']][H_DURATION]
+                    for x in atags if x['atag'] in history])
+    if len(known) == 0:
+        return atags
+    median = known[len(known) // 2]
+
+    return sorted(atags, reverse=True,
+                  key=lambda x: expected_duration(history.get(x['atag']),
+                                                  median))
+
+# END OF order_assets()
+
+"""
+| update_history(history, durations)
+|  Store results of this run into the history
+|
+| Parameters
+| ----------
+| history : dict
+|     from read_history()
+| durations : dict
+|     {asset tag : [seconds, exit code]} from manage_proc()
+|
+| Return value
+| ------------
+| (void)
+"""
+def update_history(history, durations):
+    now = time.time()
+    for atag, (elapsed, ecode) in durations.items():
+        entry = history.get(atag)
+        if entry == None:
+            entry = {
+                H_DURATION : elapsed,
+                H_LAST     : elapsed,
+                H_STATUS   : ecode,
+                H_FINISHED : now
+            }
+            history[atag] = entry
+        elif ecode not in OFFLINE_CODES:
+            # an offline PC says nothing about its collection time
+            entry[H_DURATION] = HISTORY_WEIGHT * elapsed + \
+                (1 - HISTORY_WEIGHT) * entry[H_DURATION]
+        entry[H_LAST] = elapsed
+        entry[H_STATUS] = ecode
+        entry[H_FINISHED] = now
+
+# END OF update_history()
+
+"""
+| save_history(path, durations)
+|  Merge results of this run into the history file
+|  Entries older than HISTORY_MAX_AGE are removed. Errors are ignored.
+|
+| Parameters
+| ----------
+| path : str
+|     path to the history file
+| durations : dict
+|     {asset tag : [seconds, exit code]} from manage_proc()
+|
+| Return value
+| ------------
+| (void)
+"""
+def save_history(path, durations):
+    if len(durations) == 0:
+        return
+
+    try:
+        lock_fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError:
+        return
+
+    tmpfile = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+        # merge with results saved by other runs
+        history = read_history(path)
+        update_history(history, durations)
+        now = time.time()
+        for atag in list(history.keys()):
+            if history[atag][H_FINISHED] + HISTORY_MAX_AGE < now:
+                history.pop(atag)
+
+        data = {
+            'version' : HISTORY_VERSION,
+            'assets'  : history
+        }
+        with open(tmpfile, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmpfile, path)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.unlink(tmpfile)
+        except OSError:
+            pass
+    finally:
+        os.close(lock_fd)
+
+# END OF save_history()
@@ -29,6 +29,10 @@ import os
 import sys
 import time
 import json
+import tempfile
+import selectors
+import concurrent.futures
+import multiprocessing
 
 #
 # import from our library
@@ -37,6 +41,8 @@ myprefix = os.path.join(os.path.dirname(__file__), '..')
 sys.path.append(myprefix)
 
 from lib import gsnao_common_defs as C
+from lib import gsnao_adapt as AD
+from lib import gsnao_group as G
 
 #
 # constant definision
@@ -47,6 +53,9 @@ MODE_ADD = 1
 MODE_WAIT = 2
 MODE_ERROR = 3
 
+# state of a pool worker (see pool_init())
+WORKER = {}
+
 """
 | exec_proc(prog, arglist)
 |  invoke pc-snipe as child process
@@ -82,7 +91,255 @@ def exec_proc(prog, arglist):
 # END OF exec_proc()
 
 """
-| manage_proc(conf, arg_list, atags)
+| write_spool(asset, spool_dir)
+|  Write the asset record fetched by search_by_col() to a spool file
+|  which is handed to pc-snipe by -a option
+|
+| Parameters
+| ----------
+| asset : dict
+|     an element of assets list
+| spool_dir : str / None
+|     per-run directory of spool files (removed by the caller)
+|
+| Return value
+| ------------
+| path : str / None
+|     path to the spool file
+|     None if no record or cannot write (pc-snipe fetches the asset)
+"""
+def write_spool(asset, spool_dir):
+    if spool_dir == None:
+        return None
+    try:
+        raw = asset['raw']
+    except KeyError:
+        return None
+
+    try:
+        fd, path = tempfile.mkstemp(suffix='.json', dir=spool_dir)
+    except OSError:
+        return None
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(raw, f)
+    except (OSError, TypeError, ValueError):
+        remove_spool(path)
+        return None
+
+    return path
+
+# END OF write_spool()
+
+"""
+| remove_spool(path)
+|  Remove the spool file
+|
+| Parameters
+| ----------
+| path : str / None
+|     path to the spool file
+|
+| Return value
+| ------------
+| (void)
+"""
+def remove_spool(path):
+    if path == None:
+        return
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+# END OF remove_spool()
+
+"""
+| resolve_assets(conf, psconf, pcs_dns, atags)
+|  Resolve IP addresses of all assets before invoking pc-snipe
+|  Up to DNS_Concurrency queries are in flight at the same time.
+|  The IP address is stored in atags[n]['ip'] and handed to pc-snipe
+|  by -i option. Assets without ComputerName or whose name does not
+|  exist are reported here and pc-snipe is not invoked for them. On
+|  other errors (e.g. timeout) pc-snipe resolves the name by itself.
+|
+| Parameters
+| ----------
+| conf : dict
+|     config data
+| psconf : dict
+|     pc-snipe config data
+| pcs_dns : module
+|     pcs_dns of pc-snipe
+| atags : list
+|     asset tags
+|
+| Return value
+| ------------
+| [run_atags, ret_arr]
+| run_atags : list
+|     asset tags to invoke pc-snipe
+| ret_arr : dict
+|     results of assets without ComputerName or whose name does not
+|     exist
+"""
+def resolve_assets(conf, psconf, pcs_dns, atags):
+    window = int(conf[C.CF_DNS_CONCURRENCY])
+    if window == 0:
+        # disabled
+        return [atags, {}]
+
+    def report(asset, status, msg):
+        # same as the error of pc-snipe
+        ret_arr[asset['atag']] = {
+            C.JSON_STATUS : status,
+            C.JSON_MSG    : [msg],
+            C.JSON_TAG    : asset['atag'],
+            C.JSON_BEFORE : [],
+            C.JSON_AFTER  : []
+        }
+
+    def resolve(asset):
+        fqdn = asset['cname'] + '.' + psconf[C.CF_DNSDOMAIN]
+        return pcs_dns.get_ipaddr(psconf, fqdn)
+
+    ret_arr = {}
+    named = []
+    for asset in atags:
+        if asset['cname'] == '':
+            report(asset, C.ERRCODE_NOASSET,
+                   'The asset has no ComputerName field.')
+        else:
+            named.append(asset)
+
+    with concurrent.futures.ThreadPoolExecutor(window) as executor:
+        results = list(executor.map(resolve, named))
+
+    run_atags = []
+    for asset, (code, ipaddr) in zip(named, results):
+        if code == 0:
+            asset['ip'] = ipaddr
+            run_atags.append(asset)
+        elif code == 1:
+            report(asset, C.ERRCODE_NOIP, str(ipaddr))
+        else:
+            run_atags.append(asset)
+
+    return [run_atags, ret_arr]
+
+# END OF resolve_assets()
+
+"""
+| open_pidfd(pid)
+|  Open pidfd of a child process, which becomes readable when the
+|  process ends (Linux 5.3 or later)
+|
+| Parameters
+| ----------
+| pid : int
+|     process ID
+|
+| Return value
+| ------------
+| pidfd : int / None
+|     None if pidfd is not supported (the end of stdout is used)
+"""
+def open_pidfd(pid):
+    try:
+        return os.pidfd_open(pid)
+    except (AttributeError, OSError):
+        return None
+
+# END OF open_pidfd()
+
+"""
+| watch_proc(sel, pid, proc)
+|  Register stdout and pidfd of a process to the selector
+|
+| Parameters
+| ----------
+| sel : selectors.BaseSelector
+|     selector of manage_proc()
+| pid : int
+|     process ID
+| proc : dict
+|     an element of process pool
+|
+| Return value
+| ------------
+| (void)
+"""
+def watch_proc(sel, pid, proc):
+    sel.register(proc['pipe'].fileno(), selectors.EVENT_READ, ('pipe', pid))
+    if proc['pidfd'] != None:
+        sel.register(proc['pidfd'], selectors.EVENT_READ, ('pidfd', pid))
+
+# END OF watch_proc()
+
+"""
+| wait_proc(sel, procs)
+|  Wait until outputs of processes arrive or a process ends
+|  A process is done when its stdout is closed and (if pidfd is
+|  supported) it has exited. The process is reaped and its pidfd is
+|  closed.
+|
+| Parameters
+| ----------
+| sel : selectors.BaseSelector
+|     selector of manage_proc()
+| procs : dict
+|     process pool of manage_proc() (outputs are stored in 'msg')
+|
+| Return value
+| ------------
+| [pid, status]
+| pid : int
+|     process ID of the process done (0 if none yet)
+| status : int
+|     status from os.waitpid()
+|
+| Exceptions
+| ----------
+| OSError : if outputs cannot be read
+"""
+def wait_proc(sel, procs):
+    def reap():
+        for k, proc in procs.items():
+            if proc['eof'] and proc['pidfd'] == None:
+                return list(os.waitpid(int(k), 0))
+        return None
+
+    # a process done at the last call
+    ret = reap()
+    if ret != None:
+        return ret
+
+    for key, mask in sel.select():
+        kind, pid = key.data
+        proc = procs[str(pid)]
+        if kind == 'pipe':
+            data = os.read(key.fd, 65536)
+            if data == b'':
+                proc['eof'] = True
+                sel.unregister(key.fd)
+            else:
+                proc['msg'] += data
+        else:
+            # the process exited
+            sel.unregister(key.fd)
+            os.close(key.fd)
+            proc['pidfd'] = None
+
+    ret = reap()
+    if ret != None:
+        return ret
+    return [0, 0]
+
+# END OF wait_proc()
+
+"""
+| manage_proc(conf, arg_list, atags, durations=None, spool_dir=None)
 |  manage process with process pool
 |
 | Parameters
@@ -93,6 +350,12 @@ def exec_proc(prog, arglist):
 |     arguments information
 | atags : list
 |     asset tags
+| durations : dict
+|     if given, {asset tag : [seconds, exit code]} of each pc-snipe
+|     is stored
+| spool_dir : str
+|     if given, fetched asset records are handed to pc-snipe through
+|     spool files in this directory
 |
 | Return value
 | ------------
@@ -104,17 +367,19 @@ def exec_proc(prog, arglist):
 | ret_arr : dict
 |     results from pc-snipe for each invokation
 """
-def manage_proc(conf, arg_list, atags):
+def manage_proc(conf, arg_list, atags, durations=None, spool_dir=None):
     #
     # counter definision
     #
 
-    # concurrency
-    window = int(conf[C.CF_PCS_CONCURRENCY])
+    # concurrency controller
+    ctl = AD.new_controller(conf)
     # total assets
     limit = len(atags)
-    # next process index number
-    count = 0
+    # index numbers of assets not invoked yet
+    queue = list(range(limit))
+    # groups of assets and their caps
+    grp = G.new_groups(conf, atags)
     # process counter now invoked
     nowproc = 0
     # counter that was done
@@ -134,70 +399,99 @@ def manage_proc(conf, arg_list, atags):
     prog = conf[C.CF_PCS_CMD]
     pcs_conf = conf[C.CF_PCS_CONF]
 
+    # outputs and ends of processes
+    sel = selectors.DefaultSelector()
+
     while done < limit:
         # decide mode
         if mode == MODE_ERROR:
             if nowproc == 0:
                 break
-        elif nowproc < window:
+        elif nowproc < AD.limit(ctl) and G.pick(grp, queue) != -1:
             # make process
             mode = MODE_ADD
         else:
             mode = MODE_WAIT
 
         if mode == MODE_ADD:
-            # invoke pc-snipe processes up to PcSnipeConcurrency
-
-            # care window
-            if count + window > limit:
-                window = limit - count
+            # invoke pc-snipe processes up to the current concurrency
+            # and the caps of groups
+            while nowproc < AD.limit(ctl):
+                pos = G.pick(grp, queue)
+                if pos == -1:
+                    break
+                serial = queue[pos]
 
-            # invoke them
-            while nowproc < window:
                 # invoke one pc-snipe
                 pcs_args = [
                     prog,
                     '-c',
-                    pcs_conf,
-                    '-t',
-                    atags[count]['atag']
+                    pcs_conf
                 ]
+
+                # hand the fetched asset record
+                spool = write_spool(atags[serial], spool_dir)
+                if spool != None:
+                    pcs_args += ['-a', spool]
+
+                # hand the resolved IP address
+                if atags[serial].get('ip', '') != '':
+                    pcs_args += ['-i', atags[serial]['ip']]
+
+                pcs_args += ['-t', atags[serial]['atag']]
+
                 ret, cpid, rpipe = exec_proc(prog, pcs_args)
                 if ret == False:
                     # system error ; force return
-                    msg = cpid.strerror()
+                    remove_spool(spool)
+                    msg = cpid.strerror
                     return [2, msg]
 
                 # create process pool
                 procs[str(cpid)] = {
-                    'serial' : count,
+                    'serial' : serial,
                     'status' : ST_INPROGRESS,
                     'pipe'   : rpipe,
-                    'msg'    : ''
+                    'pidfd'  : open_pidfd(cpid),
+                    'eof'    : False,
+                    'spool'  : spool,
+                    'msg'    : b'',
+                    'start'  : time.time()
                 }
-                count += 1
+                watch_proc(sel, cpid, procs[str(cpid)])
+                queue.pop(pos)
+                G.start(grp, serial)
                 nowproc += 1
         elif mode == MODE_WAIT or mode == MODE_ERROR:
-            # collect process
-            epid, code = os.waitpid(-1, os.WNOHANG)
-            if epid == 0:
-                # if no process finished
-                # wait one second
-                time.sleep(1)
-            else:
-                # a process finished
+            # wait for outputs and ends of processes
+            try:
+                epid, code = wait_proc(sel, procs)
+            except OSError:
+                # error
+                msg = 'Failed to read outputs from pc-snipe'
+                return [2, msg]
 
-                # get messages from stdout of pc-snipe
-                procs[str(epid)]['msg'] += procs[str(epid)]['pipe'].read()
+            if epid != 0:
+                # a process finished
+                procs[str(epid)]['msg'] = \
+                    procs[str(epid)]['msg'].decode('utf-8', errors='replace')
 
                 # update process pool
                 procs[str(epid)]['status'] = ST_DONE
                 done += 1
                 nowproc -= 1
+                G.finish(grp, procs[str(epid)]['serial'])
 
                 # store message if report mode is True
                 myatag = atags[procs[str(epid)]['serial']]['atag']
-                ecode = os.WEXITSTATUS(code)
+                if os.WIFEXITED(code):
+                    ecode = os.WEXITSTATUS(code)
+                else:
+                    ecode = C.ERRCODE_SYS_OTHER
+                elapsed = time.time() - procs[str(epid)]['start']
+                AD.observe(ctl, elapsed, ecode)
+                if durations != None:
+                    durations[myatag] = [elapsed, ecode]
                 if os.WIFEXITED(code) == False:
                     efmt = 'The process was abnormal end (pid={})'
                     msg = efmt.format(epid)
@@ -210,6 +504,7 @@ def manage_proc(conf, arg_list, atags):
                           (ecode == C.ERRCODE_SUCCESS)
                           or (ecode == C.ERRCODE_DIFF)
                           or (ecode == C.ERRCODE_OS)
+                          or (ecode == C.ERRCODE_QUEUED)
                          ):
                     # error status
                     ret_arr[myatag] = split_msg(procs[str(epid)]['msg'], rmode)
@@ -222,20 +517,10 @@ def manage_proc(conf, arg_list, atags):
 
                 # cleanup process pool of this
                 procs[str(epid)]['pipe'].close()
+                remove_spool(procs[str(epid)]['spool'])
                 procs.pop(str(epid))
 
-        # care messages
-        for k, v in procs.items():
-            try:
-                procs[k]['msg'] += v['pipe'].read()
-            except TypeError as e:
-                # No data in buffer
-                pass
-            except:
-                # error
-                msg = 'Failed to read outputs from pc-snipe'
-                return [2, msg]
-
+    sel.close()
     if eflag == 1:
         ret_code = 1
     else:
@@ -244,6 +529,279 @@ def manage_proc(conf, arg_list, atags):
 
 # END OF manage_proc()
 
+"""
+| flush_journal(conf)
+|  Invoke pc-snipe -F to replay updates queued in the journal
+|
+| Parameters
+| ----------
+| conf : dict
+|     config data
+|
+| Return value
+| ------------
+| [ret_code, ret_arr]
+| ret_code : int
+|     0 : success
+|     1 : some updates are left in the journal
+|     2 : system error
+| ret_arr : dict / str
+|     result JSON from pc-snipe
+|     str of error message if system error
+"""
+def flush_journal(conf):
+    prog = conf[C.CF_PCS_CMD]
+    pcs_args = [
+        prog,
+        '-c',
+        conf[C.CF_PCS_CONF],
+        '-F'
+    ]
+
+    ret, cpid, rpipe = exec_proc(prog, pcs_args)
+    if ret == False:
+        return [2, cpid.strerror]
+
+    # read all outputs and wait for the end
+    os.set_blocking(rpipe.fileno(), True)
+    msg = rpipe.read()
+    rpipe.close()
+    epid, code = os.waitpid(cpid, 0)
+
+    try:
+        data = json.loads(msg)
+    except ValueError:
+        return [2, 'Failed to read outputs from pc-snipe']
+
+    if os.WIFEXITED(code) == False:
+        return [2, 'The process was abnormal end (pid={})'.format(cpid)]
+    ecode = os.WEXITSTATUS(code)
+    if ecode == C.ERRCODE_SUCCESS:
+        return [0, data]
+    elif ecode == C.ERRCODE_QUEUED:
+        return [1, data]
+    return [2, data]
+
+# END OF flush_journal()
+
+"""
+| pool_init(pcs_prefix, pcs_conf)
+|  Initialize a pool worker
+|  The pc-snipe library is imported and pc-snipe.conf, mapping.conf
+|  and compiled templates are read once for all assets of the worker.
+|
+| Parameters
+| ----------
+| pcs_prefix : str
+|     PcSnipePrefix
+| pcs_conf : str
+|     PcSnipeConf
+|
+| Return value
+| ------------
+| (void)
+"""
+def pool_init(pcs_prefix, pcs_conf):
+    try:
+        sys.path.append(pcs_prefix + '/lib')
+        import pcs_config
+        import pcs_main
+        import pcs_tmpl
+    except Exception:
+        WORKER['error'] = 'Cannot import pc-snipe library files'
+        return
+
+    conf_code, conf = pcs_config.read_conf(pcs_conf)
+    if conf_code != 0:
+        WORKER['error'] = conf
+        return
+    dmap_code, dmap = pcs_config.read_dmap(conf[C.CF_MAPPINGFILE])
+    if dmap_code != 0:
+        WORKER['error'] = dmap
+        return
+    pcs_tmpl.load_compiled(conf)
+
+    WORKER['main'] = pcs_main
+    WORKER['conf'] = conf
+    WORKER['dmap'] = dmap
+
+# END OF pool_init()
+
+"""
+| pool_job(asset)
+|  Collect an asset in a pool worker (same as pc-snipe -t)
+|
+| Parameters
+| ----------
+| asset : dict
+|     an element of assets list
+|
+| Return value
+| ------------
+| [ecode, data]
+| ecode : int
+|     exit code of pc-snipe
+| data : dict
+|     output JSON of pc-snipe
+"""
+def pool_job(asset):
+    if 'error' in WORKER:
+        err_list = WORKER['error']
+        if type(err_list) is str:
+            err_list = [err_list]
+        return [C.ERRCODE_SYS_OTHER, error_data(asset, err_list)]
+
+    M = WORKER['main']
+    job = M.new_job(M.SMODE_TAG, asset['atag'])
+    job['asset'] = asset.get('raw')
+    job['ipaddr'] = asset.get('ip', '')
+    try:
+        return M.collect(WORKER['conf'], WORKER['dmap'], job)
+    except Exception as e:
+        return [C.ERRCODE_SYS_OTHER, error_data(asset, [repr(e)])]
+
+# END OF pool_job()
+
+"""
+| error_data(asset, err_list)
+|  Make output JSON of pc-snipe for errors detected by get_snao
+|
+| Parameters
+| ----------
+| asset : dict
+|     an element of assets list
+| err_list : list
+|     error messages
+|
+| Return value
+| ------------
+| data : dict
+"""
+def error_data(asset, err_list):
+    return {
+        C.JSON_STATUS : C.ERRCODE_SYS_OTHER,
+        C.JSON_MSG    : err_list,
+        C.JSON_TAG    : asset['atag'],
+        C.JSON_BEFORE : [],
+        C.JSON_AFTER  : []
+    }
+
+# END OF error_data()
+
+"""
+| manage_pool(conf, arg_list, atags, durations=None)
+|  manage assets with long-lived pool workers (PcSnipeMode=pool)
+|  Workers collect assets in parallel, as many as the concurrency
+|  controller allows (see gsnao_adapt). Unlike manage_proc(), a crash
+|  of a worker also fails the assets in progress on the other workers.
+|
+| Parameters
+| ----------
+| conf : dict
+|     config data
+| arg_list : dict
+|     arguments information
+| atags : list
+|     asset tags
+| durations : dict
+|     same as manage_proc()
+|
+| Return value
+| ------------
+| same as manage_proc()
+"""
+def manage_pool(conf, arg_list, atags, durations=None):
+    ctl = AD.new_controller(conf)
+    smode = arg_list['stop_mode']
+    rmode = arg_list['report_mode']
+    eflag = 0
+    ret_arr = {}
+    if len(atags) == 0:
+        return [0, ret_arr]
+
+    # fork, so that the workers do not run the get_snao script again
+    ctx = multiprocessing.get_context('fork')
+
+    def new_executor():
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(ctl['max'], len(atags)), mp_context=ctx,
+            initializer=pool_init,
+            initargs=(conf[C.CF_PCS_PREFIX], conf[C.CF_PCS_CONF]))
+
+    executor = new_executor()
+    futures = {}
+    started = {}
+    queue = list(range(len(atags)))
+    grp = G.new_groups(conf, atags)
+    try:
+        while len(queue) > 0 or len(futures) > 0:
+            # submit jobs up to the current concurrency and the caps of
+            # groups
+            while len(futures) < AD.limit(ctl) and \
+                  not (eflag == 1 and smode == True):
+                pos = G.pick(grp, queue)
+                if pos == -1:
+                    break
+                serial = queue.pop(pos)
+                future = executor.submit(pool_job, atags[serial])
+                futures[future] = serial
+                started[future] = time.time()
+                G.start(grp, serial)
+            if len(futures) == 0:
+                break
+
+            done, pending = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                serial = futures.pop(future)
+                G.finish(grp, serial)
+                asset = atags[serial]
+                try:
+                    ecode, data = future.result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    ecode = C.ERRCODE_SYS_OTHER
+                    data = error_data(asset, ['The worker was abnormal end'])
+                    broken = True
+                elapsed = time.time() - started.pop(future)
+                AD.observe(ctl, elapsed, ecode)
+                if durations != None:
+                    durations[asset['atag']] = [elapsed, ecode]
+
+                if not (
+                        (ecode == C.ERRCODE_SUCCESS)
+                        or (ecode == C.ERRCODE_DIFF)
+                        or (ecode == C.ERRCODE_OS)
+                        or (ecode == C.ERRCODE_QUEUED)
+                       ):
+                    eflag = 1
+                if rmode == False:
+                    data[C.JSON_BEFORE] = []
+                    data[C.JSON_AFTER] = []
+                ret_arr[asset['atag']] = data
+
+            if broken:
+                # assets in progress on other workers are lost too
+                for future in list(futures.keys()):
+                    serial = futures.pop(future)
+                    G.finish(grp, serial)
+                    asset = atags[serial]
+                    started.pop(future)
+                    ret_arr[asset['atag']] = error_data(
+                        asset, ['The worker was abnormal end'])
+
+                # restart workers
+                executor.shutdown(wait=False)
+                executor = new_executor()
+    finally:
+        executor.shutdown(wait=True)
+
+    if eflag == 1:
+        return [1, ret_arr]
+    return [0, ret_arr]
+
+# END OF manage_pool()
+
 """
 | split_msg(msg, rmode)
 |  Decode JSON message from pc-snipe to array
@@ -260,9 +818,21 @@ def manage_proc(conf, arg_list, atags):
 | ------------
 | data : dict
 |     decoded data
+|     error data if the message is not JSON (e.g. pc-snipe crashed)
 """
 def split_msg(msg, rmode):
-    data = json.loads(msg)
+    try:
+        data = json.loads(msg)
+        if type(data) is not dict:
+            raise ValueError
+    except ValueError:
+        return {
+            C.JSON_STATUS : C.ERRCODE_SYS_OTHER,
+            C.JSON_MSG    : ['Bad output from pc-snipe', msg],
+            C.JSON_TAG    : '',
+            C.JSON_BEFORE : [],
+            C.JSON_AFTER  : []
+        }
     if rmode == False:
         data['before'] = []
         data['after'] = []
@@ -24,57 +24,107 @@
 
 import sys
 import os
-import re
-import datetime
 import requests
 import json
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
 myprefix = os.path.join(os.path.dirname(__file__), '..')
 sys.path.append(myprefix)
 from lib import gsnao_common_defs as C
 
-URL_TOTAL = '{}/hardware?search={}&limit=0'
-URL_SEARCH = '{}/hardware?search={}&limit={}&offset={}'
+# pc-snipe libraries ; the caller puts PcSnipePrefix/lib on sys.path
+# before importing this module (see main_proc() of get_snao)
+# Requests go through the API client of pc-snipe (shared session, rate
+# limiter, retries), so both programs behave the same.
+import snipeit_api as SAPI
+import pcs_json as J
+
+URL_PAGE = '{}/hardware?{}&limit={}&offset={}'
+URL_FIELDS = '{}/fields'
+QUERY_SEARCH = 'search={}'
+QUERY_FILTER = 'filter={}'
 
 """
-| get_apikey(keyfile):
-|  Get apikey from keyfile
+| get_page(conf, query, offset)
+|  Get a page of assets that may set auto-update flag
+|  Rows are parsed one by one from the response body and only the
+|  assets that set auto-update flag are kept.
 |  (private function)
 |
 | Parameters
 | ----------
-| keyfile : str
-|     Path to API key file
+| conf : dict
+|     configuration dictionary
+| query : str
+|     search or filter query
+| offset : int
+|     offset of the page
 |
 | Return value
 | ------------
-| {code, api_key}
+| [code, page]
 | code:
 |     0: no error
+|     1: error from API expressly
 |     2: system error
-| api_key : str
-|     API key string if no error (code=0)
-|     error message if error detected (code=2)
+| page : dict / str
+|     page['total']      : total number of rows
+|     page['assets']     : assets list (see pick_assets())
+|     page['downloaded'] : number of rows in the page
+|     str of error message if error detected
 """
-def get_apikey(keyfile):
+def get_page(conf, query, offset):
+    url_top = conf[C.CF_API_URL]
+    window = int(conf[C.CF_SEARCH_W])
+
+    url_page = URL_PAGE.format(url_top, query, window, offset)
+
+    # do request
+    code, resp = SAPI.api_request(conf, 'GET', url_page, stream=True)
+    if code != 0:
+        return [code, resp]
+
     try:
-        f = open(keyfile, 'r')
-    except:
-        err_msg = 'Cannot open API key file: ' + keyfile
+        if resp.status_code != 200:
+            err_msg = 'Cannot get data from Snipe-IT API ' + url_page
+            return [2, err_msg]
+
+        head = {}
+        rows = J.stream_rows(J.iter_text(resp), head)
+        atags, nrows = pick_assets(conf, rows)
+        page = {
+            C.JSON_TOTAL : 0,
+            'assets'     : atags,
+            'downloaded' : nrows
+        }
+    except (ValueError, requests.RequestException):
+        err_msg = 'Cannot read data from Snipe-IT API ' + url_page
         return [2, err_msg]
+    finally:
+        resp.close()
+
+    # check if error occurred
+    code, err_msg = SAPI.check_status(head)
+    if code != 0:
+        return [code, err_msg]
+
     try:
-        lines = f.readlines()
-    except:
-        err_msg = 'Cannot read API key file: ' + keyfile
-        return [2, err_msg]
-    api_key = lines[0].rstrip()
-    return [0, api_key]
+        page[C.JSON_TOTAL] = int(head[C.JSON_TOTAL])
+    except (KeyError, TypeError, ValueError):
+        # no total ; no asset found
+        pass
+
+    return [0, page]
 
-# END OF get_apikey()
+# END OF get_page()
 
 """
-| search_by_col(conf)
-|  Search assets that set auto-update flag
+| get_column(conf)
+|  Get db column of AutoCollectKey custom field
+|  AutoCollectColumn is used if set, otherwise it is looked up from
+|  the custom fields of Snipe-IT.
+|  (private function)
 |
 | Parameters
 | ----------
@@ -83,153 +133,173 @@ def get_apikey(keyfile):
 |
 | Return value
 | ------------
-| [code, resp_data]
-| code:
-|     0: no error
-|     1: error from API expressly
-|     2: system error
-| resp_data : dict / str
-|     dictionary of asset data if the asset found
-|     str of error message if error detected
+| column : str
+|     db column ('' if not found)
 """
-def search_by_col(conf):
-    url_top = conf[C.CF_API_URL]
-    search_val = conf[C.CF_AUTOCOL_VAL]
-    search_key = conf[C.CF_AUTOCOL_KEY]
-    window = int(conf[C.CF_SEARCH_W])
-    cname = conf[C.CF_COMPUTERNAME]
-    timeo = int(conf[C.CF_API_TIMEO])
-
-    # setup API key
-    api_ret = get_apikey(conf[C.CF_KEYFILE])
-    if api_ret[0] != 0:
-        # error state
-        return api_ret
-    api_key = api_ret[1]
-
-    # setup URL and parameters
-    url_total = URL_TOTAL.format(url_top, search_val)
-
-    # setup header
-    hdr = {
-        'Accept'        : 'application/json',
-        'Authorization' : 'Bearer ' + api_key,
-        'Content-Type'  : 'application/json'
-    }
-
-    # do search
-    try:
-        tmp_syserr = sys.stderr
-        sys.stderr = None
-        resp = requests.get(url_total, headers=hdr,
-                            timeout=float(timeo), verify=False)
-        sys.stderr = tmp_syserr
-    except:
-        # error status
-        err_msg = 'Cannot connect Snipe-IT API ' + url_total
-        return [2, err_msg]
-
-    if resp.status_code != 200:
-        err_msg = 'Cannot get data from Snipe-IT API ' + url_total
-        return [2, err_msg]
+def get_column(conf):
+    if conf[C.CF_AUTOCOL_COLUMN] != '':
+        return conf[C.CF_AUTOCOL_COLUMN]
 
-    data = json.loads(resp.text)
+    url_fields = URL_FIELDS.format(conf[C.CF_API_URL])
+    code, data = SAPI.get_json(conf, url_fields)
+    if code != 0:
+        return ''
 
-    # check if error occurred
     try:
-        if data[C.JSON_STATUS] == C.JVAL_ERR:
-            err_msg = data[C.JSON_MSG]
-            return [1, err_msg]
-        else:
-            err_msg = 'Unknown error'
-            return [2, err_msg]
-    except KeyError:
-        # do nothing
-        err_msg = ''
+        for field in data[C.JSON_ROWS]:
+            if field[C.JSON_NAME] == conf[C.CF_AUTOCOL_KEY]:
+                return field[C.JSON_DBCOLUMN]
+    except (KeyError, TypeError):
+        pass
 
-    resp_data = {
-        C.JSON_TOTAL         : '',
-    }
+    return ''
 
-    try:
-        if data[C.JSON_TOTAL]:
-            resp_data[C.JSON_TOTAL] = data[C.JSON_TOTAL]
-    except KeyError:
-        resp_data[C.JSON_TOTAL] = ''
+# END OF get_column()
 
-    if resp_data[C.JSON_TOTAL] == '':
-        resp_data[C.JSON_TOTAL] = 0
+"""
+| pick_assets(conf, rtop)
+|  Pick assets that set auto-update flag from rows of a page
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| rtop : iterable
+|     rows of a page (list or generator)
+|
+| Return value
+| ------------
+| [atags, nrows]
+| atags : list
+|     assets list
+| nrows : int
+|     number of rows
+"""
+def pick_assets(conf, rtop):
+    search_val = conf[C.CF_AUTOCOL_VAL]
+    search_key = conf[C.CF_AUTOCOL_KEY]
+    cname = conf[C.CF_COMPUTERNAME]
 
-    total = int(resp_data[C.JSON_TOTAL])
-    offset = 0
     atags = []
+    nrows = 0
+    for adata in rtop:
+        nrows += 1
+        ainfo = {
+            'atag': '',
+            'cname': '',
+            'id': '',
+            'raw': adata
+        }
+        try:
+            adata[C.JSON_CFIELD][search_key][C.JSON_VALUE]
+        except:
+            continue
+        if adata[C.JSON_CFIELD][search_key][C.JSON_VALUE] == search_val:
+            myatag = adata[C.JSON_ATAG]
+            ainfo['atag'] = myatag
+        else:
+            continue
 
-    while offset < total:
-        url_search = URL_SEARCH.format(url_top, search_val, window, offset)
-        # do search
         try:
-            tmp_syserr = sys.stderr
-            sys.stderr = None
-            resp = requests.get(url_search, headers=hdr,
-                                timeout=float(timeo), verify=False)
-            sys.stderr = tmp_syserr
+            mycname = adata[C.JSON_CFIELD][cname][C.JSON_VALUE]
+            ainfo['cname'] = mycname
         except:
-            # error status
-            err_msg = 'Cannot connect Snipe-IT API ' + url_search
-            return [2, err_msg]
+            pass
 
-        if resp.status_code != 200:
-            err_msg = 'Cannot get data from Snipe-IT API ' + url_search
-            return [2, err_msg]
+        try:
+            myid = adata[C.JSON_ID]
+            ainfo['id'] = myid
+        except:
+            pass
 
-        data = json.loads(resp.text)
+        atags.append(ainfo)
 
-        # check if error occurred
-        try:
-            if data[C.JSON_STATUS] == C.JVAL_ERR:
-                err_msg = data[C.JSON_MSG]
-                return [1, err_msg]
-            else:
-                err_msg = 'Unknown error'
-                return [2, err_msg]
-        except KeyError:
-            # do nothing
-            err_msg = ''
-
-        rtop = data[C.JSON_ROWS]
-        for adata in rtop:
-            ainfo = {
-                'atag': '',
-                'cname': '',
-                'id': ''
-            }
-            try:
-                adata[C.JSON_CFIELD][search_key][C.JSON_VALUE]
-            except:
-                continue
-            if adata[C.JSON_CFIELD][search_key][C.JSON_VALUE] == search_val:
-                myatag = adata[C.JSON_ATAG]
-                ainfo['atag'] = myatag
-            else:
-                continue
-
-            try:
-                mycname = adata[C.JSON_CFIELD][cname][C.JSON_VALUE]
-                ainfo['cname'] = mycname
-            except:
-                pass
-
-            try:
-                myid = adata[C.JSON_ID]
-                ainfo['id'] = myid
-            except:
-                pass
-
-            atags.append(ainfo)
-
-        offset += window
-
-    return [0,atags]
+    return [atags, nrows]
 
-# END OF search_by_col()
+# END OF pick_assets()
+
+"""
+| search_by_col(conf, stats=None)
+|  Search assets that set auto-update flag
+|  If AutoCollectMode is filter, assets are filtered by the custom field
+|  on Snipe-IT. If the filter cannot be used, free-text search of
+|  AutoCollectValue is used instead. In both cases rows are checked
+|  whether AutoCollectKey is exactly AutoCollectValue.
+|  The first page gives the total number of assets, and the rest of
+|  pages are fetched in parallel by SnipeIT_SearchConcurrency threads.
+|  Assets are returned in the order of offset.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| stats : dict
+|     if given, the statistics are stored as below
+|      stats['mode']       : AutoCollectMode actually used
+|      stats['downloaded'] : rows downloaded from Snipe-IT
+|      stats['used']       : rows which set auto-update flag
+|
+| Return value
+| ------------
+| [code, resp_data]
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| resp_data : dict / str
+|     dictionary of asset data if the asset found
+|     str of error message if error detected
+"""
+def search_by_col(conf, stats=None):
+    window = int(conf[C.CF_SEARCH_W])
+    concurrency = int(conf[C.CF_SEARCH_CONCURRENCY])
+    search_val = conf[C.CF_AUTOCOL_VAL]
 
+    if stats == None:
+        stats = {}
+    stats[C.STAT_MODE] = C.AMODE_SEARCH
+    stats[C.STAT_DOWNLOADED] = 0
+    stats[C.STAT_USED] = 0
+
+    # first page
+    code = -1
+    if conf[C.CF_AUTOCOL_MODE] == C.AMODE_FILTER:
+        column = get_column(conf)
+        if column != '':
+            afilter = json.dumps({column: search_val}, ensure_ascii=False)
+            query = QUERY_FILTER.format(urllib.parse.quote(afilter))
+            code, data = get_page(conf, query, 0)
+            if code == 0:
+                stats[C.STAT_MODE] = C.AMODE_FILTER
+
+    if code != 0:
+        # free-text search
+        query = QUERY_SEARCH.format(search_val)
+        code, data = get_page(conf, query, 0)
+        if code != 0:
+            return [code, data]
+
+    total = data[C.JSON_TOTAL]
+    atags = data['assets']
+    stats[C.STAT_DOWNLOADED] += data['downloaded']
+
+    # rest of pages
+    offsets = list(range(window, total, window))
+    if len(offsets) > 0:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pages = list(executor.map(lambda o: get_page(conf, query, o),
+                                      offsets))
+    else:
+        pages = []
+
+    for code, data in pages:
+        if code != 0:
+            return [code, data]
+        atags += data['assets']
+        stats[C.STAT_DOWNLOADED] += data['downloaded']
+
+    stats[C.STAT_USED] = len(atags)
+    return [0, atags]
+
+# END OF search_by_col()
@@ -0,0 +1,152 @@
+#
+# conftest.py
+#  fixtures of get_snao tests (run with pytest)
+#
+
+"""
+    get_snao
+        One of pc-snipe driver of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+prefix = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+pcs_prefix = os.path.join(prefix, '..', 'pc-snipe')
+sys.path.insert(0, prefix)
+sys.path.insert(0, os.path.join(pcs_prefix, 'tools'))
+# pc-snipe libraries are imported as get_snao does (see main_proc())
+sys.path.append(os.path.join(pcs_prefix, 'lib'))
+
+import mock_snipeit
+import pcs_config
+from lib import gsnao_common_defs as C
+from lib import gsnao_config
+
+# ComputerName of mock assets (asset tags are A000001, A000002, ...)
+NAMES = ['PC-1', 'PC-2', 'PC-3']
+
+# pc-snipe command
+PCS_CMD = os.path.join(pcs_prefix, 'bin', 'pc-snipe')
+
+"""
+| write_conf(etc, url, cmd, extra=None)
+|  Write get_snao.conf and the pc-snipe configurations for the mock
+|  server
+|
+| Parameters
+| ----------
+| etc : pathlib.Path
+|     directory to write files
+| url : str
+|     API URL of the mock server
+| cmd : str
+|     PcSnipeCmd
+| extra : dict
+|     additional configurations of get_snao.conf
+|
+| Return value
+| ------------
+| conf_file : str
+|     path to get_snao.conf
+"""
+def write_conf(etc, url, cmd, extra=None):
+    (etc / 'api.key').write_text('test-key\n')
+    (etc / 'mapping.conf').write_text(
+        'ComputerName=ComputerName\n'
+        'IPaddr=IPaddr\n'
+        'Community=Community\n'
+        'ComputerInfo=ComputerInfo\n')
+    lines = [
+        'SnipeIT_API_URL=' + url,
+        'SnipeIT_API_KeyFile=' + str(etc / 'api.key'),
+        'SnipeIT_API_Timeout=2',
+        'SnipeIT_API_Retries=0',
+        'DefaultCommunity=public',
+        'DNS_Domain=example.com',
+        'MappingFile=' + str(etc / 'mapping.conf'),
+        'TemplatePath=' + os.path.join(pcs_prefix, 'sample', 'tmpl'),
+        'SnipeIT_FieldCacheFile=' + str(etc / 'fields.json'),
+    ]
+    pcs_conf = etc / 'pc-snipe.conf'
+    pcs_conf.write_text('\n'.join(lines) + '\n')
+
+    lines = [
+        'PcSnipeCmd=' + cmd,
+        'PcSnipeConf=' + str(pcs_conf),
+        'PcSnipePrefix=' + pcs_prefix,
+        'AutoCollectKey=AutoCollect',
+        'AutoCollectValue=yes',
+        'PcSnipeConcurrency=2',
+    ]
+    for key, value in (extra or {}).items():
+        lines.append(key + '=' + value)
+    conf_file = etc / 'get_snao.conf'
+    conf_file.write_text('\n'.join(lines) + '\n')
+    return str(conf_file)
+
+# END OF write_conf()
+
+"""
+| write_child(path, body)
+|  Write an executable python script that stands in for pc-snipe
+|
+| Parameters
+| ----------
+| path : pathlib.Path
+|     path to the script
+| body : str
+|     python source of the script
+|
+| Return value
+| ------------
+| path : str
+"""
+def write_child(path, body):
+    path.write_text('#!' + sys.executable + '\n' + body)
+    path.chmod(0o755)
+    return str(path)
+
+# END OF write_child()
+
+@pytest.fixture
+def snipeit():
+    """mock Snipe-IT server with NAMES assets (server.url is API URL)"""
+    server, url = mock_snipeit.start_server(mock_snipeit.make_assets(NAMES))
+    server.url = url
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def make_conf(tmp_path):
+    """make_conf(url, cmd=PCS_CMD, extra=None) returns merged conf"""
+    def make(url, cmd=PCS_CMD, extra=None):
+        conf_file = write_conf(tmp_path, url, cmd, extra)
+        code, conf = gsnao_config.read_conf(conf_file)
+        assert code == 0, conf
+        code, psconf = pcs_config.read_conf(conf[C.CF_PCS_CONF])
+        assert code == 0, psconf
+        code, dmap = pcs_config.read_dmap(psconf[C.CF_MAPPINGFILE])
+        assert code == 0, dmap
+        gsnao_config.merge_config(conf, psconf, dmap)
+        return conf
+
+    return make
@@ -0,0 +1,143 @@
+#
+# test_gsnao_adapt.py
+#  tests of adaptive concurrency with synthetic samples
+#
+
+from lib import gsnao_common_defs as C
+from lib import gsnao_adapt as A
+
+"""
+| new_ctl(fixed, cmin, cmax, target=10)
+|  Make a controller from concurrency settings
+|
+| Parameters
+| ----------
+| fixed : int
+|     PcSnipeConcurrency
+| cmin : int
+|     PcSnipeConcurrencyMin
+| cmax : int
+|     PcSnipeConcurrencyMax
+| target : int
+|     PcSnipeTargetLatency
+|
+| Return value
+| ------------
+| ctl : dict
+"""
+def new_ctl(fixed, cmin, cmax, target=10):
+    return A.new_controller({
+        C.CF_PCS_CONCURRENCY     : str(fixed),
+        C.CF_PCS_CONC_MIN        : str(cmin),
+        C.CF_PCS_CONC_MAX        : str(cmax),
+        C.CF_PCS_TARGET_LATENCY  : str(target)
+    })
+
+# END OF new_ctl()
+
+"""
+| run_round(ctl, elapsed, ecode, errors=0, ecode_err=0)
+|  Observe one decision round ('limit' samples)
+|
+| Parameters
+| ----------
+| ctl : dict
+|     controller
+| elapsed : float
+|     latency of each sample
+| ecode : int
+|     exit code of normal samples
+| errors : int
+|     number of samples with ecode_err
+| ecode_err : int
+|     exit code of error samples
+|
+| Return value
+| ------------
+| (void)
+"""
+def run_round(ctl, elapsed, ecode, errors=0, ecode_err=0):
+    count = A.limit(ctl)
+    for i in range(count):
+        if i < errors:
+            A.observe(ctl, elapsed, ecode_err)
+        else:
+            A.observe(ctl, elapsed, ecode)
+
+# END OF run_round()
+
+def test_increase_when_healthy(capsys):
+    ctl = new_ctl(4, 1, 8)
+
+    run_round(ctl, 1.0, C.ERRCODE_SUCCESS)
+
+    assert A.limit(ctl) == 5
+    assert ctl['samples'] == []
+    assert 'concurrency 4 -> 5' in capsys.readouterr().err
+
+def test_no_decision_before_limit_samples():
+    ctl = new_ctl(4, 1, 8)
+
+    for i in range(3):
+        A.observe(ctl, 1.0, C.ERRCODE_SUCCESS)
+
+    assert A.limit(ctl) == 4
+    assert len(ctl['samples']) == 3
+
+def test_decrease_on_latency():
+    ctl = new_ctl(8, 1, 16, target=5)
+
+    run_round(ctl, 6.0, C.ERRCODE_SUCCESS)
+
+    # 8 * 0.75
+    assert A.limit(ctl) == 6
+
+def test_decrease_on_timeouts():
+    ctl = new_ctl(8, 1, 16)
+
+    # 2/8 is over the timeout rate
+    run_round(ctl, 1.0, C.ERRCODE_SUCCESS, 2, C.ERRCODE_NOSNMP)
+
+    assert A.limit(ctl) == 6
+
+def test_timeouts_under_rate():
+    ctl = new_ctl(8, 1, 16)
+
+    # 1/8 is not over the timeout rate
+    run_round(ctl, 1.0, C.ERRCODE_SUCCESS, 1, C.ERRCODE_SYS_DNS)
+
+    assert A.limit(ctl) == 9
+
+def test_decrease_on_api_errors():
+    ctl = new_ctl(8, 1, 16)
+
+    # one Snipe-IT error in 8 halves the concurrency
+    run_round(ctl, 1.0, C.ERRCODE_SUCCESS, 1, C.ERRCODE_SYS_API)
+
+    assert A.limit(ctl) == 4
+
+def test_bounds():
+    ctl = new_ctl(3, 2, 4)
+
+    for i in range(3):
+        run_round(ctl, 1.0, C.ERRCODE_SUCCESS)
+    assert A.limit(ctl) == 4
+
+    for i in range(3):
+        run_round(ctl, 1.0, C.ERRCODE_SUCCESS, 1, C.ERRCODE_SYS_API)
+    assert A.limit(ctl) == 2
+
+def test_start_within_bounds():
+    assert A.limit(new_ctl(10, 2, 4)) == 4
+    assert A.limit(new_ctl(1, 2, 4)) == 2
+
+def test_fixed_mode(capsys):
+    ctl = new_ctl(3, 0, 8)
+
+    assert ctl['min'] == ctl['max'] == 3
+    run_round(ctl, 100.0, C.ERRCODE_SUCCESS, 3, C.ERRCODE_SYS_API)
+
+    assert A.limit(ctl) == 3
+    assert ctl['samples'] == []
+    assert capsys.readouterr().err == ''
+    assert A.limit(new_ctl(3, 2, 0)) == 3
@@ -0,0 +1,136 @@
+#
+# test_gsnao_group.py
+#  tests of per-group concurrency caps
+#
+
+import ipaddress
+
+from lib import gsnao_common_defs as C
+from lib import gsnao_group as G
+
+"""
+| group_conf(group_by, limits='', cap=0, prefix=24)
+|  Make config data of grouping
+|
+| Parameters
+| ----------
+| group_by : str
+|     PcSnipeGroupBy
+| limits : str
+|     PcSnipeGroupLimits
+| cap : int
+|     PcSnipeGroupConcurrency
+| prefix : int
+|     PcSnipeGroupPrefix
+|
+| Return value
+| ------------
+| conf : dict
+"""
+def group_conf(group_by, limits='', cap=0, prefix=24):
+    return {
+        C.CF_GROUP_BY          : group_by,
+        C.CF_GROUP_LIMITS      : limits,
+        C.CF_GROUP_CONCURRENCY : str(cap),
+        C.CF_GROUP_PREFIX      : str(prefix)
+    }
+
+# END OF group_conf()
+
+def test_parse_limits_subnet():
+    limits = G.parse_limits('10.1.0.0/16:2, 10.2.3.4/24:5', C.GMODE_SUBNET)
+
+    assert limits == [[ipaddress.IPv4Network('10.1.0.0/16'), 2],
+                      [ipaddress.IPv4Network('10.2.3.0/24'), 5]]
+
+def test_parse_limits_location():
+    limits = G.parse_limits('Tokyo:3,Osaka HQ:1', C.GMODE_LOCATION)
+
+    assert limits == [['Tokyo', 3], ['Osaka HQ', 1]]
+    assert G.parse_limits('', C.GMODE_LOCATION) == []
+
+def test_parse_limits_bad():
+    for value in ['Tokyo', 'Tokyo:', ':3', 'Tokyo:0', 'Tokyo:x']:
+        assert G.parse_limits(value, C.GMODE_LOCATION) == None
+    assert G.parse_limits('10.1.0.300/16:2', C.GMODE_SUBNET) == None
+
+def test_group_key_subnet():
+    conf = group_conf(C.GMODE_SUBNET, '10.1.0.0/16:2', prefix=24)
+    limits = G.parse_limits(conf[C.CF_GROUP_LIMITS], C.GMODE_SUBNET)
+
+    # CIDR of PcSnipeGroupLimits first, then PcSnipeGroupPrefix bits
+    assert G.group_key(conf, limits, {'ip': '10.1.2.3'}) == '10.1.0.0/16'
+    assert G.group_key(conf, limits, {'ip': '10.2.2.3'}) == '10.2.2.0/24'
+    assert G.group_key(conf, limits, {'ip': ''}) == None
+    assert G.group_key(conf, limits, {'ip': 'bad'}) == None
+    assert G.group_key(conf, limits, {}) == None
+
+def test_group_key_location():
+    conf = group_conf(C.GMODE_LOCATION)
+
+    assert G.group_key(conf, [], {'raw': {
+        'location': {'name': 'Tokyo'},
+        'rtd_location': {'name': 'Osaka'}}}) == 'Tokyo'
+    # default location when the asset has no location
+    assert G.group_key(conf, [], {'raw': {
+        'location': None,
+        'rtd_location': {'name': 'Osaka'}}}) == 'Osaka'
+    assert G.group_key(conf, [], {'raw': {'location': None}}) == None
+    assert G.group_key(conf, [], {'raw': ''}) == None
+
+def test_group_key_none():
+    conf = group_conf(C.GMODE_NONE)
+
+    assert G.group_key(conf, [], {'ip': '10.1.2.3'}) == None
+
+def test_new_groups():
+    conf = group_conf(C.GMODE_SUBNET, '10.1.0.0/16:2', cap=1)
+    atags = [{'ip': '10.1.0.1'}, {'ip': '10.9.0.1'}, {'ip': ''}]
+
+    grp = G.new_groups(conf, atags)
+
+    assert grp['keys'] == ['10.1.0.0/16', '10.9.0.0/24', None]
+    assert grp['limits'] == {'10.1.0.0/16': 2}
+    assert grp['default'] == 1
+
+    grp = G.new_groups(group_conf(C.GMODE_NONE, cap=1), atags)
+    assert grp['keys'] == [None, None, None]
+
+def test_pick_skips_busy_group():
+    conf = group_conf(C.GMODE_LOCATION, 'Tokyo:1', cap=2)
+    atags = [{'raw': {'location': {'name': name}}}
+             for name in ['Tokyo', 'Tokyo', 'Osaka', 'Tokyo', 'Osaka',
+                          'Osaka']]
+    atags.append({'raw': {}})
+    grp = G.new_groups(conf, atags)
+    queue = list(range(len(atags)))
+
+    started = []
+    while True:
+        pos = G.pick(grp, queue)
+        if pos < 0:
+            break
+        i = queue.pop(pos)
+        G.start(grp, i)
+        started.append(i)
+
+    # Tokyo is capped at 1 and Osaka at 2 ; the asset without a group
+    # is not capped
+    assert started == [0, 2, 4, 6]
+    assert queue == [1, 3, 5]
+    assert grp['running'] == {'Tokyo': 1, 'Osaka': 2}
+
+    # Osaka frees a slot ; Tokyo assets before it are still skipped
+    G.finish(grp, 2)
+    assert queue[G.pick(grp, queue)] == 5
+
+    # Tokyo frees a slot
+    G.finish(grp, 0)
+    assert queue[G.pick(grp, queue)] == 1
+
+def test_pick_without_groups():
+    grp = G.new_groups(group_conf(C.GMODE_NONE), [{}, {}])
+
+    G.start(grp, 0)
+    assert G.pick(grp, [1]) == 0
+    assert G.pick(grp, []) == -1
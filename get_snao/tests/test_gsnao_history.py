@@ -0,0 +1,147 @@
+#
+# test_gsnao_history.py
+#  tests of collection history and the order of assets
+#
+
+import json
+import time
+
+from lib import gsnao_common_defs as C
+from lib import gsnao_history as H
+
+"""
+| entry(duration, last=None, status=C.ERRCODE_SUCCESS, finished=None)
+|  Make a history entry
+|
+| Parameters
+| ----------
+| duration : float
+|     expected seconds
+| last : float
+|     seconds of the last collection (duration if None)
+| status : int
+|     exit code of the last collection
+| finished : float
+|     time the last collection finished (now if None)
+|
+| Return value
+| ------------
+| entry : dict
+"""
+def entry(duration, last=None, status=C.ERRCODE_SUCCESS, finished=None):
+    return {
+        H.H_DURATION : float(duration),
+        H.H_LAST     : float(duration if last == None else last),
+        H.H_STATUS   : status,
+        H.H_FINISHED : time.time() if finished == None else finished
+    }
+
+# END OF entry()
+
+"""
+| tags(atags)
+|  Get asset tags of order_assets() input/output
+|
+| Parameters
+| ----------
+| atags : list
+|     [{'atag' : asset tag}, ...]
+|
+| Return value
+| ------------
+| tags : list
+"""
+def tags(atags):
+    return [x['atag'] for x in atags]
+
+# END OF tags()
+
+def test_order_longest_first():
+    history = {'A1': entry(5), 'A2': entry(30), 'A3': entry(10)}
+    atags = [{'atag': 'A1'}, {'atag': 'A2'}, {'atag': 'A3'}]
+
+    assert tags(H.order_assets(history, atags)) == ['A2', 'A3', 'A1']
+
+def test_order_unknown_at_median():
+    history = {'A1': entry(5), 'A2': entry(30), 'A3': entry(10)}
+    atags = [{'atag': 'N1'}, {'atag': 'A1'}, {'atag': 'A2'},
+             {'atag': 'A3'}, {'atag': 'N2'}]
+
+    # unknown assets are expected to take 10s and keep their order
+    # among assets of the same duration
+    assert tags(H.order_assets(history, atags)) == \
+        ['A2', 'N1', 'A3', 'N2', 'A1']
+
+def test_order_without_history():
+    atags = [{'atag': 'N2'}, {'atag': 'N1'}]
+
+    assert H.order_assets({}, atags) is atags
+
+def test_order_offline_by_last():
+    # A1 usually takes 60s but timed out in 3s at the last run
+    history = {'A1': entry(60, 3, C.ERRCODE_NOSNMP), 'A2': entry(10)}
+    atags = [{'atag': 'A1'}, {'atag': 'A2'}]
+
+    assert tags(H.order_assets(history, atags)) == ['A2', 'A1']
+
+def test_update_history():
+    history = {'A1': entry(10), 'A2': entry(10)}
+
+    H.update_history(history, {
+        'A1': [20.0, C.ERRCODE_SUCCESS],
+        'A2': [2.0, C.ERRCODE_SYS_DNS],
+        'A3': [7.0, C.ERRCODE_SUCCESS]
+    })
+
+    # weighted average of the last and expected durations
+    assert history['A1'][H.H_DURATION] == 15.0
+    assert history['A1'][H.H_LAST] == 20.0
+    # offline ; the expected duration is kept
+    assert history['A2'][H.H_DURATION] == 10.0
+    assert history['A2'][H.H_LAST] == 2.0
+    assert history['A2'][H.H_STATUS] == C.ERRCODE_SYS_DNS
+    # new asset
+    assert history['A3'][H.H_DURATION] == 7.0
+
+def test_save_history_merge_and_prune(tmp_path):
+    path = str(tmp_path / 'history.json')
+    old = time.time() - H.HISTORY_MAX_AGE - 10
+    with open(path, 'w') as f:
+        json.dump({
+            'version' : H.HISTORY_VERSION,
+            'assets'  : {'A1': entry(10), 'A2': entry(10),
+                         'OLD': entry(10, finished=old)}
+        }, f)
+
+    H.save_history(path, {'A2': [20.0, C.ERRCODE_SUCCESS],
+                          'A3': [5.0, C.ERRCODE_SUCCESS]})
+
+    history = H.read_history(path)
+    assert sorted(history.keys()) == ['A1', 'A2', 'A3']
+    assert history['A1'][H.H_DURATION] == 10.0
+    assert history['A2'][H.H_DURATION] == 15.0
+    assert history['A3'][H.H_DURATION] == 5.0
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == '.tmp'] == []
+
+def test_save_history_nothing(tmp_path):
+    path = tmp_path / 'history.json'
+
+    H.save_history(str(path), {})
+
+    assert not path.exists()
+
+def test_read_history_bad_file(tmp_path):
+    path = tmp_path / 'history.json'
+    path.write_text('{"version": 0, "assets": {}}')
+    assert H.read_history(str(path)) == {}
+
+    path.write_text('not json')
+    assert H.read_history(str(path)) == {}
+
+def test_history_file_in_current_dir(snipeit, make_conf, tmp_path,
+                                     monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    conf = make_conf(snipeit.url, extra={'HistoryFile': 'history.json'})
+
+    assert conf[C.CF_HISTORY_FILE] == 'history.json'
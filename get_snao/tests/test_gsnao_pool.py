@@ -0,0 +1,116 @@
+#
+# test_gsnao_pool.py
+#  tests of get_snao with the pc-snipe libraries against the mock
+#  Snipe-IT server
+#
+
+import pytest
+
+pytest.importorskip('pysnmp.hlapi')
+pytest.importorskip('chardet')
+
+import pcs_main as M
+from conftest import PCS_CMD, write_child
+from lib import gsnao_common_defs as C
+from lib import gsnao_snipeit_api as API
+from lib import gsnao_proc as P
+
+ARGS = {'stop_mode': False, 'report_mode': False}
+
+# runs pc-snipe with the python running the tests
+CHILD = f'''
+import sys
+import runpy
+sys.argv[0] = {PCS_CMD!r}
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+"""
+| fake_pcs(monkeypatch, resolve=True)
+|  Replace DNS and SNMP of collect() (inherited by pool workers)
+|  Every PC answers with the ComputerName of its asset.
+|
+| Parameters
+| ----------
+| monkeypatch : pytest.MonkeyPatch
+| resolve : bool
+|     False if DNS lookups fail
+|
+| Return value
+| ------------
+| (void)
+"""
+def fake_pcs(monkeypatch, resolve=True):
+    if resolve:
+        monkeypatch.setattr(M.pcs_dns, 'get_ipaddr',
+                            lambda conf, fqdn: [0, '10.0.0.1'])
+    else:
+        monkeypatch.setattr(M.pcs_dns, 'get_ipaddr',
+                            lambda conf, fqdn: [1, 'NXDOMAIN'])
+    monkeypatch.setattr(M.SNMP, 'check_sysname',
+                        lambda conf, ip, comm, computer_name: [0, {}])
+    monkeypatch.setattr(M.SNMP, 'get_snmp', lambda *args, **kwargs: [0, {}])
+
+    def accumulate_after(conf, dmap, computer_name, *args, **kwargs):
+        return [0, {
+            M.C.JSON_CFIELD : {
+                M.C.JSON_COMPUTERNAME : computer_name,
+                M.C.DMAP_IPADDR       : '10.0.0.1',
+                M.C.JSON_COMPUTERINFO : 'Windows 10'
+            },
+            M.C.JSON_DIFF : {
+                M.C.JDIF_COMPUTERNAME : False,
+                M.C.JDIF_OSNAME       : False
+            }
+        }]
+
+    monkeypatch.setattr(M.SNMP, 'accumulate_after', accumulate_after)
+
+# END OF fake_pcs()
+
+def test_manage_pool_updates_assets(snipeit, make_conf, monkeypatch):
+    conf = make_conf(snipeit.url, extra={'PcSnipeMode': 'pool'})
+    fake_pcs(monkeypatch)
+    code, atags = API.search_by_col(conf)
+
+    code, report = P.manage_pool(conf, ARGS, atags)
+
+    assert code == 0
+    assert sorted(report.keys()) == ['A000001', 'A000002', 'A000003']
+    for data in report.values():
+        assert data[C.JSON_STATUS] == C.ERRCODE_SUCCESS
+    assert snipeit.counts.get('PATCH /hardware/2') == 1
+
+def test_manage_pool_collect_error(snipeit, make_conf, monkeypatch):
+    conf = make_conf(snipeit.url, extra={'PcSnipeMode': 'pool'})
+    fake_pcs(monkeypatch, resolve=False)
+    code, atags = API.search_by_col(conf)
+
+    code, report = P.manage_pool(conf, ARGS, atags)
+
+    assert code == 1
+    assert sorted(report.keys()) == ['A000001', 'A000002', 'A000003']
+    for data in report.values():
+        assert data[C.JSON_STATUS] == C.ERRCODE_NOIP
+
+def test_manage_pool_ipaddr_hint(snipeit, make_conf, monkeypatch):
+    conf = make_conf(snipeit.url, extra={'PcSnipeMode': 'pool'})
+    with open(conf[C.CF_PCS_CONF], 'a') as f:
+        f.write('UseIPaddrHint=yes\n')
+    snipeit.assets[0]['custom_fields']['IPaddr']['value'] = '10.0.0.1'
+    fake_pcs(monkeypatch, resolve=False)
+    code, atags = API.search_by_col(conf)
+
+    code, report = P.manage_pool(conf, ARGS, atags[:1])
+
+    assert code == 0
+    assert report['A000001'][C.JSON_STATUS] == C.ERRCODE_SUCCESS
+
+def test_manage_proc_runs_pc_snipe(snipeit, make_conf, tmp_path):
+    conf = make_conf(snipeit.url, write_child(tmp_path / 'pcs', CHILD))
+    atags = [{'atag': 'NONE', 'cname': '', 'id': ''}]
+
+    code, report = P.manage_proc(conf, ARGS, atags)
+
+    assert code == 1
+    assert report['NONE'][C.JSON_STATUS] == M.C.ERRCODE_NOTAG
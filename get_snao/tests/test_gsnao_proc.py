@@ -0,0 +1,139 @@
+#
+# test_gsnao_proc.py
+#  tests of manage_proc() with a stand-in of pc-snipe
+#
+
+import errno
+import types
+
+from conftest import write_child
+from lib import gsnao_common_defs as C
+from lib import gsnao_snipeit_api as API
+from lib import gsnao_proc as P
+
+# prints the asset record handed by -a, fails for A000002 if asked
+CHILD = '''
+import sys
+import json
+args = sys.argv
+tag = args[args.index('-t') + 1]
+record = None
+if '-a' in args:
+    with open(args[args.index('-a') + 1]) as f:
+        record = json.load(f)
+status = 0
+if tag == 'A000002' and 'fail' in args[0]:
+    status = 8
+print(json.dumps({'status': status, 'messages': [], 'tag': tag,
+                  'before': [record], 'after': []}))
+sys.exit(status)
+'''
+
+ARGS = {'stop_mode': False, 'report_mode': True}
+
+def test_manage_proc_reports_each_asset(snipeit, make_conf, tmp_path):
+    cmd = write_child(tmp_path / 'pcs', CHILD)
+    conf = make_conf(snipeit.url, cmd)
+    code, atags = API.search_by_col(conf)
+    spool_dir = tmp_path / 'spool'
+    spool_dir.mkdir()
+    durations = {}
+
+    code, report = P.manage_proc(conf, ARGS, atags, durations,
+                                 str(spool_dir))
+
+    assert code == 0
+    assert sorted(report.keys()) == ['A000001', 'A000002', 'A000003']
+    for atag, data in report.items():
+        assert data[C.JSON_STATUS] == C.ERRCODE_SUCCESS
+        # the record fetched by search_by_col() is handed to pc-snipe
+        assert data[C.JSON_BEFORE][0]['asset_tag'] == atag
+        assert durations[atag][1] == C.ERRCODE_SUCCESS
+    assert list(spool_dir.iterdir()) == []
+
+def test_manage_proc_without_spool(snipeit, make_conf, tmp_path):
+    cmd = write_child(tmp_path / 'pcs', CHILD)
+    conf = make_conf(snipeit.url, cmd)
+    code, atags = API.search_by_col(conf)
+
+    code, report = P.manage_proc(conf, ARGS, atags)
+
+    assert code == 0
+    # pc-snipe fetches the asset itself
+    assert report['A000001'][C.JSON_BEFORE] == [None]
+
+def test_manage_proc_error_status(snipeit, make_conf, tmp_path):
+    cmd = write_child(tmp_path / 'fail', CHILD)
+    conf = make_conf(snipeit.url, cmd)
+    code, atags = API.search_by_col(conf)
+
+    code, report = P.manage_proc(conf, ARGS, atags)
+
+    assert code == 1
+    assert report['A000002'][C.JSON_STATUS] == 8
+    assert report['A000003'][C.JSON_STATUS] == C.ERRCODE_SUCCESS
+
+def test_manage_proc_stop_mode(snipeit, make_conf, tmp_path):
+    cmd = write_child(tmp_path / 'fail', CHILD)
+    conf = make_conf(snipeit.url, cmd, {'PcSnipeConcurrency': '1'})
+    code, atags = API.search_by_col(conf)
+    args = {'stop_mode': True, 'report_mode': False}
+
+    code, report = P.manage_proc(conf, args, atags)
+
+    assert code == 1
+    assert sorted(report.keys()) == ['A000001', 'A000002']
+
+def test_manage_proc_fork_error(snipeit, make_conf, tmp_path, monkeypatch):
+    cmd = write_child(tmp_path / 'pcs', CHILD)
+    conf = make_conf(snipeit.url, cmd)
+    code, atags = API.search_by_col(conf)
+    spool_dir = tmp_path / 'spool'
+    spool_dir.mkdir()
+
+    def fork():
+        raise OSError(errno.EAGAIN, 'Resource temporarily unavailable')
+
+    monkeypatch.setattr(P.os, 'fork', fork)
+    code, report = P.manage_proc(conf, ARGS, atags, None, str(spool_dir))
+
+    assert code == 2
+    assert report == 'Resource temporarily unavailable'
+    assert list(spool_dir.iterdir()) == []
+
+def test_manage_proc_bad_output(snipeit, make_conf, tmp_path):
+    cmd = write_child(tmp_path / 'pcs', 'print("Traceback")\n')
+    conf = make_conf(snipeit.url, cmd)
+    code, atags = API.search_by_col(conf)
+
+    code, report = P.manage_proc(conf, ARGS, atags)
+
+    assert code == 0
+    data = report['A000001']
+    assert data[C.JSON_STATUS] == C.ERRCODE_SYS_OTHER
+    assert data[C.JSON_MSG][0] == 'Bad output from pc-snipe'
+
+def test_resolve_assets():
+    conf = {C.CF_DNS_CONCURRENCY: '2'}
+    psconf = {C.CF_DNSDOMAIN: 'example.com'}
+    answers = {
+        'pc-1.example.com' : [0, '10.0.0.1'],
+        'pc-2.example.com' : [1, 'no such host'],
+        'pc-3.example.com' : [2, 'timeout']
+    }
+    pcs_dns = types.SimpleNamespace(
+        get_ipaddr=lambda psconf, fqdn: answers[fqdn])
+    atags = [{'atag': 'A' + str(n), 'cname': 'pc-' + str(n)}
+             for n in range(1, 4)]
+    atags.append({'atag': 'A4', 'cname': ''})
+
+    run_atags, report = P.resolve_assets(conf, psconf, pcs_dns, atags)
+
+    # pc-snipe resolves pc-3 by itself
+    assert [a['atag'] for a in run_atags] == ['A1', 'A3']
+    assert run_atags[0]['ip'] == '10.0.0.1'
+    assert 'ip' not in run_atags[1]
+    assert report['A2'][C.JSON_STATUS] == C.ERRCODE_NOIP
+    assert report['A2'][C.JSON_MSG] == ['no such host']
+    assert report['A4'][C.JSON_STATUS] == C.ERRCODE_NOASSET
+    assert report['A4'][C.JSON_MSG] == ['The asset has no ComputerName field.']
@@ -0,0 +1,67 @@
+#
+# test_gsnao_snipeit_api.py
+#  tests of search_by_col() against the mock Snipe-IT server
+#
+
+from lib import gsnao_common_defs as C
+from lib import gsnao_snipeit_api as API
+
+def test_search_by_col_search(snipeit, make_conf):
+    conf = make_conf(snipeit.url, extra={'SnipeIT_SearchWindow': '2'})
+    snipeit.assets[1]['custom_fields']['AutoCollect']['value'] = 'no'
+    stats = {}
+
+    code, atags = API.search_by_col(conf, stats)
+
+    assert code == 0
+    assert [a['atag'] for a in atags] == ['A000001', 'A000003']
+    assert [a['cname'] for a in atags] == ['PC-1', 'PC-3']
+    assert atags[0]['raw']['id'] == 1
+    assert stats[C.STAT_MODE] == C.AMODE_SEARCH
+
+def test_search_by_col_pages(snipeit, make_conf):
+    conf = make_conf(snipeit.url, extra={'SnipeIT_SearchWindow': '1',
+                                         'SnipeIT_SearchConcurrency': '2'})
+    snipeit.delay = 0.05
+    stats = {}
+
+    code, atags = API.search_by_col(conf, stats)
+
+    # the rest of pages are fetched in parallel, in the order of offset
+    assert code == 0
+    assert [a['atag'] for a in atags] == ['A000001', 'A000002', 'A000003']
+    assert snipeit.counts['/hardware'] == 3
+    assert stats[C.STAT_DOWNLOADED] == 3
+
+def test_search_by_col_filter(snipeit, make_conf):
+    conf = make_conf(snipeit.url, extra={'AutoCollectMode': 'filter'})
+    snipeit.assets[0]['custom_fields']['AutoCollect']['value'] = 'no'
+    stats = {}
+
+    code, atags = API.search_by_col(conf, stats)
+
+    assert code == 0
+    assert [a['atag'] for a in atags] == ['A000002', 'A000003']
+    assert stats[C.STAT_MODE] == C.AMODE_FILTER
+    assert stats[C.STAT_DOWNLOADED] == 2
+
+def test_search_by_col_filter_fallback(snipeit, make_conf):
+    conf = make_conf(snipeit.url, extra={'AutoCollectMode': 'filter',
+                                         'AutoCollectColumn': '_no_such'})
+    snipeit.assets[0]['custom_fields']['AutoCollect']['value'] = 'no'
+    stats = {}
+
+    code, atags = API.search_by_col(conf, stats)
+
+    # the filter is refused ; free-text search is used instead
+    assert code == 0
+    assert [a['atag'] for a in atags] == ['A000002', 'A000003']
+    assert stats[C.STAT_MODE] == C.AMODE_SEARCH
+
+def test_search_by_col_unreachable(make_conf):
+    conf = make_conf('http://127.0.0.1:1/api/v1')
+
+    code, err_msg = API.search_by_col(conf)
+
+    assert code == 2
+    assert type(err_msg) is str
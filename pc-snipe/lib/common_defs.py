@@ -44,6 +44,7 @@ ERRCODE_NOSNMP   = 7
 ERRCODE_NOTMPL   = 8
 ERRCODE_DIFF     = 9
 ERRCODE_OS       = 10
+ERRCODE_QUEUED   = 11
 
 # system error
 ERRCODE_SYS_CONF = 99
@@ -54,6 +55,7 @@ ERRCODE_SYS_SNMP = 95
 ERRCODE_SYS_TMPL = 94
 ERRCODE_SYS_WL   = 93
 ERRCODE_SYS_BL   = 92
+ERRCODE_SYS_JNL  = 89
 
 #################
 # config elements
@@ -68,11 +70,27 @@ CF_SIT_SEARCH_WINDOW = 'SnipeIT_SearchWindow'
 CF_TMPLPATH          = 'TemplatePath'
 CF_MAPPINGFILE       = 'MappingFile'
 CF_DNS_TIMEO         = 'DNS_Timeout'
+CF_DNS_CACHE         = 'DNS_CacheFile'
+CF_DNS_MAXAGE        = 'DNS_CacheMaxAge'
+CF_DNS_MAXSTALE      = 'DNS_CacheMaxStale'
+CF_USE_IPHINT        = 'UseIPaddrHint'
 CF_DISKSIZE_UNIT     = 'DiskSizeUnit'
 CF_MEMSIZE_UNIT      = 'MemorySizeUnit'
 CF_DISKSIZE_DIGITS   = 'DiskSizeDigits'
 CF_MEMSIZE_DIGITS    = 'MemorySizeDigits'
 CF_CPUTHDS_DIGITS    = 'CPUThreadsDigits'
+CF_TMPL_CACHE        = 'TemplateCacheFile'
+CF_API_POOLSIZE      = 'SnipeIT_API_PoolSize'
+CF_API_RETRIES       = 'SnipeIT_API_Retries'
+CF_API_RATE          = 'SnipeIT_API_RateLimit'
+CF_API_RATEFILE      = 'SnipeIT_API_RateFile'
+CF_FIELD_CACHE       = 'SnipeIT_FieldCacheFile'
+CF_FIELD_CACHE_TTL   = 'SnipeIT_FieldCacheTTL'
+CF_SIT_NAME_SORT     = 'SnipeIT_NameSortColumn'
+CF_INDEX_FILE        = 'AssetIndexFile'
+CF_INDEX_REFRESH     = 'AssetIndexRefresh'
+CF_JOURNAL_FILE      = 'UpdateJournalFile'
+CF_JOURNAL_MODE      = 'UpdateJournalMode'
 
 ##################
 # mapping elements
@@ -103,11 +121,27 @@ DEF_DNSADDR      = ''
 DEF_DEFAULTCOMM  = False
 DEF_DNSDOMAIN    = ''
 DEF_DNS_TIMEO    = 2
+DEF_DNS_CACHE    = ''
+DEF_DNS_MAXAGE   = '0'
+DEF_DNS_MAXSTALE = '0'
+DEF_USE_IPHINT   = 'no'
 DEF_DISKSIZE_U   = 'G'
 DEF_MEMSIZE_U    = 'M'
 DEF_DISKSIZE_D   = '4'
 DEF_MEMSIZE_D    = '6'
 DEF_CPUTHDS_D    = '2'
+DEF_TMPL_CACHE   = ''
+DEF_API_POOLSIZE = '10'
+DEF_API_RETRIES  = '2'
+DEF_API_RATE     = '0'
+DEF_API_RATEFILE = myprefix + '/etc/pc-snipe.rate'
+DEF_FIELD_CACHE  = ''
+DEF_FIELD_CACHE_TTL = '3600'
+DEF_SIT_NAME_SORT = ''
+DEF_INDEX_FILE   = ''
+DEF_INDEX_REFRESH = '300'
+DEF_JOURNAL_FILE = ''
+DEF_JOURNAL_MODE = 'fallback'
 
 ###########
 # JSON keys
@@ -133,6 +167,24 @@ JDIF_COMPUTERNAME = 'ComputerName'
 JDIF_OSNAME       = 'OSName'
 JSON_TOTAL        = 'total'
 JSON_ROWS         = 'rows'
+JSON_UPDATED      = 'updated_at'
+JSON_DATETIME     = 'datetime'
+JSON_NAME         = 'name'
+JSON_DBCOLUMN     = 'db_column_name'
+JSON_MODEL        = 'model'
+JSON_FIELDS       = 'fields'
+JSON_MODELS       = 'models'
+JSON_CHANGED      = 'changed'
+JSON_UNCHANGED    = 'unchanged'
+JSON_REPLAYED     = 'replayed'
+JSON_PENDING      = 'pending'
+JSON_DROPPED      = 'dropped'
+
+###################
+# UpdateJournalMode
+#
+JMODE_FALLBACK = 'fallback'
+JMODE_ALWAYS   = 'always'
 
 ###########
 # SNMP defs
@@ -173,6 +225,13 @@ SSYM_IFALIAS        = 'ifAlias'
 #
 PTN_OSNAME = 'Software: Windows'
 
+#################
+# template defs
+#
+
+# compiled template cache file name (under TemplatePath)
+TMPL_CACHE_NAME = 'compiled.json'
+
 ##############
 # replace tags
 #
@@ -76,11 +76,27 @@ def read_conf(conf):
         C.CF_TMPLPATH          : C.DEF_TMPL_DIR,
         C.CF_MAPPINGFILE       : C.DEF_MAPPING_FILE,
         C.CF_DNS_TIMEO         : C.DEF_DNS_TIMEO,
+        C.CF_DNS_CACHE         : C.DEF_DNS_CACHE,
+        C.CF_DNS_MAXAGE        : C.DEF_DNS_MAXAGE,
+        C.CF_DNS_MAXSTALE      : C.DEF_DNS_MAXSTALE,
+        C.CF_USE_IPHINT        : C.DEF_USE_IPHINT,
         C.CF_DISKSIZE_UNIT     : C.DEF_DISKSIZE_U,
         C.CF_MEMSIZE_UNIT      : C.DEF_MEMSIZE_U,
         C.CF_DISKSIZE_DIGITS   : C.DEF_DISKSIZE_D,
         C.CF_MEMSIZE_DIGITS    : C.DEF_MEMSIZE_D,
         C.CF_CPUTHDS_DIGITS    : C.DEF_CPUTHDS_D,
+        C.CF_TMPL_CACHE        : C.DEF_TMPL_CACHE,
+        C.CF_API_POOLSIZE      : C.DEF_API_POOLSIZE,
+        C.CF_API_RETRIES       : C.DEF_API_RETRIES,
+        C.CF_API_RATE          : C.DEF_API_RATE,
+        C.CF_API_RATEFILE      : C.DEF_API_RATEFILE,
+        C.CF_FIELD_CACHE       : C.DEF_FIELD_CACHE,
+        C.CF_FIELD_CACHE_TTL   : C.DEF_FIELD_CACHE_TTL,
+        C.CF_SIT_NAME_SORT     : C.DEF_SIT_NAME_SORT,
+        C.CF_INDEX_FILE        : C.DEF_INDEX_FILE,
+        C.CF_INDEX_REFRESH     : C.DEF_INDEX_REFRESH,
+        C.CF_JOURNAL_FILE      : C.DEF_JOURNAL_FILE,
+        C.CF_JOURNAL_MODE      : C.DEF_JOURNAL_MODE,
     }
 
     # read configuration file
@@ -136,8 +152,8 @@ def read_conf(conf):
                         continue
 
                 elif key == C.CF_DNSADDR:
-                    # case CF_DNSADDR
-                    if value == '':
+                    # case CF_DNSADDR (name servers separated by ',')
+                    if value.replace(',', '').strip() == '':
                         err_msg = err_tmpl.format(line_num, key)
                         err_msgs.append(err_msg)
                         continue
@@ -163,6 +179,13 @@ def read_conf(conf):
                         err_msgs.append(err_msg)
                         continue
 
+                elif key == C.CF_SIT_NAME_SORT:
+                    # case CF_SIT_NAME_SORT
+                    if re.match(r'^[A-Za-z0-9_]+$', value) == None:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
                 elif key == C.CF_API_TIMEO:
                     # case CF_API_TIMEO
                     if value.isdecimal() is False or int(value) < 1:
@@ -170,6 +193,74 @@ def read_conf(conf):
                         err_msgs.append(err_msg)
                         continue
 
+                elif key == C.CF_API_POOLSIZE:
+                    # case CF_API_POOLSIZE
+                    if value.isdecimal() is False or int(value) < 1:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_API_RETRIES:
+                    # case CF_API_RETRIES
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_API_RATE:
+                    # case CF_API_RATE
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_API_RATEFILE:
+                    # case CF_API_RATEFILE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_FIELD_CACHE:
+                    # case CF_FIELD_CACHE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_FIELD_CACHE_TTL:
+                    # case CF_FIELD_CACHE_TTL
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_JOURNAL_FILE:
+                    # case CF_JOURNAL_FILE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_JOURNAL_MODE:
+                    # case CF_JOURNAL_MODE
+                    if value != C.JMODE_FALLBACK and value != C.JMODE_ALWAYS:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
                 elif key == C.CF_DNS_TIMEO:
                     # case CF_DNS_TIMEO
                     if value.isdecimal() is False or int(value) < 1:
@@ -177,6 +268,38 @@ def read_conf(conf):
                         err_msgs.append(err_msg)
                         continue
 
+                elif key == C.CF_DNS_CACHE:
+                    # case CF_DNS_CACHE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_DNS_MAXAGE:
+                    # case CF_DNS_MAXAGE
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_DNS_MAXSTALE:
+                    # case CF_DNS_MAXSTALE
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_USE_IPHINT:
+                    # case CF_USE_IPHINT
+                    if value != 'yes' and value != 'no':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
                 elif key == C.CF_TMPLPATH:
                     # case CF_TMPLPATH
                     if value == '':
@@ -234,6 +357,35 @@ def read_conf(conf):
                         err_msgs.append(err_msg)
                         continue
 
+                elif key == C.CF_TMPL_CACHE:
+                    # case CF_TMPL_CACHE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_INDEX_FILE:
+                    # case CF_INDEX_FILE
+                    if value == '':
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+                    elif not os.path.isdir(os.path.dirname(os.path.abspath(value))):
+                        err_msg = f"{key}: directory of {value} does not exist at line {line_num}"
+                        err_msgs.append(err_msg)
+                        continue
+
+                elif key == C.CF_INDEX_REFRESH:
+                    # case CF_INDEX_REFRESH
+                    if value.isdecimal() is False:
+                        err_msg = err_tmpl.format(line_num, key)
+                        err_msgs.append(err_msg)
+                        continue
+
                 else:
                     # not a config element
                     err_msg = err_tmpl.format(line_num, key)
@@ -25,12 +25,66 @@
 import socket
 import os
 import sys
+import time
+import json
+import fcntl
+import atexit
+import threading
+import asyncio
 import dns.resolver
+import dns.asyncresolver
+import dns.rdatatype
 myprefix = os.path.join(os.path.dirname(__file__), '..')
 sys.path.append(myprefix)
 
 from lib import common_defs as C
 
+#
+# module scope values
+#
+
+# seconds to cache NXDOMAIN when the response has no SOA
+DNS_NEG_TTL = 60
+
+# longest seconds to cache NXDOMAIN
+DNS_MAX_NEG_TTL = 3600
+
+# seconds to wait for the answer before a stale cached address is used
+DNS_STALE_WAIT = 1.8
+
+# resolvers reused across lookups
+#  RESOLVER[(nameserver, timeout)] = dns.asyncresolver.Resolver
+RESOLVER = {}
+
+# latency statistics of each name server
+#  DNS_STATS[nameserver] = {
+#      'queries' : queries answered or failed,
+#      'wins'    : queries whose answer was used,
+#      'errors'  : queries failed (timeout, SERVFAIL, ...),
+#      'cancel'  : queries cancelled by the answer of another server,
+#      'time'    : total seconds of answered or failed queries,
+#      'max'     : longest seconds of a query
+#  }
+DNS_STATS = {}
+
+# answer cache
+#  DNS_CACHE[(nameserver, host)] = [expire, code, ip_addr / exception]
+DNS_CACHE = {}
+DNS_LOCK = threading.Lock()
+
+# format version of DNS cache file
+DNS_CACHE_VERSION = 1
+
+# DNS cache file
+#  FILE_CACHE['path']    : path to the cache file
+#  FILE_CACHE['entries'] : {'nameserver|host' : [fetched, expire, ip_addr]}
+#  FILE_CACHE['dirty']   : entries resolved by this process
+FILE_CACHE = {}
+
+# refresh of stale entries in progress
+#  REFRESH['nameserver|host'] = [thread, result]
+REFRESH = {}
+
 
 """
 | get_ipaddr_by_sys(host)
@@ -46,7 +100,7 @@ from lib import common_defs as C
 | code:
 |  0: no error
 |  1: software error
-|  2: system error
+|  2: system error (temporary failure of name resolution)
 | ip: str
 |  ip address if no error
 |  error message if error
@@ -55,6 +109,12 @@ def get_ipaddr_by_sys(host):
     try:
         ip = socket.gethostbyname(host)
         code = 0
+    except socket.gaierror as e:
+        ip = e
+        code = 1
+        if e.errno == socket.EAI_AGAIN:
+            # name server did not answer ; a cached address may be used
+            code = 2
     except BaseException as e:
         ip = e
         code = 1
@@ -63,13 +123,263 @@ def get_ipaddr_by_sys(host):
 # END OF get_ipaddr_by_sys()
 
 """
-| get_ipaddr_by_dns(nameserver, host)
-|  get IP address by gethostbyname()
+| get_resolver(nameserver, dnstimeo)
+|  Get the resolver for the name server (made at the first call)
+|
+| Parameters
+| ----------
+| nameserver : str
+|  DNS resolver IP address
+| dnstimeo : int
+|  timeout of query
+|
+| Return value
+| ------------
+| resolver : dns.asyncresolver.Resolver
+"""
+def get_resolver(nameserver, dnstimeo):
+    key = (nameserver, dnstimeo)
+    with DNS_LOCK:
+        try:
+            return RESOLVER[key]
+        except KeyError:
+            pass
+
+        # setup Resolver instance without system default configuration
+        resolver = dns.asyncresolver.Resolver(configure=False)
+
+        # set parameters
+        resolver.nameservers = [nameserver]
+        resolver.timeout = float(dnstimeo)
+        resolver.lifetime = float(dnstimeo)
+
+        RESOLVER[key] = resolver
+        return resolver
+
+# END OF get_resolver()
+
+"""
+| neg_ttl(e)
+|  Get seconds to cache NXDOMAIN from SOA in the response
+|  (RFC 2308: the smaller of SOA TTL and SOA MINIMUM)
+|
+| Parameters
+| ----------
+| e : dns.resolver.NXDOMAIN
+|  exception raised by resolve()
+|
+| Return value
+| ------------
+| ttl : int
+"""
+def neg_ttl(e):
+    try:
+        for resp in e.responses().values():
+            for rrset in resp.authority:
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    ttl = min(rrset.ttl, rrset[0].minimum)
+                    return min(ttl, DNS_MAX_NEG_TTL)
+    except Exception:
+        pass
+    return DNS_NEG_TTL
+
+# END OF neg_ttl()
+
+"""
+| get_nameservers(conf)
+|  Get the list of name servers from DNS_Address
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+|
+| Return value
+| ------------
+| nameservers : list
+"""
+def get_nameservers(conf):
+    return [x.strip() for x in conf[C.CF_DNSADDR].split(',')
+            if x.strip() != '']
+
+# END OF get_nameservers()
+
+"""
+| record_stats(nameserver, elapsed, result)
+|  Record latency statistics of a query
+|
+| Parameters
+| ----------
+| nameserver : str
+|  DNS resolver IP address
+| elapsed : float
+|  seconds of the query
+| result : str
+|  'wins', 'errors', 'cancel' or '' (answered but not used)
+"""
+def record_stats(nameserver, elapsed, result):
+    with DNS_LOCK:
+        stats = DNS_STATS.setdefault(nameserver, {
+            'queries' : 0,
+            'wins'    : 0,
+            'errors'  : 0,
+            'cancel'  : 0,
+            'time'    : 0.0,
+            'max'     : 0.0
+        })
+        if result == 'cancel':
+            stats['cancel'] += 1
+            return
+        stats['queries'] += 1
+        stats['time'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        if result != '':
+            stats[result] += 1
+
+# END OF record_stats()
+
+"""
+| get_dns_stats()
+|  Get latency statistics of each name server
+|
+| Parameters
+| ----------
+| (none)
+|
+| Return value
+| ------------
+| stats : dict
+|  stats[nameserver] = {
+|      'queries', 'wins', 'errors', 'cancel', 'max' : same as DNS_STATS
+|      'avg' : average seconds of a query
+|  }
+"""
+def get_dns_stats():
+    ret = {}
+    with DNS_LOCK:
+        for nameserver, stats in DNS_STATS.items():
+            ret[nameserver] = dict(stats)
+            if stats['queries'] > 0:
+                ret[nameserver]['avg'] = stats['time'] / stats['queries']
+            else:
+                ret[nameserver]['avg'] = 0.0
+            del ret[nameserver]['time']
+    return ret
+
+# END OF get_dns_stats()
+
+"""
+| query_server(nameserver, dnstimeo, host)
+|  Query A record of host to a name server
 |
 | Parameters
 | ----------
 | nameserver : str
 |  DNS resolver IP address
+| dnstimeo : int
+|  timeout of query
+| host : str
+|  hostname to query
+|
+| Return value
+| ------------
+| [code, answer, start]
+| code:
+|  0: no error
+|  1: NXDOMAIN
+|  2: system error
+| answer : dns.resolver.Answer / exception
+| start : float
+|  time the query was sent
+"""
+async def query_server(nameserver, dnstimeo, host):
+    resolver = get_resolver(nameserver, dnstimeo)
+    start = time.time()
+    try:
+        answers = await resolver.resolve(host, 'A', search=False)
+    except asyncio.CancelledError:
+        record_stats(nameserver, 0, 'cancel')
+        raise
+    except dns.resolver.NXDOMAIN as e:
+        return [1, e, start]
+    except Exception as e:
+        # timeout or other system error
+        record_stats(nameserver, time.time() - start, 'errors')
+        return [2, e, start]
+
+    return [0, answers, start]
+
+# END OF query_server()
+
+"""
+| race_servers(nameservers, dnstimeo, host)
+|  Query all name servers at the same time and use the first answer
+|  NXDOMAIN is also an answer. Errors of a server are ignored while
+|  other servers may answer. Queries still in progress are cancelled.
+|
+| Parameters
+| ----------
+| nameservers : list
+|  DNS resolver IP addresses
+| dnstimeo : int
+|  timeout of query
+| host : str
+|  hostname to query
+|
+| Return value
+| ------------
+| [code, answer]
+|  same as query_server()
+"""
+async def race_servers(nameservers, dnstimeo, host):
+    tasks = {}
+    for nameserver in nameservers:
+        task = asyncio.ensure_future(query_server(nameserver, dnstimeo, host))
+        tasks[task] = nameserver
+
+    result = None
+    pending = set(tasks.keys())
+    try:
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                code, answer, start = task.result()
+                if code == 2:
+                    if result == None:
+                        result = [code, answer]
+                    continue
+                elapsed = time.time() - start
+                if result == None or result[0] == 2:
+                    record_stats(tasks[task], elapsed, 'wins')
+                    result = [code, answer]
+                else:
+                    # answered at the same time
+                    record_stats(tasks[task], elapsed, '')
+            if result != None and result[0] != 2:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if len(pending) > 0:
+            await asyncio.wait(pending)
+
+    return result
+
+# END OF race_servers()
+
+"""
+| get_ipaddr_by_dns(conf, host)
+|  get IP address from DNS_Address
+|  If DNS_Address has several name servers (separated by ','), all of
+|  them are queried at the same time and the first answer is used.
+|  Answers are cached for the TTL of the record, and NXDOMAIN is
+|  cached for the negative TTL of the zone.
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
 | host : str
 |  hostname to query
 |
@@ -83,37 +393,335 @@ def get_ipaddr_by_sys(host):
 def get_ipaddr_by_dns(conf, host):
     nameserver = conf[C.CF_DNSADDR]
     dnstimeo = conf[C.CF_DNS_TIMEO]
+    key = (nameserver, host.lower())
 
-    # setup Resolver instance without system default configuration
-    resolver = dns.resolver.Resolver(configure=False)
-
-    # set parameters
-    resolver.nameservers = [nameserver]
-    resolver.timeout = dnstimeo
-    resolver.lifetime = dnstimeo
+    # cached answer
+    with DNS_LOCK:
+        try:
+            expire, code, ip = DNS_CACHE[key]
+            if time.time() < expire:
+                return [code, ip]
+            DNS_CACHE.pop(key)
+        except KeyError:
+            pass
 
     # do query
-    try:
-        answers = resolver.query(host, 'A')
-    except dns.resolver.NXDOMAIN as e:
+    code, answers = asyncio.run(
+        race_servers(get_nameservers(conf), dnstimeo, host))
+    if code == 1:
         # NXDOMAIN
-        return [1, e]
-    except dns.resolver.Timeout as e:
-        # timeout
-        return [2, e]
-    except Exception as e:
-        # other system error
-        return [2, e]
+        with DNS_LOCK:
+            DNS_CACHE[key] = [time.time() + neg_ttl(answers), 1, answers]
+        return [1, answers]
+    elif code == 2:
+        # timeout or other system error
+        return [2, answers]
+
+    ip = str(answers[0])
+    with DNS_LOCK:
+        DNS_CACHE[key] = [answers.expiration, 0, ip]
 
-    return [0, str(answers[0])]
+    return [0, ip]
 
 # END OF get_ipaddr_by_dns()
 
+"""
+| read_file_cache(path)
+|  Read entries of the DNS cache file
+|
+| Parameters
+| ----------
+| path : str
+|  path to the cache file
+|
+| Return value
+| ------------
+| entries : dict
+|  empty if no valid cache
+"""
+def read_file_cache(path):
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+        if cache['version'] != DNS_CACHE_VERSION:
+            return {}
+        entries = {}
+        for key, (fetched, expire, ip) in cache['entries'].items():
+            entries[key] = [float(fetched), float(expire), str(ip)]
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+    return entries
+
+# END OF read_file_cache()
+
+"""
+| save_file_cache(conf)
+|  Merge entries resolved by this process into the DNS cache file
+|  Called at exit. Entries older than DNS_CacheMaxStale are removed.
+|  Errors are ignored.
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+|
+| Return value
+| ------------
+| (void)
+"""
+def save_file_cache(conf):
+    with DNS_LOCK:
+        dirty = FILE_CACHE.get('dirty', {})
+        if len(dirty) == 0:
+            return
+        FILE_CACHE['dirty'] = {}
+    path = FILE_CACHE['path']
+
+    try:
+        lock_fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError:
+        return
+
+    tmpfile = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+
+        # merge with entries saved by other processes
+        entries = read_file_cache(path)
+        for key, entry in dirty.items():
+            if key not in entries or entries[key][0] < entry[0]:
+                entries[key] = entry
+
+        now = time.time()
+        for key in list(entries.keys()):
+            if stale_until(conf, entries[key]) <= now:
+                entries.pop(key)
+
+        cache = {
+            'version' : DNS_CACHE_VERSION,
+            'entries' : entries
+        }
+        with open(tmpfile, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmpfile, path)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.unlink(tmpfile)
+        except OSError:
+            pass
+    finally:
+        os.close(lock_fd)
+
+# END OF save_file_cache()
+
+"""
+| fresh_until(conf, entry)
+|  Get time until that a cached entry is used without query
+|  (DNS_CacheMaxAge after fetched, or the record TTL if it is 0)
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| entry : list
+|  [fetched, expire, ip_addr]
+|
+| Return value
+| ------------
+| time : float
+"""
+def fresh_until(conf, entry):
+    maxage = int(conf[C.CF_DNS_MAXAGE])
+    if maxage > 0:
+        return entry[0] + maxage
+    return entry[1]
+
+# END OF fresh_until()
+
+"""
+| stale_until(conf, entry)
+|  Get time until that a cached entry is used when DNS does not answer
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| entry : list
+|  [fetched, expire, ip_addr]
+|
+| Return value
+| ------------
+| time : float
+"""
+def stale_until(conf, entry):
+    return fresh_until(conf, entry) + int(conf[C.CF_DNS_MAXSTALE])
+
+# END OF stale_until()
+
+"""
+| file_cache_entry(conf, key)
+|  Get an entry of the DNS cache file (read at the first call)
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| key : str
+|  'nameserver|host'
+|
+| Return value
+| ------------
+| entry : list / None
+|  [fetched, expire, ip_addr]
+"""
+def file_cache_entry(conf, key):
+    path = conf[C.CF_DNS_CACHE]
+    with DNS_LOCK:
+        if FILE_CACHE.get('path') != path:
+            FILE_CACHE['path'] = path
+            FILE_CACHE['entries'] = read_file_cache(path)
+            FILE_CACHE['dirty'] = {}
+            atexit.register(save_file_cache, conf)
+        return FILE_CACHE['entries'].get(key)
+
+# END OF file_cache_entry()
+
+"""
+| lookup(conf, host)
+|  Resolve host by system or by DNS_Address
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| host : str
+|  hostname to query
+|
+| Return value
+| ------------
+| [code, ip_addr]
+|  same as get_ipaddr()
+"""
+def lookup(conf, host):
+    # split DNS_Address setting condition
+    if conf[C.CF_DNSADDR] == '':
+        # system mode
+        return get_ipaddr_by_sys(host)
+    # DNS mode
+    return get_ipaddr_by_dns(conf, host)
+
+# END OF lookup()
+
+"""
+| store_entry(conf, host, ip_addr)
+|  Store a resolved address in the DNS cache file entries
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| host : str
+|  hostname resolved
+| ip_addr : str
+|  IP address of host
+"""
+def store_entry(conf, host, ip_addr):
+    nameserver = conf[C.CF_DNSADDR]
+    cache_key = nameserver + '|' + host.lower()
+    now = time.time()
+    with DNS_LOCK:
+        try:
+            expire = DNS_CACHE[(nameserver, host.lower())][0]
+        except KeyError:
+            # system mode ; no TTL
+            expire = now
+        entry = [now, expire, ip_addr]
+        FILE_CACHE['entries'][cache_key] = entry
+        FILE_CACHE['dirty'][cache_key] = entry
+
+# END OF store_entry()
+
+"""
+| refresh_entry(conf, host, cache_key, result)
+|  Resolve host again for a stale entry (thread of refresh_stale())
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| host : str
+|  hostname to query
+| cache_key : str
+|  'nameserver|host'
+| result : list
+|  [code, ip_addr] of lookup() is stored
+"""
+def refresh_entry(conf, host, cache_key, result):
+    try:
+        code, ip_addr = lookup(conf, host)
+        if code == 0:
+            store_entry(conf, host, ip_addr)
+        result.extend([code, ip_addr])
+    finally:
+        with DNS_LOCK:
+            REFRESH.pop(cache_key, None)
+
+# END OF refresh_entry()
+
+"""
+| refresh_stale(conf, host, cache_key)
+|  Start resolving host in a thread and wait for the answer for
+|  DNS_STALE_WAIT seconds. The thread keeps running after that, and
+|  the new address is stored in the cache file when it answers.
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|  configuration data
+| host : str
+|  hostname to query
+| cache_key : str
+|  'nameserver|host'
+|
+| Return value
+| ------------
+| [code, ip_addr] : same as get_ipaddr()
+| None : if no answer in DNS_STALE_WAIT seconds
+"""
+def refresh_stale(conf, host, cache_key):
+    with DNS_LOCK:
+        try:
+            # already in progress by another thread
+            th, result = REFRESH[cache_key]
+        except KeyError:
+            result = []
+            # not daemon ; the answer is saved at exit
+            th = threading.Thread(target=refresh_entry,
+                                  args=(conf, host, cache_key, result))
+            REFRESH[cache_key] = [th, result]
+            th.start()
+
+    th.join(DNS_STALE_WAIT)
+    if len(result) == 0:
+        return None
+    return result
+
+# END OF refresh_stale()
+
 """
 | get_ipaddr(conf, host):
 |  Get IP address of WindowsPC
 |   system mode: by gethostbyname()
 |   DNS mode: by myself from DNS
+|  If DNS_CacheFile is set, addresses are kept in the file across runs,
+|  and a cached address is used for DNS_CacheMaxStale seconds after
+|  it expires when the name server does not answer, or does not answer
+|  in DNS_STALE_WAIT seconds (the lookup goes on to refresh the entry).
 |
 | Parameters
 | ----------
@@ -134,18 +742,33 @@ def get_ipaddr_by_dns(conf, host):
 |     error message if error detected
 """
 def get_ipaddr(conf, host):
-    # split DNS_Address setting condition
-    if conf[C.CF_DNSADDR] == '':
-        # system mode
-        code, ip_addr = get_ipaddr_by_sys(host)
-    else:
-        # DNS mode
-        code, ip_addr = get_ipaddr_by_dns(conf, host)
+    nameserver = conf[C.CF_DNSADDR]
+    cache_key = nameserver + '|' + host.lower()
+    entry = None
+    if conf[C.CF_DNS_CACHE] != '':
+        entry = file_cache_entry(conf, cache_key)
+        if entry != None and time.time() < fresh_until(conf, entry):
+            return [0, entry[2]]
 
-    if code == 1:
-        return [1, ip_addr]
-    if code == 2:
-        return [2, ip_addr]
+    if entry != None and time.time() < stale_until(conf, entry):
+        # stale entry ; do not wait long for the name server
+        result = refresh_stale(conf, host, cache_key)
+        if result == None:
+            # serve stale
+            return [0, entry[2]]
+        code, ip_addr = result
+        if code == 2:
+            # serve stale
+            return [0, entry[2]]
+        # new address is stored by refresh_entry()
+        return [code, ip_addr]
+
+    code, ip_addr = lookup(conf, host)
+    if code != 0:
+        return [code, ip_addr]
+
+    if conf[C.CF_DNS_CACHE] != '':
+        store_entry(conf, host, ip_addr)
 
     return [0, ip_addr]
 
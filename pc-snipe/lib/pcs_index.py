@@ -0,0 +1,425 @@
+#
+# pcs_index.py
+#  local index of Snipe-IT assets (ComputerName / asset tag -> id)
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import time
+import fcntl
+import sqlite3
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import common_defs as C
+
+#
+# module scope values
+#
+
+# format version of index file
+INDEX_VERSION = '1'
+
+# seconds to wait for the lock of index file
+INDEX_LOCK_TIMEO = 60
+
+# suffix of the updater lock file
+LOCK_SUFFIX = '.lock'
+
+# tables of assets
+#  TBL_ASSETS : assets used for lookup
+#  TBL_BUILD  : assets being built (replaces TBL_ASSETS when completed)
+TBL_ASSETS = 'assets'
+TBL_BUILD  = 'assets_build'
+
+# meta keys
+META_VERSION   = 'version'
+META_SOURCE    = 'source'
+META_WATERMARK = 'watermark'
+META_REFRESHED = 'refreshed'
+
+# lookup columns
+COL_NAME = 'name'
+COL_TAG  = 'asset_tag'
+
+INDEX_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS meta ('
+    ' key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS assets ('
+    ' id INTEGER PRIMARY KEY, asset_tag TEXT, name TEXT, updated_at TEXT)',
+    'CREATE INDEX IF NOT EXISTS assets_name ON assets (name)',
+    'CREATE INDEX IF NOT EXISTS assets_tag ON assets (asset_tag)',
+    'CREATE TABLE IF NOT EXISTS assets_build ('
+    ' id INTEGER PRIMARY KEY, asset_tag TEXT, name TEXT, updated_at TEXT)',
+]
+
+SQL_SET_META = 'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)'
+
+# opened index
+#  INDEX[path] = sqlite3.Connection
+INDEX = {}
+
+#
+# functions
+#
+
+"""
+| open_index(conf):
+|  Open the index file (create it if not exists)
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| db : sqlite3.Connection / None
+|     None if the index is disabled or cannot be opened
+"""
+def open_index(conf):
+    path = conf[C.CF_INDEX_FILE]
+    if path == '':
+        return None
+
+    try:
+        return INDEX[path]
+    except KeyError:
+        pass
+
+    try:
+        db = sqlite3.connect(path, timeout=INDEX_LOCK_TIMEO,
+                             isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        for sql in INDEX_SCHEMA:
+            db.execute(sql)
+    except sqlite3.Error:
+        return None
+
+    INDEX[path] = db
+    return db
+
+# END OF open_index()
+
+"""
+| get_meta(db, key):
+|  Get a meta value of the index
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| key : str
+|     meta key
+|
+| Return value
+| ------------
+| value : str
+|     '' if not set
+"""
+def get_meta(db, key):
+    row = db.execute('SELECT value FROM meta WHERE key = ?',
+                     (key,)).fetchone()
+    if row == None:
+        return ''
+    return row[0]
+
+# END OF get_meta()
+
+"""
+| refresh_state(db, source, interval):
+|  Check whether the index must be rebuilt or refreshed
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| source : str
+|     identifier of the data source (API URL and ComputerName field)
+| interval : int
+|     seconds between incremental refreshes
+|
+| Return value
+| ------------
+| [mode, watermark]
+| mode : str
+|     'build'   : the index is empty or made from another source
+|     'refresh' : the index is older than interval
+|     ''        : the index is fresh (or cannot be read)
+| watermark : str
+|     the latest updated_at in the index
+"""
+def refresh_state(db, source, interval):
+    try:
+        if get_meta(db, META_VERSION) != INDEX_VERSION or \
+           get_meta(db, META_SOURCE) != source:
+            return ['build', '']
+
+        watermark = get_meta(db, META_WATERMARK)
+        refreshed = float(get_meta(db, META_REFRESHED))
+    except sqlite3.Error:
+        # cannot read ; use the index as it is
+        return ['', '']
+    except ValueError:
+        refreshed = 0
+
+    if time.time() - refreshed >= interval:
+        return ['refresh', watermark]
+
+    return ['', watermark]
+
+# END OF refresh_state()
+
+"""
+| lock_update(conf):
+|  Take the updater lock of the index
+|  Only one process builds or refreshes the index at a time. The lock
+|  is a separate file, so that searches of other processes are not
+|  blocked while assets are paged from Snipe-IT.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| fd : int / None
+|     None if another process is updating the index
+"""
+def lock_update(conf):
+    try:
+        fd = os.open(conf[C.CF_INDEX_FILE] + LOCK_SUFFIX,
+                     os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    except OSError:
+        return None
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return None
+
+    return fd
+
+# END OF lock_update()
+
+"""
+| unlock_update(fd):
+|  Release the updater lock of the index
+|
+| Parameters
+| ----------
+| fd : int
+|     from lock_update()
+"""
+def unlock_update(fd):
+    os.close(fd)
+
+# END OF unlock_update()
+
+"""
+| write(db, sqls):
+|  Execute statements in a short write transaction
+|  (private function)
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| sqls : list
+|     list of [sql, params] ; params is a list of tuples for
+|     executemany() if sql is in a list
+|
+| Return value
+| ------------
+| True if committed
+"""
+def write(db, sqls):
+    try:
+        db.execute('BEGIN IMMEDIATE')
+        for sql, params in sqls:
+            if type(sql) is list:
+                db.executemany(sql[0], params)
+            else:
+                db.execute(sql, params)
+        db.execute('COMMIT')
+    except sqlite3.Error:
+        try:
+            db.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+        return False
+    return True
+
+# END OF write()
+
+"""
+| start_build(db):
+|  Clear the build table before building the index
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+|
+| Return value
+| ------------
+| True if cleared
+"""
+def start_build(db):
+    return write(db, [['DELETE FROM ' + TBL_BUILD, ()]])
+
+# END OF start_build()
+
+"""
+| finish_build(db, source, watermark):
+|  Replace assets in the index by the build table
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| source : str
+|     identifier of the data source
+| watermark : str
+|     the latest updated_at in the build table
+|
+| Return value
+| ------------
+| True if replaced
+"""
+def finish_build(db, source, watermark):
+    return write(db, [
+        ['DELETE FROM ' + TBL_ASSETS, ()],
+        ['INSERT INTO {} SELECT * FROM {}'.format(TBL_ASSETS, TBL_BUILD), ()],
+        ['DELETE FROM ' + TBL_BUILD, ()],
+        ['DELETE FROM meta', ()],
+        [SQL_SET_META, (META_VERSION, INDEX_VERSION)],
+        [SQL_SET_META, (META_SOURCE, source)],
+        [SQL_SET_META, (META_WATERMARK, watermark)],
+        [SQL_SET_META, (META_REFRESHED, str(time.time()))]
+    ])
+
+# END OF finish_build()
+
+"""
+| finish_refresh(db, watermark):
+|  Record the end of an incremental refresh
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| watermark : str
+|     the latest updated_at in the index
+|
+| Return value
+| ------------
+| True if recorded
+"""
+def finish_refresh(db, watermark):
+    return write(db, [
+        [SQL_SET_META, (META_WATERMARK, watermark)],
+        [SQL_SET_META, (META_REFRESHED, str(time.time()))]
+    ])
+
+# END OF finish_refresh()
+
+"""
+| store_assets(db, rows, table=TBL_ASSETS):
+|  Store assets into the index
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| rows : list
+|     list of [id, asset_tag, name, updated_at]
+| table : str
+|     TBL_ASSETS or TBL_BUILD (while building)
+|
+| Return value
+| ------------
+| True if stored
+"""
+def store_assets(db, rows, table=TBL_ASSETS):
+    sql = 'INSERT OR REPLACE INTO {} (id, asset_tag, name, updated_at) ' \
+          'VALUES (?, ?, ?, ?)'
+    return write(db, [[[sql.format(table)], rows]])
+
+# END OF store_assets()
+
+"""
+| remove_asset(db, id):
+|  Remove an asset which no longer exists from the index
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| id : int
+|     asset id
+"""
+def remove_asset(db, id):
+    try:
+        db.execute('DELETE FROM assets WHERE id = ?', (id,))
+    except sqlite3.Error:
+        pass
+
+# END OF remove_asset()
+
+"""
+| lookup(db, column, value):
+|  Look up asset ids from the index
+|
+| Parameters
+| ----------
+| db : sqlite3.Connection
+|     opened index
+| column : str
+|     COL_NAME or COL_TAG
+| value : str
+|     ComputerName or asset tag
+|
+| Return value
+| ------------
+| ids : list
+|     asset ids (newest first, empty if not found)
+"""
+def lookup(db, column, value):
+    sql = 'SELECT id FROM assets WHERE {} = ? ORDER BY id DESC'
+    try:
+        rows = db.execute(sql.format(column), (value,)).fetchall()
+    except sqlite3.Error:
+        return []
+    return [row[0] for row in rows]
+
+# END OF lookup()
@@ -0,0 +1,416 @@
+#
+# pcs_journal.py
+#  write-behind journal of Snipe-IT updates
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import time
+import json
+import fcntl
+import concurrent.futures
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import common_defs as C
+from lib import snipeit_api as API
+
+#
+# module scope values
+#
+
+# suffix of the file holding entries being replayed
+REPLAY_SUFFIX = '.replay'
+
+# suffix of the lock file of the flusher
+LOCK_SUFFIX = '.lock'
+
+# entries failed this many times are dropped
+JOURNAL_MAX_ATTEMPTS = 20
+
+# entry keys
+ENT_ID       = 'id'
+ENT_TAG      = 'tag'
+ENT_PATCH    = 'patch'
+ENT_QUEUED   = 'queued'
+ENT_ATTEMPTS = 'attempts'
+
+#
+# functions
+#
+
+"""
+| open_locked(path):
+|  Open a journal file for appending and lock it
+|  The file may be truncated by the flusher, so it is reopened if it
+|  is replaced while waiting for the lock.
+|  (private function)
+|
+| Parameters
+| ----------
+| path : str
+|     path to the journal file
+|
+| Return value
+| ------------
+| fd : int
+|     locked file descriptor
+|
+| Exceptions
+| ----------
+| OSError : if the file cannot be opened
+"""
+def open_locked(path):
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except OSError:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+# END OF open_locked()
+
+"""
+| write_entries(fd, entries):
+|  Write entries to a locked file and sync them to the disk
+|  (private function)
+|
+| Parameters
+| ----------
+| fd : int
+|     file descriptor from open_locked()
+| entries : list
+|     journal entries
+|
+| Exceptions
+| ----------
+| OSError : if the entries cannot be written
+"""
+def write_entries(fd, entries):
+    data = ''
+    for entry in entries:
+        data += json.dumps(entry, ensure_ascii=False) + '\n'
+    data = data.encode('utf-8')
+    while len(data) > 0:
+        data = data[os.write(fd, data):]
+    os.fsync(fd)
+
+# END OF write_entries()
+
+"""
+| read_entries(fd):
+|  Read all entries of a locked file
+|  Broken lines (e.g. the last line written at a crash) are skipped.
+|  (private function)
+|
+| Parameters
+| ----------
+| fd : int
+|     file descriptor from open_locked()
+|
+| Return value
+| ------------
+| entries : list
+"""
+def read_entries(fd):
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = b''
+    while True:
+        chunk = os.read(fd, 65536)
+        if chunk == b'':
+            break
+        data += chunk
+
+    entries = []
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        try:
+            entry = json.loads(line)
+            entry[ENT_ID], entry[ENT_PATCH], entry[ENT_QUEUED]
+        except (ValueError, KeyError, TypeError):
+            continue
+        entries.append(entry)
+
+    return entries
+
+# END OF read_entries()
+
+"""
+| append(conf, id, tag, patch):
+|  Append a pending update to the journal
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| id : int
+|     ID of the asset to be updated
+| tag : str
+|     asset tag (for messages)
+| patch : dict
+|     dict data from make_snipeit_json()
+|
+| Return value
+| ------------
+| [code, message]
+| code : int
+|     0 : success
+|     2 : system error
+| message : str
+|     error message
+"""
+def append(conf, id, tag, patch):
+    path = conf[C.CF_JOURNAL_FILE]
+    entry = {
+        ENT_ID       : id,
+        ENT_TAG      : tag,
+        ENT_PATCH    : patch,
+        ENT_QUEUED   : time.time(),
+        ENT_ATTEMPTS : 0
+    }
+
+    try:
+        fd = open_locked(path)
+    except OSError as e:
+        err_msg = f"Cannot open journal file {path}: {e.strerror}"
+        return [2, err_msg]
+
+    try:
+        write_entries(fd, [entry])
+    except (OSError, TypeError, ValueError):
+        err_msg = 'Cannot write journal file ' + path
+        return [2, err_msg]
+    finally:
+        os.close(fd)
+
+    return [0, '']
+
+# END OF append()
+
+"""
+| pending(conf, id):
+|  Check whether updates of an asset are left in the journal
+|  Both of the journal and the replay file (being replayed by the
+|  flusher) are checked. A newer update of the asset must be appended
+|  to the journal, otherwise older entries overwrite it at replay.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| id : int
+|     ID of the asset
+|
+| Return value
+| ------------
+| True if updates are pending
+| (True also if the journal cannot be read)
+"""
+def pending(conf, id):
+    path = conf[C.CF_JOURNAL_FILE]
+    for jpath in [path, path + REPLAY_SUFFIX]:
+        try:
+            fd = os.open(jpath, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            for entry in read_entries(fd):
+                if str(entry[ENT_ID]) == str(id):
+                    return True
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+
+    return False
+
+# END OF pending()
+
+"""
+| coalesce(entries):
+|  Merge entries of the same asset into one
+|  Fields are merged in order of queued time, so that the newest value
+|  of each field is sent.
+|  (private function)
+|
+| Parameters
+| ----------
+| entries : list
+|     journal entries
+|
+| Return value
+| ------------
+| entries : list
+|     one entry for each asset
+"""
+def coalesce(entries):
+    merged = {}
+    for entry in sorted(entries, key=lambda e: e[ENT_QUEUED]):
+        key = str(entry[ENT_ID])
+        if key not in merged:
+            merged[key] = {
+                ENT_ID       : entry[ENT_ID],
+                ENT_TAG      : entry.get(ENT_TAG, ''),
+                ENT_PATCH    : {},
+                ENT_QUEUED   : entry[ENT_QUEUED],
+                ENT_ATTEMPTS : 0
+            }
+        dst = merged[key]
+        dst[ENT_PATCH].update(entry[ENT_PATCH])
+        dst[ENT_QUEUED] = entry[ENT_QUEUED]
+        dst[ENT_ATTEMPTS] = max(dst[ENT_ATTEMPTS],
+                                entry.get(ENT_ATTEMPTS, 0))
+
+    return list(merged.values())
+
+# END OF coalesce()
+
+"""
+| flush(conf):
+|  Replay pending updates in the journal
+|  Entries are moved to the replay file first, so that pc-snipe can
+|  append new entries while replaying. Entries of the same asset are
+|  merged and sent at the same time up to SnipeIT_API_PoolSize over
+|  the pooled connection. Failed entries are appended to the journal
+|  again, and dropped when Snipe-IT rejects them or they fail
+|  JOURNAL_MAX_ATTEMPTS times.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| [code, result]
+| code : int
+|     0 : success (no entries left)
+|     1 : some entries are left in the journal
+|     2 : system error
+| result : dict / str
+|     result['replayed'] : number of assets updated
+|     result['pending']  : number of assets left in the journal
+|     result['dropped']  : number of assets dropped
+|     result['messages'] : error messages of each asset
+|     str of error message if system error
+"""
+def flush(conf):
+    path = conf[C.CF_JOURNAL_FILE]
+    result = {
+        C.JSON_REPLAYED : 0,
+        C.JSON_PENDING  : 0,
+        C.JSON_DROPPED  : 0,
+        C.JSON_MSG      : []
+    }
+
+    # only one flusher at a time
+    try:
+        lock_fd = os.open(path + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError as e:
+        err_msg = f"Cannot open journal file {path}{LOCK_SUFFIX}: {e.strerror}"
+        return [2, err_msg]
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        # another flusher is running
+        os.close(lock_fd)
+        return [0, result]
+
+    try:
+        # move entries to the replay file
+        # (entries left by a crashed flusher are kept in it)
+        try:
+            rfd = open_locked(path + REPLAY_SUFFIX)
+            try:
+                jfd = open_locked(path)
+                try:
+                    write_entries(rfd, read_entries(jfd))
+                    os.ftruncate(jfd, 0)
+                    os.fsync(jfd)
+                finally:
+                    os.close(jfd)
+                entries = coalesce(read_entries(rfd))
+            finally:
+                os.close(rfd)
+        except OSError as e:
+            err_msg = f"Cannot read journal file {path}: {e.strerror}"
+            return [2, err_msg]
+
+        # replay
+        pool = int(conf[C.CF_API_POOLSIZE])
+        with concurrent.futures.ThreadPoolExecutor(pool) as executor:
+            futures = [executor.submit(API.update_snipeit, conf,
+                                       entry[ENT_ID], entry[ENT_PATCH])
+                       for entry in entries]
+            results = [f.result() for f in futures]
+
+        retry = []
+        for entry, (code, msg) in zip(entries, results):
+            if code == 0:
+                result[C.JSON_REPLAYED] += 1
+                continue
+
+            entry[ENT_ATTEMPTS] += 1
+            fmt = '{} (id={}): {}'
+            result[C.JSON_MSG].append(
+                fmt.format(entry[ENT_TAG], entry[ENT_ID], msg))
+            if code == 1 or entry[ENT_ATTEMPTS] >= JOURNAL_MAX_ATTEMPTS:
+                # rejected by Snipe-IT or failed too many times
+                result[C.JSON_DROPPED] += 1
+            else:
+                retry.append(entry)
+
+        # put failed entries back
+        try:
+            if len(retry) > 0:
+                jfd = open_locked(path)
+                try:
+                    write_entries(jfd, retry)
+                finally:
+                    os.close(jfd)
+            os.unlink(path + REPLAY_SUFFIX)
+        except OSError as e:
+            err_msg = f"Cannot write journal file {path}: {e.strerror}"
+            return [2, err_msg]
+        result[C.JSON_PENDING] = len(retry)
+    finally:
+        os.close(lock_fd)
+
+    if len(retry) > 0:
+        return [1, result]
+    return [0, result]
+
+# END OF flush()
@@ -0,0 +1,186 @@
+#
+# pcs_json.py
+#  incremental parser of Snipe-IT API responses
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import json
+import codecs
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import common_defs as C
+
+#
+# module scope values
+#
+
+# bytes read from the response at once
+CHUNK_SIZE = 65536
+
+# JSON whitespace
+JSON_WS = ' \t\n\r'
+
+# chars which may follow a value
+JSON_DELIM = JSON_WS + ',]}'
+
+#
+# functions
+#
+
+"""
+| iter_text(resp):
+|  Read the body of a streamed response as str chunks
+|
+| Parameters
+| ----------
+| resp : requests.Response
+|     response requested with stream=True
+|
+| Yield value
+| -----------
+| chunk : str
+"""
+def iter_text(resp):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for data in resp.iter_content(CHUNK_SIZE):
+        chunk = decoder.decode(data)
+        if chunk != '':
+            yield chunk
+    chunk = decoder.decode(b'', final=True)
+    if chunk != '':
+        yield chunk
+
+# END OF iter_text()
+
+"""
+| stream_rows(chunks, head, key=C.JSON_ROWS):
+|  Parse a JSON object incrementally and yield elements of an array
+|  Only one element is decoded at a time, so the whole page is never
+|  held in memory. Other members of the object (total, status,
+|  messages, ...) are stored in head.
+|
+| Parameters
+| ----------
+| chunks : iterable
+|     str chunks of JSON text (e.g. iter_text())
+| head : dict
+|     members of the object except key are stored
+| key : str
+|     member name of the array to stream
+|
+| Yield value
+| -----------
+| row : any
+|     decoded element of the array
+|
+| Exceptions
+| ----------
+| ValueError : if the JSON text is broken
+"""
+def stream_rows(chunks, head, key=C.JSON_ROWS):
+    decoder = json.JSONDecoder()
+    it = iter(chunks)
+    # text read and not parsed yet is buf[pos:]
+    st = {'buf': '', 'pos': 0}
+
+    def more():
+        # read next chunk ; False if no more data
+        try:
+            chunk = next(it)
+        except StopIteration:
+            return False
+        st['buf'] = st['buf'][st['pos']:] + chunk
+        st['pos'] = 0
+        return True
+
+    def peek():
+        # skip whitespaces and return next char ('' if no more data)
+        while True:
+            buf = st['buf']
+            pos = st['pos']
+            while pos < len(buf) and buf[pos] in JSON_WS:
+                pos += 1
+            st['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                return ''
+
+    def take(chars):
+        # consume one of chars
+        c = peek()
+        if c == '' or c not in chars:
+            raise ValueError('Unexpected data in JSON')
+        st['pos'] += 1
+        return c
+
+    def value():
+        # decode a value
+        peek()
+        while True:
+            try:
+                obj, end = decoder.raw_decode(st['buf'], st['pos'])
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+                continue
+            if not isinstance(obj, (dict, list, str)) and \
+               (end == len(st['buf']) or st['buf'][end] not in JSON_DELIM):
+                # a number may continue in the next chunk
+                if more():
+                    continue
+            st['pos'] = end
+            return obj
+
+    take('{')
+    if peek() == '}':
+        return
+
+    while True:
+        name = value()
+        take(':')
+        if name == key and peek() == '[':
+            take('[')
+            if peek() == ']':
+                take(']')
+            else:
+                while True:
+                    yield value()
+                    if take(',]') == ']':
+                        break
+        else:
+            head[name] = value()
+
+        if take(',}') == '}':
+            return
+
+# END OF stream_rows()
@@ -0,0 +1,386 @@
+#
+# pcs_main.py
+#  collect an asset and update Snipe-IT (main process of pc-snipe)
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import ipaddress
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import common_defs as C
+from lib import pcs_snmp as SNMP
+from lib import snipeit_api as API
+from lib import pcs_dns
+from lib import pcs_journal as J
+
+#
+# module scope values
+#
+
+# search mode
+SMODE_TAG = 0
+SMODE_NAME = 1
+
+#
+# functions
+#
+
+"""
+| new_job(search_mode, search_arg)
+|  Make a job for collect()
+|
+| Parameters
+| ----------
+| search_mode : int
+|     SMODE_TAG or SMODE_NAME
+| search_arg : str
+|     asset tag or computer name
+|
+| Return value
+| ------------
+| job : dict
+|     job['search_mode'] : SMODE_TAG or SMODE_NAME
+|     job['search_arg']  : asset tag or computer name
+|     job['asset']       : asset record already fetched (-t only)
+|     job['asset_file']  : file of asset record already fetched (-t only)
+|     job['ipaddr']      : IP address already resolved
+|     job['debug_mode']  : 1 not to update Snipe-IT
+"""
+def new_job(search_mode, search_arg):
+    return {
+        'search_mode': search_mode,
+        'search_arg': search_arg,
+        'asset': None,
+        'asset_file': '',
+        'ipaddr': '',
+        'debug_mode': 0
+    }
+
+# END OF new_job()
+
+"""
+| error_result(code, err_list)
+|  Build error JSON
+|
+| Parameters
+| ----------
+| code : int
+|     error code
+| err_list : list
+|     error messages
+|
+| Return value
+| ------------
+| ret_arr : dict
+"""
+def error_result(code, err_list):
+    ret_arr = {
+        C.JSON_STATUS : code,
+        C.JSON_MSG    : err_list,
+        C.JSON_TAG    : '',
+        C.JSON_BEFORE : [],
+        C.JSON_AFTER  : []
+    }
+    return ret_arr
+
+# END OF error_result()
+
+"""
+| fail(code, err_list)
+|  Build the return value of collect() for errors
+|
+| Parameters
+| ----------
+| code : int
+|     error code (exit code of pc-snipe)
+| err_list : list
+|     error messages
+|
+| Return value
+| ------------
+| [code, ret_arr]
+| ret_arr : dict
+|     from error_result()
+"""
+def fail(code, err_list):
+    return [code, error_result(code, err_list)]
+
+# END OF fail()
+
+"""
+| success_result(s_code, s_msg, dmap, before, after, stats)
+|  Build success JSON
+|
+| Parameters
+| ----------
+| s_code : int
+|     status code
+| s_msg  : list
+|     warning message
+| dmap : dict
+|     dictionary of DMAP
+| before : dict
+|     Before data (from Snipe-IT via API)
+| after : dict
+|     After data (from PC via SNMP)
+| stats : dict
+|     numbers of changed and unchanged fields
+|
+| Return value
+| ------------
+| print_json : dict
+"""
+def success_result(s_code, s_msg, dmap, before, after, stats):
+    try:
+        tag = before[C.JSON_ATAG]
+    except:
+        tag = ''
+
+    try:
+        btop = before[C.JSON_RAW][C.JSON_CFIELD]
+    except (KeyError, TypeError):
+        btop = {}
+    arr_b = {}
+    arr_a = {}
+    for elem, sit_fname in dmap.items():
+        bflg = 0
+        try:
+            val = btop[sit_fname][C.JSON_VALUE]
+            arr_b[sit_fname] = val
+        except:
+            bflg = 1
+
+        try:
+            val = after[C.JSON_CFIELD][elem]
+            arr_a[sit_fname] = val
+            if bflg == 1:
+                arr_b[sit_fname] = ''
+        except:
+            if bflg == 0:
+                arr_a[sit_fname] = ''
+
+    # build print JSON
+    print_json = {
+        C.JSON_STATUS    : s_code,
+        C.JSON_MSG       : s_msg,
+        C.JSON_TAG       : tag,
+        C.JSON_BEFORE    : arr_b,
+        C.JSON_AFTER     : arr_a,
+        C.JSON_CHANGED   : stats[C.JSON_CHANGED],
+        C.JSON_UNCHANGED : stats[C.JSON_UNCHANGED]
+    }
+    return print_json
+
+# END OF success_result()
+
+"""
+| collect(conf, dmap, job)
+|  Collect an asset by SNMP and update Snipe-IT
+|  The library version of pc-snipe -t / -n ; this is also called by
+|  long-lived workers which collect many assets.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| dmap : dict
+|     dictionary of DMAP
+| job : dict
+|     job made by new_job()
+|
+| Return value
+| ------------
+| [code, ret_arr]
+| code : int
+|     exit code of pc-snipe
+| ret_arr : dict
+|     output JSON of pc-snipe
+"""
+def collect(conf, dmap, job):
+    # search
+    scode = 1
+    if job['asset'] != None:
+        # asset record already fetched by the caller
+        scode, before = API.use_asset(conf, job['asset'],
+                                      job['search_arg'], dmap)
+    elif job['asset_file'] != '':
+        # asset record already fetched by the caller
+        scode, before = API.load_asset(conf, job['asset_file'],
+                                       job['search_arg'], dmap)
+    if scode != 0:
+        if job['search_mode'] == SMODE_TAG:
+            scode, before = API.search_by_tag(conf, job['search_arg'],
+                                              dmap)
+        elif job['search_mode'] == SMODE_NAME:
+            scode, before = API.search_by_name(conf, job['search_arg'],
+                                               dmap)
+
+    if scode == 1:
+        # asset not found
+        return fail(C.ERRCODE_NOTAG, [before])
+    elif scode == 2:
+        # system error
+        return fail(C.ERRCODE_SYS_API, [before])
+
+    # check asset has the ComputerName
+    if before[C.JSON_COMPUTERNAME] == '':
+        # asset not found
+        return fail(C.ERRCODE_NOASSET, ['The asset has no ComputerName field.'])
+    computer_name = before[C.JSON_COMPUTERNAME]
+    computer_fqdn = computer_name + '.' + conf[C.CF_DNSDOMAIN]
+
+    # get community
+    comm = before[C.JSON_COMMUNITY]
+
+    # get IP address
+    ipaddr = ''
+    snmp_pre = None
+    if conf[C.CF_USE_IPHINT] == 'yes' and job['ipaddr'] == '':
+        # try IPaddr field of Snipe-IT if the PC there is the computer
+        # (not if the caller has resolved the name ; the lookup is
+        # already paid and the check would cost one more SNMP request)
+        hint = str(before[C.JSON_CFIELD].get(C.DMAP_IPADDR, ''))
+        try:
+            ipaddress.IPv4Address(hint)
+            code, snmp_pre = SNMP.check_sysname(conf, hint, comm,
+                                                computer_name)
+            if code == 0:
+                ipaddr = hint
+            else:
+                snmp_pre = None
+        except ValueError:
+            pass
+
+    if ipaddr == '' and job['ipaddr'] != '':
+        # resolved by the caller
+        ipaddr = job['ipaddr']
+
+    if ipaddr == '':
+        dns_code, ipaddr = pcs_dns.get_ipaddr(conf, computer_fqdn)
+        # dns error
+        if dns_code == 1:
+            # query error
+            return fail(C.ERRCODE_NOIP, [str(ipaddr)])
+        elif dns_code == 2:
+            # system error
+            return fail(C.ERRCODE_SYS_DNS, [ipaddr])
+
+    # get PC info by SNMP
+    snmp_code, snmp_data = SNMP.get_snmp(conf, dmap, ipaddr, comm,
+                                         snmp_data=snmp_pre)
+    if snmp_code == 1:
+        return fail(C.ERRCODE_NOSNMP, [snmp_data])
+    elif snmp_code == 2:
+        return fail(C.ERRCODE_SYS_SNMP, [snmp_data])
+
+    # accumulate after info
+    code, after = SNMP.accumulate_after(conf, dmap,
+                                        computer_name, ipaddr, snmp_data)
+    if code == 1:
+        return fail(C.ERRCODE_NOTMPL, [after])
+    elif code == 2:
+        return fail(C.ERRCODE_SYS_TMPL, [after])
+
+    # make JSON for API (changed fields only)
+    stats = {
+        C.JSON_CHANGED   : 0,
+        C.JSON_UNCHANGED : 0
+    }
+    schema = None
+    if conf[C.CF_FIELD_CACHE] != '' or API.no_custom_fields(before):
+        # resolve db columns from the fieldset of the model ; with the
+        # cache file, pc-snipe processes share one /fieldsets request
+        scode, schema = API.get_schema(conf)
+        if scode != 0:
+            schema = None
+    sit_arr = API.make_snipeit_json(dmap, before, after, stats, schema)
+
+    # update Snipe-IT
+    queued = None
+    if job['debug_mode'] == 0:
+        if sit_arr == False:
+            # no custom field found
+            return fail(101, ['Unknown error'])
+
+        # update by API (skip if nothing changed)
+        if len(sit_arr) > 0:
+            if conf[C.CF_JOURNAL_FILE] != '' and \
+               conf[C.CF_JOURNAL_MODE] == C.JMODE_ALWAYS:
+                # written by the flusher (pc-snipe -F)
+                code, msg = J.append(conf, before[C.JSON_ID],
+                                     before[C.JSON_ATAG], sit_arr)
+                if code != 0:
+                    return fail(C.ERRCODE_SYS_JNL, [msg])
+                queued = 'written by pc-snipe -F'
+            elif conf[C.CF_JOURNAL_FILE] != '' and \
+                 J.pending(conf, before[C.JSON_ID]):
+                # queue after older updates of the asset, so that they
+                # do not overwrite this update at replay
+                code, msg = J.append(conf, before[C.JSON_ID],
+                                     before[C.JSON_ATAG], sit_arr)
+                if code != 0:
+                    return fail(C.ERRCODE_SYS_JNL, [msg])
+                queued = 'older updates are pending'
+            else:
+                code, msg = API.update_snipeit(conf, before[C.JSON_ID],
+                                               sit_arr)
+                if code == 2 and conf[C.CF_JOURNAL_FILE] != '':
+                    # keep the update to replay later
+                    jcode, jmsg = J.append(conf, before[C.JSON_ID],
+                                           before[C.JSON_ATAG], sit_arr)
+                    if jcode != 0:
+                        return fail(C.ERRCODE_SYS_API, [msg, jmsg])
+                    queued = msg
+                elif code != 0:
+                    return fail(C.ERRCODE_SYS_API, [msg])
+
+    # decide success exit code
+    dif_arr = after[C.JSON_DIFF]
+    if queued != None:
+        s_code = C.ERRCODE_QUEUED
+        s_msg = ['Update is queued in the journal ({})'.format(queued)]
+    elif dif_arr[C.JDIF_COMPUTERNAME] == True:
+        s_code = C.ERRCODE_DIFF
+        s_fmt = 'ComputerName is differ (Snipe-IT: {} / PC: {})'
+        s_msg = [s_fmt.format(before[C.JSON_COMPUTERNAME],
+                             after[C.JSON_CFIELD][C.JSON_COMPUTERNAME])]
+    elif dif_arr[C.JDIF_OSNAME] == True:
+        s_code = C.ERRCODE_OS
+        s_fmt = 'The computer may not be Windows ({})'
+        s_msg = [s_fmt.format(after[C.JSON_CFIELD][C.JSON_COMPUTERINFO])]
+    else:
+        s_code = C.ERRCODE_SUCCESS
+        s_msg = [] 
+
+    return [s_code, success_result(s_code, s_msg, dmap, before, after, stats)]
+
+# END OF collect()
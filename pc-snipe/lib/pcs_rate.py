@@ -0,0 +1,252 @@
+#
+# pcs_rate.py
+#  rate limiter of Snipe-IT API shared by processes
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import time
+import fcntl
+import threading
+import email.utils
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import common_defs as C
+
+#
+# module scope values
+#
+
+# longest wait requested by Retry-After or backoff (seconds)
+RATE_MAX_WAIT = 300
+
+# longest backoff without Retry-After (seconds)
+RATE_MAX_BACKOFF = 60
+
+# hold by Retry-After in this process (used if no rate limit)
+#  HOLD['until'] : time until that requests are held
+HOLD = {'until': 0.0}
+HOLD_LOCK = threading.Lock()
+
+#
+# functions
+#
+
+"""
+| rate_file(conf):
+|  Get path to the state file of the rate limiter
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| path : str
+"""
+def rate_file(conf):
+    return conf[C.CF_API_RATEFILE]
+
+# END OF rate_file()
+
+"""
+| update_state(conf, func):
+|  Read, update and write the state under the file lock
+|  The state is 'tokens last until' ; tokens in the bucket, the time
+|  they were counted and the time until that requests are held.
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| func : function
+|     func(state, now) updates state list and returns the result
+|
+| Return value
+| ------------
+| result of func / None if the state file cannot be used
+"""
+def update_state(conf, func):
+    rate = float(conf[C.CF_API_RATE]) / 60
+    burst = max(1.0, rate)
+
+    # open for each call, so that threads are also locked each other
+    try:
+        fd = os.open(rate_file(conf),
+                     os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+    except OSError:
+        return None
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        now = time.time()
+
+        try:
+            data = os.pread(fd, 128, 0).decode('ascii').split()
+            state = [float(data[0]), float(data[1]), float(data[2])]
+        except (OSError, ValueError, IndexError, UnicodeDecodeError):
+            state = [burst, now, 0.0]
+
+        # refill the bucket
+        if state[1] > now:
+            state[1] = now
+        state[0] = min(burst, state[0] + (now - state[1]) * rate)
+        state[1] = now
+        # ignore a broken hold
+        if state[2] > now + RATE_MAX_WAIT:
+            state[2] = now
+
+        result = func(state, now)
+
+        data = '{:.6f} {:.6f} {:.6f}\n'.format(*state).encode('ascii')
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, data, 0)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+    return result
+
+# END OF update_state()
+
+"""
+| acquire(conf):
+|  Wait for a token of the rate limiter before a request
+|  SnipeIT_API_RateLimit requests per minute are allowed in total of
+|  all processes using the same SnipeIT_API_RateFile. If it is 0, the
+|  state file is not used and only a hold of this process is waited.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| (void)
+"""
+def acquire(conf):
+    rate = float(conf[C.CF_API_RATE]) / 60
+
+    if rate == 0:
+        while True:
+            with HOLD_LOCK:
+                wait = HOLD['until'] - time.time()
+            if wait <= 0:
+                return
+            time.sleep(min(wait, RATE_MAX_WAIT))
+
+    def take(state, now):
+        if state[2] > now:
+            # held by Retry-After
+            return state[2] - now
+        if state[0] < 1:
+            return (1 - state[0]) / rate
+        state[0] -= 1
+        return 0
+
+    while True:
+        wait = update_state(conf, take)
+        if wait == None or wait <= 0:
+            return
+        time.sleep(min(wait, RATE_MAX_WAIT))
+
+# END OF acquire()
+
+"""
+| hold(conf, seconds):
+|  Hold requests of all processes for a while
+|  If SnipeIT_API_RateLimit is 0, requests of this process are held.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| seconds : float
+|     seconds to hold
+|
+| Return value
+| ------------
+| (void)
+"""
+def hold(conf, seconds):
+    seconds = min(seconds, RATE_MAX_WAIT)
+
+    if int(conf[C.CF_API_RATE]) == 0:
+        with HOLD_LOCK:
+            HOLD['until'] = max(HOLD['until'], time.time() + seconds)
+        return
+
+    def set_hold(state, now):
+        state[2] = max(state[2], now + seconds)
+        # no burst after the hold
+        state[0] = 0.0
+
+    if update_state(conf, set_hold) == None:
+        # no shared state ; hold this process only
+        time.sleep(seconds)
+
+# END OF hold()
+
+"""
+| retry_after(resp, count):
+|  Get seconds to wait before retrying a throttled request
+|
+| Parameters
+| ----------
+| resp : requests.Response
+|     response of 429 or 503
+| count : int
+|     number of retries so far
+|
+| Return value
+| ------------
+| seconds : float
+"""
+def retry_after(resp, count):
+    value = resp.headers.get('Retry-After', '').strip()
+    if value.isdecimal():
+        return float(min(int(value), RATE_MAX_WAIT))
+
+    if value != '':
+        try:
+            when = email.utils.parsedate_to_datetime(value).timestamp()
+            return max(0.0, min(when - time.time(), RATE_MAX_WAIT))
+        except (TypeError, ValueError, OverflowError):
+            pass
+
+    # exponential backoff
+    return float(min(2 ** count, RATE_MAX_BACKOFF))
+
+# END OF retry_after()
@@ -30,6 +30,8 @@ import datetime
 import time
 import binascii
 import chardet
+import json
+import hashlib
 
 #
 # import from our library
@@ -41,6 +43,29 @@ from lib import common_defs as C
 from lib import pcs_tmpl as T
 from lib import mibmap as M
 
+#
+# rendered field cache
+#
+
+# max number of rendered fields to be kept
+RENDER_CACHE_MAX = 256
+
+# rendered fields
+#  RENDER_CACHE[key] = rendered string
+#  key is a hash of the input rows, the template and the list fingerprints
+RENDER_CACHE = {}
+
+# SNMPv2-MIB symbols which are always collected
+MANDATORY_SYMS = [
+    C.SSYM_SYSNAME,
+    C.SSYM_SYSDESCR
+]
+
+# timeout and retries to check the IP address hint
+#  (a stale address should fail fast)
+HINT_TIMEO   = 1
+HINT_RETRIES = 0
+
 #
 # functions
 #
@@ -159,8 +184,145 @@ def snmp_walk(ret_arr, modName, symName, router_ip, community):
 # END OF snmp_walk()
 
 """
-| get_snmp(conf, dmap, ip, comm)
+| snmp_get(ret_arr, modName, symName, index, router_ip, community,
+|          timeout=1, retries=5)
+|  Get a scalar by one SNMP GET
+|  The value is stored in the same format as snmp_walk().
+|
+| Parameters
+| ----------
+| ret_arr : dict
+|     data is stored to this
+| modName : str
+|     MIB module name
+| symName : str
+|     MIB symbol name
+| index : int
+|     instance index (0 for scalar)
+| router_ip : str
+|     IP address of WindowsPC
+| community : str
+|     Community
+| timeout : int
+|     seconds to wait for the response
+| retries : int
+|     number of retries
+|
+| Return value
+| ------------
+| [code, ret_arr / err_msg]
+"""
+def snmp_get(ret_arr, modName, symName, index, router_ip, community,
+             timeout=1, retries=5):
+    g = getCmd(SnmpEngine(),
+           CommunityData(community),
+           UdpTransportTarget((router_ip, 161), timeout=timeout,
+                              retries=retries),
+           ContextData(),
+           ObjectType(ObjectIdentity(modName, symName, index)))
+
+    try:
+        errorIndication, errorStatus, errorIndex, varBinds = next(g)
+    except:
+        # unknown error
+        err_msg = 'Unknown error'
+        return [2, err_msg]
+
+    if errorIndication:
+        err_msg = str(errorIndication)
+        return [1, err_msg]
+    elif errorStatus:
+        err_msg = '%s at %s' % (errorStatus.prettyPrint(),
+                errorIndex and varBinds[int(errorIndex) - 1][0] or '?')
+        return [1, err_msg]
+
+    for varBind in varBinds:
+        k = varBind[0].prettyPrint()
+        vp = varBind[1].prettyPrint()
+        k1, k2 = k.split('.')
+        try:
+            ret_arr[str(k1)][k2] = mb_conv(vp)
+        except:
+            ret_arr[str(k1)] = {}
+            ret_arr[str(k1)][str(k2)] = mb_conv(vp)
+
+    return [0, ret_arr]
+
+# END OF snmp_get()
+
+"""
+| same_computername(conf, org_name, new_name)
+|  Check if sysName is the ComputerName (with or without DNS_Domain)
+|
+| Parameters
+| ----------
+| conf : dict
+|     pc_snipe config data
+| org_name : str
+|     ComputerName got from Snipe-IT
+| new_name : str
+|     sysName got from WindowsPC
+|
+| Return value
+| ------------
+| True if same
+"""
+def same_computername(conf, org_name, new_name):
+    domain = conf[C.CF_DNSDOMAIN]
+    o_name1c = org_name.casefold()
+    o_name2c = (org_name + '.' + domain).casefold()
+    new_namec = new_name.casefold()
+    return (o_name1c == new_namec) or (o_name2c == new_namec)
+
+# END OF same_computername()
+
+"""
+| check_sysname(conf, ip, comm, computer_name)
+|  Check if the PC at the IP address is the computer
+|  sysName.0 is got by one SNMP GET and compared with computer_name.
+|
+| Parameters
+| ----------
+| conf : dict
+|     pc_snipe config data
+| ip : str
+|     IP address to check (e.g. IPaddr field of Snipe-IT)
+| comm : str
+|     Community
+| computer_name : str
+|     ComputerName got from Snipe-IT
+|
+| Return value
+| ------------
+| [code, snmp_data / err_msg]
+| code:
+|     0: the PC is the computer (snmp_data can be passed to get_snmp())
+|     1: no response or other computer
+|     2: system error
+"""
+def check_sysname(conf, ip, comm, computer_name):
+    ret_arr = {}
+    code, arr = snmp_get(ret_arr, C.SMOD_SNMPV2, C.SSYM_SYSNAME, 0, ip, comm,
+                         timeout=HINT_TIMEO, retries=HINT_RETRIES)
+    if code != 0:
+        return [code, arr]
+
+    try:
+        new_name = ret_arr[C.SMOD_SNMPV2 + '::' + C.SSYM_SYSNAME]['0']
+    except KeyError:
+        return [1, 'No sysName']
+
+    if not same_computername(conf, computer_name, new_name):
+        return [1, f"sysName is {new_name}"]
+
+    return [0, ret_arr]
+
+# END OF check_sysname()
+
+"""
+| get_snmp(conf, dmap, ip, comm, fields=None, snmp_data=None)
 |  Get asset data from WindowsPC by SNMP
+|  SNMP columns of each field are declared in FIELDS
 |
 | Parameters
 | ----------
@@ -172,6 +334,10 @@ def snmp_walk(ret_arr, modName, symName, router_ip, community):
 |     IP address of WindowsPC
 | comm : str
 |     Community
+| fields : list
+|     fields to be collected (None: all mapped fields)
+| snmp_data : dict
+|     data already got (e.g. by check_sysname())
 |
 | Return value
 | ------------
@@ -180,28 +346,23 @@ def snmp_walk(ret_arr, modName, symName, router_ip, community):
 | err_msg : str
 |     error message
 """
-def get_snmp(conf, dmap, ip, comm):
+def get_snmp(conf, dmap, ip, comm, fields=None, snmp_data=None):
     # intialize return array
     ret_arr = {}
+    if snmp_data != None:
+        ret_arr = snmp_data
 
     # mandatory data get
-    # ComputerName
-    mod = C.SMOD_SNMPV2
-    sym = C.SSYM_SYSNAME
-    code, arr = snmp_walk(ret_arr, mod, sym, ip, comm)
-    if code == 1:
-        return [1, arr]
-    if code == 2:
-        return [2, arr]
-
-    # ComputerInfo
-    mod = C.SMOD_SNMPV2
-    sym = C.SSYM_SYSDESCR
-    code, arr = snmp_walk(ret_arr, mod, sym, ip, comm)
-    if code == 1:
-        return [1, arr]
-    if code == 2:
-        return [2, arr]
+    # (ComputerName and ComputerInfo)
+    for sym in MANDATORY_SYMS:
+        if C.SMOD_SNMPV2 + '::' + sym in ret_arr:
+            # already got
+            continue
+        code, arr = snmp_walk(ret_arr, C.SMOD_SNMPV2, sym, ip, comm)
+        if code == 1:
+            return [1, arr]
+        if code == 2:
+            return [2, arr]
 
     # do snmpwalk for each field type
     # assets data accumulates to ret_arr
@@ -210,69 +371,13 @@ def get_snmp(conf, dmap, ip, comm):
         C.SMOD_HOSTR  : {},
         C.SMOD_IFMIB  : {}
     }
-    for elem in dmap:
-        if dmap[elem] == '':
-            # not set
-            continue
-
-        if elem == C.DMAP_COMPUTERNAME:
-            # already got
-            continue
-        elif elem == C.DMAP_IPADDR:
-            continue
-        elif elem == C.DMAP_COMMUNITY:
-            mod = C.SMOD_SNMPV2
-            sym_arr[mod][C.SSYM_SYSNAME] = '1'
-        elif elem == C.DMAP_CPUTHREADS:
-            mod = C.SMOD_HOSTR
-            sym_arr[mod][C.SSYM_PROC_FRWID] = '1'
-        elif elem == C.DMAP_MEMORYSIZE:
-            mod = C.SMOD_HOSTR
-            sym_arr[mod][C.SSYM_MEMSIZE] = '1'
-        elif elem == C.DMAP_DISKSIZE:
-            mod = C.SMOD_HOSTR
-            sym_arr[mod][C.SSYM_STA_TYPE] = '1'
-            sym_arr[mod][C.SSYM_STA_DESCR] = '1'
-            sym_arr[mod][C.SSYM_STA_AUNITS] = '1'
-            sym_arr[mod][C.SSYM_STA_SIZE] = '1'
-        elif elem == C.DMAP_DISKINFO:
-            mod = C.SMOD_HOSTR
-            """
-            sym_arr[mod][C.SSYM_DEVTYPE] = '1'
-            sym_arr[mod][C.SSYM_DEVDESCR] = '1'
-            sym_arr[mod][C.SSYM_DISK_ACCESS] = '1'
-            sym_arr[mod][C.SSYM_DISK_MEDIA] = '1'
-            sym_arr[mod][C.SSYM_DISK_REMOVEBLE] = '1'
-            sym_arr[mod][C.SSYM_DISK_CAPACITY] = '1'
-            """
-            sym_arr[mod][C.SSYM_STA_TYPE] = '1'
-            sym_arr[mod][C.SSYM_STA_DESCR] = '1'
-            sym_arr[mod][C.SSYM_STA_AUNITS] = '1'
-            sym_arr[mod][C.SSYM_STA_SIZE] = '1'
-        elif elem == C.DMAP_APPLI:
-            mod = C.SMOD_HOSTR
-            sym_arr[mod][C.SSYM_SW_CHANGE] = '1'
-            sym_arr[mod][C.SSYM_SW_UPDATE] = '1'
-            sym_arr[mod][C.SSYM_SW_NAME] = '1'
-            sym_arr[mod][C.SSYM_SW_TYPE] = '1'
-            sym_arr[mod][C.SSYM_SW_DATE] = '1'
-        elif elem == C.DMAP_COMPUTERINFO:
-            # already got
-            continue
-        elif elem == C.DMAP_DEVICEINFO:
-            mod = C.SMOD_HOSTR
-            sym_arr[mod][C.SSYM_DEVTYPE] = '1'
-            sym_arr[mod][C.SSYM_DEVDESCR] = '1'
-        elif elem == C.DMAP_NETWORKINFO:
-            mod = C.SMOD_IFMIB
-            sym_arr[mod][C.SSYM_IFDSCR] = '1'
-            sym_arr[mod][C.SSYM_IFTYPE] = '1'
-            sym_arr[mod][C.SSYM_IFPHYSADDR] = '1'
-            sym_arr[mod][C.SSYM_IFNAME] = '1'
-            sym_arr[mod][C.SSYM_IFPRESENT] = '1'
-            sym_arr[mod][C.SSYM_IFALIAS] = '1'
-        else:
-            continue
+    for elem in active_fields(dmap, fields):
+        for mod, syms in FIELDS[elem]['syms'].items():
+            for sym in syms:
+                if mod == C.SMOD_SNMPV2 and sym in MANDATORY_SYMS:
+                    # already got
+                    continue
+                sym_arr[mod][sym] = '1'
 
     # do snmp_walk
     for mod, syms in sym_arr.items():
@@ -294,7 +399,7 @@ def get_snmp(conf, dmap, ip, comm):
 
 
 """
-| proc_computername()
+| proc_computername(after_data, snmp_data, fnfmt, ctx)
 |  process ComputerName to output format
 |
 | Parameters
@@ -303,21 +408,20 @@ def get_snmp(conf, dmap, ip, comm):
 |     Return data structure to be stored
 | snmp_data : dict
 |     SNMP data
-| org_name : str
-|     ComputerName got from Snipe-IT
+| fnfmt : str
+|     Template filename format string (not used)
+| ctx : dict
+|     processing context (see accumulate_after())
+|     ctx['computer_name'] : ComputerName got from Snipe-IT
 |
 | Return value
 | ------------
 | (This function always returns 0)
 """
-def proc_computername(after_data, snmp_data, org_name, domain):
+def proc_computername(after_data, snmp_data, fnfmt, ctx):
+    org_name = ctx['computer_name']
     new_name = snmp_data[C.SMOD_SNMPV2 + '::' + C.SSYM_SYSNAME]['0']
-    o_name1 = org_name
-    o_name2 = org_name + '.' + domain
-    o_name1c = o_name1.casefold()
-    o_name2c = o_name2.casefold()
-    new_namec = new_name.casefold()
-    if (o_name1c != new_namec) and (o_name2c != new_namec):
+    if not same_computername(ctx['conf'], org_name, new_name):
         # if different ComputerName detected
         after_data[C.JSON_DIFF][C.JDIF_COMPUTERNAME] = True
     after_data[C.JSON_CFIELD][C.JSON_COMPUTERNAME] = new_name
@@ -326,7 +430,7 @@ def proc_computername(after_data, snmp_data, org_name, domain):
 # END OF proc_computername()
 
 """
-| proc_computerinfo(after_data, snmp_data, fnfmt)
+| proc_computerinfo(after_data, snmp_data, fnfmt, ctx)
 |  process ComputerInfo to output format
 |
 | Parameters
@@ -337,13 +441,15 @@ def proc_computername(after_data, snmp_data, org_name, domain):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_computerinfo(after_data, snmp_data, fnfmt):
+def proc_computerinfo(after_data, snmp_data, fnfmt, ctx):
     new_name = snmp_data[C.SMOD_SNMPV2 + '::' + C.SSYM_SYSDESCR]['0']
 
     # replace TAGs
@@ -355,10 +461,10 @@ def proc_computerinfo(after_data, snmp_data, fnfmt):
         'loop': None,
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_COMPUTERINFO), True)
+    code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_COMPUTERINFO), True)
     if code != 0:
         return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.render_tmpl(tmpl, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_COMPUTERINFO] = val
@@ -370,7 +476,7 @@ def proc_computerinfo(after_data, snmp_data, fnfmt):
 # END OF proc_computerinfo()
 
 """
-| proc_cputhreads(after_data, snmp_data, fnfmt)
+| proc_cputhreads(after_data, snmp_data, fnfmt, ctx)
 |  process CpuThreads to output format
 |
 | Parameters
@@ -383,13 +489,16 @@ def proc_computerinfo(after_data, snmp_data, fnfmt):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_cputhreads(after_data, snmp_data, fnfmt, conf):
+def proc_cputhreads(after_data, snmp_data, fnfmt, ctx):
+    conf = ctx['conf']
     topstr = C.SMOD_HOSTR + '::' + C.SSYM_PROC_FRWID
     digits = conf[C.CF_CPUTHDS_DIGITS]
     dfmt = '{: >' + digits + '}'
@@ -408,10 +517,10 @@ def proc_cputhreads(after_data, snmp_data, fnfmt, conf):
         'loop': None,
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_CPUTHREADS), True)
+    code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_CPUTHREADS), True)
     if code != 0:
         return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.render_tmpl(tmpl, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_CPUTHREADS] = str(val)
@@ -420,7 +529,7 @@ def proc_cputhreads(after_data, snmp_data, fnfmt, conf):
 # END OF proc_cputhreads():
 
 """
-| proc_memorysize(after_data, snmp_data, fnfmt, conf)
+| proc_memorysize(after_data, snmp_data, fnfmt, ctx)
 |  process MemorySize to output format
 |
 | Parameters
@@ -433,13 +542,16 @@ def proc_cputhreads(after_data, snmp_data, fnfmt, conf):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_memorysize(after_data, snmp_data, fnfmt, conf):
+def proc_memorysize(after_data, snmp_data, fnfmt, ctx):
+    conf = ctx['conf']
     topstr = C.SMOD_HOSTR + '::' + C.SSYM_MEMSIZE
     unit = conf[C.CF_MEMSIZE_UNIT]
     digits = int(conf[C.CF_MEMSIZE_DIGITS]) + 2
@@ -473,10 +585,10 @@ def proc_memorysize(after_data, snmp_data, fnfmt, conf):
         'loop': None,
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_MEMORYSIZE), True)
+    code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_MEMORYSIZE), True)
     if code != 0:
         return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.render_tmpl(tmpl, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_MEMORYSIZE] = str(val)
@@ -485,8 +597,8 @@ def proc_memorysize(after_data, snmp_data, fnfmt, conf):
 # END OF proc_memorysize():
 
 """
-| proc_disksize(after_data, snmp_data, fnfmt)
-|  process DiskInfo to output format
+| proc_disksize(after_data, snmp_data, fnfmt, ctx)
+|  process DiskSize to output format
 |
 | Parameters
 | ----------
@@ -498,13 +610,16 @@ def proc_memorysize(after_data, snmp_data, fnfmt, conf):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_disksize(after_data, snmp_data, fnfmt, conf):
+def proc_disksize(after_data, snmp_data, fnfmt, ctx):
+    conf = ctx['conf']
     unit = conf[C.CF_DISKSIZE_UNIT]
     digits = int(conf[C.CF_DISKSIZE_DIGITS]) + 2
     dfmt = '{: >' + str(digits) + '.1f}'
@@ -561,7 +676,7 @@ def proc_disksize(after_data, snmp_data, fnfmt, conf):
 # END OF proc_disksize()
 
 """
-| proc_disksize(after_data, snmp_data, fnfmt)
+| proc_diskinfo(after_data, snmp_data, fnfmt, ctx)
 |  process DiskInfo to output format
 |
 | Parameters
@@ -572,13 +687,16 @@ def proc_disksize(after_data, snmp_data, fnfmt, conf):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_diskinfo(after_data, snmp_data, fnfmt, conf):
+def proc_diskinfo(after_data, snmp_data, fnfmt, ctx):
+    conf = ctx['conf']
     unit = conf[C.CF_DISKSIZE_UNIT]
     digits = int(conf[C.CF_DISKSIZE_DIGITS]) + 2
     dfmt = '{:0>' + str(digits) + '.1f}'
@@ -699,10 +817,10 @@ def proc_diskinfo(after_data, snmp_data, fnfmt, conf):
         },
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_DISKINFO), False)
+    code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_DISKINFO), False)
     if code != 0:
         return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.render_tmpl(tmpl, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_DISKINFO] = val
@@ -712,7 +830,7 @@ def proc_diskinfo(after_data, snmp_data, fnfmt, conf):
 # END OF proc_diskinfo():
 
 """
-| proc_appli(after_data, snmp_data)
+| proc_appli(after_data, snmp_data, fnfmt, ctx)
 |  process Appli to output format
 |
 | Parameters
@@ -723,39 +841,74 @@ def proc_diskinfo(after_data, snmp_data, fnfmt, conf):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
+|     ctx['key'] : rendered field cache key (None: do not use the cache)
+|     The cache holds the template whose loop section is rendered,
+|     LastChange and LastUpdate are replaced after that.
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_appli(after_data, snmp_data, fnfmt):
-    # process white/black list
-    wl = fnfmt['white'].format(C.DMAP_APPLI)
-    bl = fnfmt['black'].format(C.DMAP_APPLI)
-    lsyms = [
-        C.SMOD_HOSTR + '::' + C.SSYM_SW_NAME
-    ]
-    code, idx = T.get_tmpl_idx(wl, bl, snmp_data, lsyms)
-    if code != 0:
-        return idx
+def proc_appli(after_data, snmp_data, fnfmt, ctx):
+    key = ctx['key']
 
-    # build loop tags
-    tsyms = {
-        C.TAG_APPLI_NAME     : C.SMOD_HOSTR + '::' + C.SSYM_SW_NAME,
-        C.TAG_APPLI_INSTDATE : C.SMOD_HOSTR + '::' + C.SSYM_SW_DATE
-    }
-    ltag = []
-    i = 0
-    for k, v in idx.items():
-        letag = {}
-        for tn, sym in tsyms.items():
-            try:
-                snmp_data[sym][k]
-                letag[tn] = snmp_data[sym][k]
-            except:
-                continue
-        ltag.append(letag)
+    # get loop section rendered template from the cache
+    body = None
+    if key != None:
+        try:
+            body = RENDER_CACHE[key]
+        except KeyError:
+            pass
+
+    if body == None:
+        # process white/black list
+        wl = fnfmt['white'].format(C.DMAP_APPLI)
+        bl = fnfmt['black'].format(C.DMAP_APPLI)
+        lsyms = [
+            C.SMOD_HOSTR + '::' + C.SSYM_SW_NAME
+        ]
+        code, idx = T.get_tmpl_idx(wl, bl, snmp_data, lsyms)
+        if code != 0:
+            return idx
+
+        # build loop tags
+        tsyms = {
+            C.TAG_APPLI_NAME     : C.SMOD_HOSTR + '::' + C.SSYM_SW_NAME,
+            C.TAG_APPLI_INSTDATE : C.SMOD_HOSTR + '::' + C.SSYM_SW_DATE
+        }
+        ltag = []
+        i = 0
+        for k, v in idx.items():
+            letag = {}
+            for tn, sym in tsyms.items():
+                try:
+                    snmp_data[sym][k]
+                    letag[tn] = snmp_data[sym][k]
+                except:
+                    continue
+            ltag.append(letag)
+
+        # Replace loop TAGs
+        tags = {
+            'one': None,
+            'loop': {
+                'start': C.LTAG_APPLI_S,
+                'end'  : C.LTAG_APPLI_E,
+                'rep'  : ltag
+            },
+            'cond': None
+        }
+        code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_APPLI), False)
+        if code != 0:
+            return tmpl
+        body = T.render_tmpl(tmpl, tags)
+
+        # store loop section rendered template
+        if key != None:
+            store_render(key, body)
 
     # build LastChange and LastUpdate
     nowtime = int(time.time())
@@ -781,17 +934,10 @@ def proc_appli(after_data, snmp_data, fnfmt):
     }
     tags = {
         'one': tag,
-        'loop': {
-            'start': C.LTAG_APPLI_S,
-            'end'  : C.LTAG_APPLI_E,
-            'rep'  : ltag
-        },
+        'loop': None,
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_APPLI), False)
-    if code != 0:
-        return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.replace_tag(body, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_APPLI] = val
@@ -800,7 +946,7 @@ def proc_appli(after_data, snmp_data, fnfmt):
 # END OF proc_appli():
 
 """
-| proc_deviceinfo(after_data, snmp_data, fnfmt)
+| proc_deviceinfo(after_data, snmp_data, fnfmt, ctx)
 |  process DeviceInfo to output format
 |
 | Parameters
@@ -811,13 +957,15 @@ def proc_appli(after_data, snmp_data, fnfmt):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_deviceinfo(after_data, snmp_data, fnfmt):
+def proc_deviceinfo(after_data, snmp_data, fnfmt, ctx):
     # process white/black list
     wl = fnfmt['white'].format(C.DMAP_DEVICEINFO)
     bl = fnfmt['black'].format(C.DMAP_DEVICEINFO)
@@ -870,10 +1018,10 @@ def proc_deviceinfo(after_data, snmp_data, fnfmt):
         },
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_DEVICEINFO), False)
+    code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_DEVICEINFO), False)
     if code != 0:
         return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.render_tmpl(tmpl, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_DEVICEINFO] = val
@@ -881,7 +1029,7 @@ def proc_deviceinfo(after_data, snmp_data, fnfmt):
 # END OF proc_deviceinfo():
 
 """
-| proc_networkinfo(after_data, snmp_data, fnfmt)
+| proc_networkinfo(after_data, snmp_data, fnfmt, ctx)
 |  process NetworkInfo to output format
 |
 | Parameters
@@ -892,13 +1040,15 @@ def proc_deviceinfo(after_data, snmp_data, fnfmt):
 |     SNMP data
 | fnfmt : str
 |     Template filename format string
+| ctx : dict
+|     processing context (see accumulate_after())
 |
 | Return value
 | ------------
 | 0 : if no error
 | str : if error
 """
-def proc_networkinfo(after_data, snmp_data, fnfmt):
+def proc_networkinfo(after_data, snmp_data, fnfmt, ctx):
     # process white/black list
     wl = fnfmt['white'].format(C.DMAP_NETWORKINFO)
     bl = fnfmt['black'].format(C.DMAP_NETWORKINFO)
@@ -939,10 +1089,10 @@ def proc_networkinfo(after_data, snmp_data, fnfmt):
         },
         'cond': None
     }
-    code, tmpl = T.read_tmpl(fnfmt['tmpl'].format(C.DMAP_NETWORKINFO), False)
+    code, tmpl = T.get_tmpl(fnfmt['tmpl'].format(C.DMAP_NETWORKINFO), False)
     if code != 0:
         return tmpl
-    val = T.replace_tag(tmpl, tags)
+    val = T.render_tmpl(tmpl, tags)
 
     # store data
     after_data[C.JSON_CFIELD][C.DMAP_NETWORKINFO] = val
@@ -952,7 +1102,349 @@ def proc_networkinfo(after_data, snmp_data, fnfmt):
 # END OF proc_networkinfo():
 
 """
-| accumulate_after(conf, dmap, computer_name, snmp_data)
+| proc_ipaddr(after_data, snmp_data, fnfmt, ctx)
+|  process IPaddr to output format
+|
+| Parameters
+| ----------
+| after_data : dict
+|     Return data structure to be stored
+| snmp_data : dict
+|     SNMP data (not used)
+| fnfmt : str
+|     Template filename format string (not used)
+| ctx : dict
+|     processing context (see accumulate_after())
+|     ctx['ipaddr'] : IP address of WindowsPC
+|
+| Return value
+| ------------
+| (This function always returns 0)
+"""
+def proc_ipaddr(after_data, snmp_data, fnfmt, ctx):
+    after_data[C.JSON_CFIELD][C.DMAP_IPADDR] = ctx['ipaddr']
+    return 0
+
+# END OF proc_ipaddr()
+
+#
+# field processor registry
+#
+#  FIELDS[DMAP element] = {
+#   'syms'    : SNMP columns to be collected {module: [symbol, ...]}
+#   'proc'    : processor function (None: not stored to 'after')
+#   'tmpl'    : True if <TemplatePath>/<field>/template.conf is used
+#   'onemode' : True if only the first line of the template is used
+#   'lists'   : True if <TemplatePath>/<field>/{white,black}list.conf are used
+#   'cache'   : rendered field cache inputs (None: not cached)
+#    'syms'    : SNMP columns that the rendered string depends on
+#    'conf'    : config elements that the rendered string depends on
+#    'partial' : True if the cache holds the template with only the loop
+#                section rendered
+#  }
+#  The order of FIELDS is the order of collection and rendering.
+#
+FIELDS = {
+    C.DMAP_COMPUTERNAME : {
+        'syms'    : {C.SMOD_SNMPV2 : [C.SSYM_SYSNAME]},
+        'proc'    : proc_computername,
+        'tmpl'    : False,
+        'onemode' : False,
+        'lists'   : False,
+        'cache'   : None
+    },
+    C.DMAP_IPADDR : {
+        'syms'    : {},
+        'proc'    : proc_ipaddr,
+        'tmpl'    : False,
+        'onemode' : False,
+        'lists'   : False,
+        'cache'   : None
+    },
+    C.DMAP_COMMUNITY : {
+        'syms'    : {C.SMOD_SNMPV2 : [C.SSYM_SYSNAME]},
+        'proc'    : None,
+        'tmpl'    : False,
+        'onemode' : False,
+        'lists'   : False,
+        'cache'   : None
+    },
+    C.DMAP_CPUTHREADS : {
+        'syms'    : {C.SMOD_HOSTR : [C.SSYM_PROC_FRWID]},
+        'proc'    : proc_cputhreads,
+        'tmpl'    : True,
+        'onemode' : True,
+        'lists'   : False,
+        'cache'   : None
+    },
+    C.DMAP_MEMORYSIZE : {
+        'syms'    : {C.SMOD_HOSTR : [C.SSYM_MEMSIZE]},
+        'proc'    : proc_memorysize,
+        'tmpl'    : True,
+        'onemode' : True,
+        'lists'   : False,
+        'cache'   : None
+    },
+    C.DMAP_DISKSIZE : {
+        'syms'    : {
+            C.SMOD_HOSTR : [
+                C.SSYM_STA_TYPE,
+                C.SSYM_STA_DESCR,
+                C.SSYM_STA_AUNITS,
+                C.SSYM_STA_SIZE
+            ]
+        },
+        'proc'    : proc_disksize,
+        'tmpl'    : False,
+        'onemode' : False,
+        'lists'   : True,
+        'cache'   : {
+            'syms'    : [
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_TYPE,
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_DESCR,
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_AUNITS,
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_SIZE
+            ],
+            'conf'    : [C.CF_DISKSIZE_UNIT, C.CF_DISKSIZE_DIGITS],
+            'partial' : False
+        }
+    },
+    C.DMAP_DISKINFO : {
+        'syms'    : {
+            C.SMOD_HOSTR : [
+                C.SSYM_STA_TYPE,
+                C.SSYM_STA_DESCR,
+                C.SSYM_STA_AUNITS,
+                C.SSYM_STA_SIZE
+            ]
+        },
+        'proc'    : proc_diskinfo,
+        'tmpl'    : True,
+        'onemode' : False,
+        'lists'   : True,
+        'cache'   : {
+            'syms'    : [
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_TYPE,
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_DESCR,
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_AUNITS,
+                C.SMOD_HOSTR + '::' + C.SSYM_STA_SIZE
+            ],
+            'conf'    : [C.CF_DISKSIZE_UNIT, C.CF_DISKSIZE_DIGITS],
+            'partial' : False
+        }
+    },
+    C.DMAP_APPLI : {
+        'syms'    : {
+            C.SMOD_HOSTR : [
+                C.SSYM_SW_CHANGE,
+                C.SSYM_SW_UPDATE,
+                C.SSYM_SW_NAME,
+                C.SSYM_SW_TYPE,
+                C.SSYM_SW_DATE
+            ]
+        },
+        'proc'    : proc_appli,
+        'tmpl'    : True,
+        'onemode' : False,
+        'lists'   : True,
+        # LastChange/LastUpdate depend on the time of collection
+        'cache'   : {
+            'syms'    : [
+                C.SMOD_HOSTR + '::' + C.SSYM_SW_NAME,
+                C.SMOD_HOSTR + '::' + C.SSYM_SW_DATE
+            ],
+            'conf'    : [],
+            'partial' : True
+        }
+    },
+    C.DMAP_COMPUTERINFO : {
+        'syms'    : {C.SMOD_SNMPV2 : [C.SSYM_SYSDESCR]},
+        'proc'    : proc_computerinfo,
+        'tmpl'    : True,
+        'onemode' : True,
+        'lists'   : False,
+        'cache'   : None
+    },
+    C.DMAP_DEVICEINFO : {
+        'syms'    : {C.SMOD_HOSTR : [C.SSYM_DEVTYPE, C.SSYM_DEVDESCR]},
+        'proc'    : proc_deviceinfo,
+        'tmpl'    : True,
+        'onemode' : False,
+        'lists'   : True,
+        'cache'   : {
+            'syms'    : [
+                C.SMOD_HOSTR + '::' + C.SSYM_DEVDESCR,
+                C.SMOD_HOSTR + '::' + C.SSYM_DEVTYPE
+            ],
+            'conf'    : [],
+            'partial' : False
+        }
+    },
+    C.DMAP_NETWORKINFO : {
+        'syms'    : {
+            C.SMOD_IFMIB : [
+                C.SSYM_IFDSCR,
+                C.SSYM_IFTYPE,
+                C.SSYM_IFPHYSADDR,
+                C.SSYM_IFNAME,
+                C.SSYM_IFPRESENT,
+                C.SSYM_IFALIAS
+            ]
+        },
+        'proc'    : proc_networkinfo,
+        'tmpl'    : True,
+        'onemode' : False,
+        'lists'   : True,
+        'cache'   : {
+            'syms'    : [
+                C.SMOD_IFMIB + '::' + C.SSYM_IFTYPE,
+                C.SMOD_IFMIB + '::' + C.SSYM_IFDSCR,
+                C.SMOD_IFMIB + '::' + C.SSYM_IFPHYSADDR
+            ],
+            'conf'    : [],
+            'partial' : False
+        }
+    }
+}
+
+"""
+| active_fields(dmap, fields=None)
+|  Get fields to be collected and rendered
+|
+| Parameters
+| ----------
+| dmap : dict
+|     Snipe-IT data map
+| fields : list
+|     fields to be processed (None: all fields)
+|
+| Return value
+| ------------
+| elems : list
+|     DMAP elements which are mapped and registered, in FIELDS order
+"""
+def active_fields(dmap, fields=None):
+    elems = []
+    for elem in FIELDS:
+        if fields != None and elem not in fields:
+            continue
+        try:
+            if dmap[elem] == '':
+                # not set
+                continue
+        except KeyError:
+            continue
+        elems.append(elem)
+    return elems
+
+# END OF active_fields()
+
+"""
+| oneline_fields()
+|  Get fields whose template is one line
+|
+| Parameters
+| ----------
+| (none)
+|
+| Return value
+| ------------
+| elems : list
+|     DMAP elements
+"""
+def oneline_fields():
+    elems = []
+    for elem, field in FIELDS.items():
+        if field['tmpl'] == True and field['onemode'] == True:
+            elems.append(elem)
+    return elems
+
+# END OF oneline_fields()
+
+"""
+| render_key(elem, snmp_data, fnfmt, conf)
+|  Make rendered field cache key
+|
+| Parameters
+| ----------
+| elem : str
+|     DMAP element name
+| snmp_data : dict
+|     SNMP data
+| fnfmt : str
+|     Template filename format string
+| conf : dict
+|     pc_snipe config data
+|
+| Return value
+| ------------
+| key : str
+|     hash of the input rows, the template and the list fingerprints
+| None : if the field cannot be cached
+"""
+def render_key(elem, snmp_data, fnfmt, conf):
+    field = FIELDS[elem]
+    inputs = field['cache']
+    if inputs == None:
+        return None
+
+    # input rows
+    rows = {}
+    for sym in inputs['syms']:
+        try:
+            rows[sym] = snmp_data[sym]
+        except KeyError:
+            rows[sym] = {}
+
+    # config values
+    confs = []
+    for cf in inputs['conf']:
+        confs.append(conf[cf])
+
+    src = {
+        'field' : elem,
+        'rows'  : rows,
+        'conf'  : confs,
+        'tmpl'  : '-',
+        'white' : '-',
+        'black' : '-'
+    }
+    if field['tmpl'] == True:
+        src['tmpl'] = T.file_fingerprint(fnfmt['tmpl'].format(elem))
+    if field['lists'] == True:
+        src['white'] = T.file_fingerprint(fnfmt['white'].format(elem))
+        src['black'] = T.file_fingerprint(fnfmt['black'].format(elem))
+    src_json = json.dumps(src, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(src_json.encode('utf-8')).hexdigest()
+
+# END OF render_key()
+
+"""
+| store_render(key, val)
+|  Store rendered string to the rendered field cache
+|  The oldest entry is dropped if the cache is full.
+|
+| Parameters
+| ----------
+| key : str
+|     key from render_key()
+| val : str
+|     rendered string
+|
+| Return value
+| ------------
+| (void)
+"""
+def store_render(key, val):
+    if key not in RENDER_CACHE and len(RENDER_CACHE) >= RENDER_CACHE_MAX:
+        RENDER_CACHE.pop(next(iter(RENDER_CACHE)))
+    RENDER_CACHE[key] = val
+    return
+
+# END OF store_render()
+
+"""
+| accumulate_after(conf, dmap, computer_name, ipaddr, snmp_data, fields=None)
 |  Analyze SNMP data and shape them to 'after' structure
 |
 | Parameters
@@ -963,8 +1455,12 @@ def proc_networkinfo(after_data, snmp_data, fnfmt):
 |     Snipe-IT data map
 | computer_name : str
 |     Computer name which is used to search
+| ipaddr : str
+|     IP address of WindowsPC
 | snmp_data : dict
 |     Asset data got by SNMP
+| fields : list
+|     fields to be rendered (None: all mapped fields)
 |
 | Return value
 | ------------
@@ -973,7 +1469,8 @@ def proc_networkinfo(after_data, snmp_data, fnfmt):
 | err_msg : str
 |     error message
 """
-def accumulate_after(conf, dmap, computer_name, ipaddr, snmp_data):
+def accumulate_after(conf, dmap, computer_name, ipaddr, snmp_data,
+                     fields=None):
     after_data = {
         C.JSON_CFIELD : {},
         C.JSON_DIFF   : {
@@ -987,41 +1484,39 @@ def accumulate_after(conf, dmap, computer_name, ipaddr, snmp_data):
         'black' : conf[C.CF_TMPLPATH] + '/{}/blacklist.conf'
     }
 
-    for elem in dmap:
-        if dmap[elem] == '':
-            # not set
-            continue
+    # processing context
+    ctx = {
+        'conf'          : conf,
+        'computer_name' : computer_name,
+        'ipaddr'        : ipaddr,
+        'key'           : None
+    }
 
-        if elem == C.DMAP_COMPUTERNAME:
-            code = proc_computername(after_data, snmp_data,
-                                     computer_name, conf[C.CF_DNSDOMAIN]
-                                    )
-        elif elem == C.DMAP_IPADDR:
-            after_data[C.JSON_CFIELD][C.DMAP_IPADDR] = ipaddr
-        elif elem == C.DMAP_COMMUNITY:
-            continue
-        elif elem == C.DMAP_CPUTHREADS:
-            code = proc_cputhreads(after_data, snmp_data, fn_fmt, conf)
-        elif elem == C.DMAP_MEMORYSIZE:
-            code = proc_memorysize(after_data, snmp_data, fn_fmt, conf)
-        elif elem == C.DMAP_DISKSIZE:
-            code = proc_disksize(after_data, snmp_data, fn_fmt, conf)
-        elif elem == C.DMAP_DISKINFO:
-            code = proc_diskinfo(after_data, snmp_data, fn_fmt, conf)
-        elif elem == C.DMAP_APPLI:
-            code = proc_appli(after_data, snmp_data, fn_fmt)
-        elif elem == C.DMAP_COMPUTERINFO:
-            code = proc_computerinfo(after_data, snmp_data, fn_fmt)
-        elif elem == C.DMAP_DEVICEINFO:
-            code = proc_deviceinfo(after_data, snmp_data, fn_fmt)
-        elif elem == C.DMAP_NETWORKINFO:
-            code = proc_networkinfo(after_data, snmp_data, fn_fmt)
-        else:
+    for elem in active_fields(dmap, fields):
+        field = FIELDS[elem]
+        if field['proc'] == None:
+            # not stored to 'after'
             continue
 
+        # use rendered string of the same inputs if already done
+        key = render_key(elem, snmp_data, fn_fmt, conf)
+        whole = key != None and field['cache']['partial'] == False
+        if whole:
+            try:
+                after_data[C.JSON_CFIELD][elem] = RENDER_CACHE[key]
+                continue
+            except KeyError:
+                pass
+
+        ctx['key'] = key
+        code = field['proc'](after_data, snmp_data, fn_fmt, ctx)
         if code != 0:
             return [2, code]
 
+        # store rendered string
+        if whole:
+            store_render(key, after_data[C.JSON_CFIELD][elem])
+
     return [0, after_data]
 
 # END OF accumulate_after()
@@ -29,6 +29,8 @@ import sys
 import os
 import re
 import datetime
+import hashlib
+import json
 
 #
 # import from our library
@@ -39,6 +41,24 @@ sys.path.append(myprefix)
 from lib import common_defs as C
 from lib import mibmap as M
 
+#
+# module scope values
+#
+
+# fingerprints of template/list files
+#  FP_CACHE[path] = [st_mtime_ns, st_size, digest]
+FP_CACHE = {}
+
+# compiled templates
+#  COMPILED[path] = {'mtime', 'size', 'onemode', 'code'}
+COMPILED = {}
+
+# format version of compiled template cache file
+TMPL_CACHE_VERSION = 1
+
+# pattern of replace tags
+TAG_PTN = r'\[\[[^\[\]]*\]\]'
+
 #
 # functions
 #
@@ -135,6 +155,48 @@ def read_wlbl(listfile):
 
 # END OF read_wlbl()
 
+"""
+| file_fingerprint(path):
+|  Get fingerprint of template/list file
+|  The digest is kept while mtime and size of the file are unchanged.
+|
+| Parameters
+| ----------
+| path : str
+|     Path to template/list file
+|
+| Return value
+| ------------
+| fp : str
+|     hex digest of the file contents
+|     '-' if the file does not exist or cannot be read
+"""
+def file_fingerprint(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return '-'
+
+    # reuse digest if the file is not modified
+    try:
+        ent = FP_CACHE[path]
+        if ent[0] == st.st_mtime_ns and ent[1] == st.st_size:
+            return ent[2]
+    except KeyError:
+        pass
+
+    try:
+        f = open(path, 'rb')
+        digest = hashlib.sha1(f.read()).hexdigest()
+        f.close()
+    except OSError:
+        return '-'
+
+    FP_CACHE[path] = [st.st_mtime_ns, st.st_size, digest]
+    return digest
+
+# END OF file_fingerprint()
+
 """
 | replace_tag(tmpl, tags)
 |
@@ -195,6 +257,346 @@ def replace_tag(tmpl, tags):
 
 # END OF replace_tag()
 
+"""
+| known_tags():
+|  Get known replace tags from common_defs
+|
+| Parameters
+| ----------
+| (none)
+|
+| Return value
+| ------------
+| [tags, loops]
+| tags : list
+|     values of TAG_* and LTAG_*
+| loops : dict
+|     loops[start tag] = end tag
+"""
+def known_tags():
+    tags = []
+    loops = {}
+    for name in dir(C):
+        if name.startswith('TAG_') or name.startswith('LTAG_'):
+            tags.append(getattr(C, name))
+        if name.startswith('LTAG_') and name.endswith('_S'):
+            try:
+                loops[getattr(C, name)] = getattr(C, name[:-2] + '_E')
+            except AttributeError:
+                pass
+    return [tags, loops]
+
+# END OF known_tags()
+
+"""
+| compile_tmpl(tmpl):
+|  Compile template string to a list of tokens
+|
+| Parameters
+| ----------
+| tmpl : str
+|     template string
+|
+| Return value
+| ------------
+| [tokens, errs]
+| tokens : list
+|     compiled template, format of each token is as below
+|      ['text', str]                   : plain text
+|      ['tag', tagname]                : regular tag
+|      ['loop', start, end, [tokens]]  : loop section
+|     Unknown tags and unbalanced loop tags are kept as plain text.
+| errs : list
+|     error messages for unknown tags or unbalanced loop tags
+"""
+def compile_tmpl(tmpl):
+    tags, loops = known_tags()
+    ends = list(loops.values())
+
+    tokens = []
+    errs = []
+    # the list which tokens are appended now
+    cur = tokens
+    loop = None
+    pos = 0
+    for m in re.finditer(TAG_PTN, tmpl):
+        if m.start() > pos:
+            cur.append(['text', tmpl[pos:m.start()]])
+        pos = m.end()
+        t = m.group(0)
+
+        if t in loops:
+            if loop != None:
+                errs.append(f"Nested loop tag {t} in {loop[1]} section")
+                cur.append(['text', t])
+                continue
+            # start loop section
+            loop = ['loop', t, loops[t], []]
+            cur = loop[3]
+        elif t in ends:
+            if loop == None or loop[2] != t:
+                errs.append(f"Loop end tag {t} without start tag")
+                cur.append(['text', t])
+                continue
+            # end loop section
+            tokens.append(loop)
+            loop = None
+            cur = tokens
+        elif t in tags:
+            cur.append(['tag', t])
+        else:
+            errs.append(f"Unknown tag {t}")
+            cur.append(['text', t])
+
+    if pos < len(tmpl):
+        cur.append(['text', tmpl[pos:]])
+
+    if loop != None:
+        # no end tag ; leave loop section as is
+        errs.append(f"Loop start tag {loop[1]} without end tag {loop[2]}")
+        tokens.append(['text', loop[1]])
+        tokens.extend(loop[3])
+
+    return [tokens, errs]
+
+# END OF compile_tmpl()
+
+"""
+| render_tmpl(tokens, tags, itr=None):
+|  Replace tags of compiled template
+|
+| Parameters
+| ----------
+| tokens : list
+|     compiled template from compile_tmpl()
+| tags : dict array
+|     same format as replace_tag()
+| itr : dict
+|     replace tags of the loop iteration now rendered
+|
+| Return value
+| ------------
+| replaced : str
+|     replaced string
+"""
+def render_tmpl(tokens, tags, itr=None):
+    parts = []
+    for tok in tokens:
+        if tok[0] == 'text':
+            parts.append(tok[1])
+
+        elif tok[0] == 'tag':
+            t = tok[1]
+            if tags['one'] != None and t in tags['one']:
+                parts.append(str(tags['one'][t]))
+            elif itr != None and t in itr:
+                parts.append(str(itr[t]))
+            else:
+                # not replaced
+                parts.append(t)
+
+        elif tok[0] == 'loop':
+            if tags['loop'] != None and tags['loop']['start'] == tok[1]:
+                for r in tags['loop']['rep']:
+                    parts.append(render_tmpl(tok[3], tags, r))
+            else:
+                # not replaced ; keep loop tags
+                parts.append(tok[1])
+                parts.append(render_tmpl(tok[3], tags, itr))
+                parts.append(tok[2])
+
+    return ''.join(parts)
+
+# END OF render_tmpl()
+
+"""
+| get_tmpl(tmplfile, onemode = False):
+|  Get compiled template
+|  Compiled template loaded by load_compiled() is used if the template file
+|  is not modified, otherwise the file is read and compiled.
+|
+| Parameters
+| ----------
+| tmplfile : str
+|     Path to template file
+| onemode : boolean
+|     read only the first line of the file
+|
+| Return value
+| ------------
+| {code, tokens}
+| code:
+|     0: no error
+|     2: system error
+| tokens : list / str
+|     compiled template if no error
+|     error messages if error detected
+"""
+def get_tmpl(tmplfile, onemode = False):
+    try:
+        st = os.stat(tmplfile)
+    except OSError:
+        st = None
+
+    # use compiled template if the file is not modified
+    if st != None:
+        try:
+            ent = COMPILED[tmplfile]
+            if (ent['mtime'] == st.st_mtime_ns and ent['size'] == st.st_size
+                    and ent['onemode'] == onemode):
+                return [0, ent['code']]
+        except KeyError:
+            pass
+
+    code, tmpl = read_tmpl(tmplfile, onemode)
+    if code != 0:
+        return [code, tmpl]
+    tokens, errs = compile_tmpl(tmpl)
+
+    # keep compiled template for the next time
+    if st != None:
+        COMPILED[tmplfile] = {
+            'mtime'   : st.st_mtime_ns,
+            'size'    : st.st_size,
+            'onemode' : onemode,
+            'code'    : tokens
+        }
+    return [0, tokens]
+
+# END OF get_tmpl()
+
+"""
+| tmpl_cache_file(conf):
+|  Get path to compiled template cache file
+|
+| Parameters
+| ----------
+| conf : dict
+|     pc_snipe config data
+|
+| Return value
+| ------------
+| path : str
+|     path to compiled template cache file
+"""
+def tmpl_cache_file(conf):
+    if conf[C.CF_TMPL_CACHE] != '':
+        return conf[C.CF_TMPL_CACHE]
+    return os.path.join(conf[C.CF_TMPLPATH], C.TMPL_CACHE_NAME)
+
+# END OF tmpl_cache_file()
+
+"""
+| compile_all(conf, onemodes):
+|  Compile and validate every template under TemplatePath,
+|  then write compiled template cache file
+|
+| Parameters
+| ----------
+| conf : dict
+|     pc_snipe config data
+| onemodes : list
+|     field names whose template is one line
+|
+| Return value
+| ------------
+| {code, msgs}
+| code:
+|     0: no error
+|     1: template error
+|     2: system error
+| msgs : list
+|     compiled template files if no error
+|     error messages if error detected
+"""
+def compile_all(conf, onemodes):
+    tmpl_dir = conf[C.CF_TMPLPATH]
+    try:
+        fields = sorted(os.listdir(tmpl_dir))
+    except OSError:
+        return [2, ['Cannot read template directory: ' + tmpl_dir]]
+
+    compiled = {}
+    msgs = []
+    err_msgs = []
+    for field in fields:
+        tmplfile = tmpl_dir + '/' + field + '/template.conf'
+        if not os.path.isfile(tmplfile):
+            continue
+        onemode = field in onemodes
+
+        code, tmpl = read_tmpl(tmplfile, onemode)
+        if code != 0:
+            return [2, [tmpl]]
+        tokens, errs = compile_tmpl(tmpl)
+        for err in errs:
+            err_msgs.append(f"{field}/template.conf: {err}")
+
+        st = os.stat(tmplfile)
+        compiled[tmplfile] = {
+            'mtime'   : st.st_mtime_ns,
+            'size'    : st.st_size,
+            'onemode' : onemode,
+            'code'    : tokens
+        }
+        msgs.append(f"Compiled {field}/template.conf")
+
+    if len(err_msgs) > 0:
+        return [1, err_msgs]
+
+    # write compiled template cache
+    cache_file = tmpl_cache_file(conf)
+    cache_data = {
+        'version'   : TMPL_CACHE_VERSION,
+        'templates' : compiled
+    }
+    tmp_file = cache_file + '.tmp'
+    try:
+        f = open(tmp_file, 'w')
+        json.dump(cache_data, f, ensure_ascii=False)
+        f.close()
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        return [2, ['Cannot write compiled template file: ' + cache_file]]
+
+    msgs.append('Wrote ' + cache_file)
+    return [0, msgs]
+
+# END OF compile_all()
+
+"""
+| load_compiled(conf):
+|  Load compiled template cache file written by compile_all()
+|  Nothing is loaded if the file does not exist or is broken,
+|  then templates are compiled from text on demand.
+|
+| Parameters
+| ----------
+| conf : dict
+|     pc_snipe config data
+|
+| Return value
+| ------------
+| (void)
+"""
+def load_compiled(conf):
+    try:
+        f = open(tmpl_cache_file(conf), 'r')
+        cache_data = json.load(f)
+        f.close()
+    except (OSError, ValueError):
+        return
+
+    try:
+        if cache_data['version'] != TMPL_CACHE_VERSION:
+            return
+        COMPILED.update(cache_data['templates'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    return
+
+# END OF load_compiled()
+
 """
 | get_tmpl_idx(wl, bl, snmp_data, syms):
 |
@@ -0,0 +1,459 @@
+#
+# snipeit_aio.py
+#  asyncio client of Snipe-IT API
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import json
+import asyncio
+
+# aiohttp is optional ; only this module needs it
+try:
+    import aiohttp
+    HAVE_AIOHTTP = True
+except ImportError:
+    HAVE_AIOHTTP = False
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+
+from lib import common_defs as C
+from lib import snipeit_api as API
+from lib import pcs_rate as RATE
+
+#
+# functions
+#
+#  Every function takes the client made by open_client() and returns
+#  the same values as the function of the same name in snipeit_api.
+#
+
+"""
+| open_client(conf):
+|  Open an asyncio client of Snipe-IT API
+|  Connections are reused, and up to SnipeIT_API_PoolSize requests
+|  are in progress at the same time.
+|  (call in a running event loop)
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| {code, client}
+| code:
+|     0: no error
+|     2: system error
+| client : dict / str
+|     client['conf']    : configuration dictionary
+|     client['session'] : aiohttp.ClientSession
+|     client['sem']     : asyncio.Semaphore of the concurrency cap
+|     str of error message if error detected
+"""
+async def open_client(conf):
+    if not HAVE_AIOHTTP:
+        err_msg = 'aiohttp is not installed'
+        return [2, err_msg]
+
+    # setup API key
+    api_ret = API.get_apikey(conf[C.CF_KEYFILE])
+    if api_ret[0] != 0:
+        # error state
+        return api_ret
+    api_key = api_ret[1]
+
+    pool = int(conf[C.CF_API_POOLSIZE])
+    connector = aiohttp.TCPConnector(limit=pool, ssl=False)
+    session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=float(conf[C.CF_API_TIMEO])),
+        headers={
+            'Accept'        : 'application/json',
+            'Authorization' : 'Bearer ' + api_key,
+            'Content-Type'  : 'application/json'
+        })
+
+    client = {
+        'conf'    : conf,
+        'session' : session,
+        'sem'     : asyncio.Semaphore(pool)
+    }
+    return [0, client]
+
+# END OF open_client()
+
+"""
+| close_client(client):
+|  Close the client
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+|
+| Return value
+| ------------
+| (void)
+"""
+async def close_client(client):
+    await client['session'].close()
+
+# END OF close_client()
+
+"""
+| request_json(client, method, url, data=None):
+|  Send request and decode JSON response
+|  Requests wait for the rate limiter shared with snipeit_api.
+|  Throttled requests (429 / 503) are retried after Retry-After, and
+|  connection errors and 502 / 504 are retried with backoff, up to
+|  SnipeIT_API_Retries times.
+|  (private function)
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+| method : str
+|     HTTP method
+| url : str
+|     URL to request
+| data : str
+|     request body
+|
+| Return value
+| ------------
+| {code, data}
+| code:
+|     0: no error
+|     2: system error
+| data : dict / str
+|     decoded JSON data if no error
+|     str of error message if error detected
+"""
+async def request_json(client, method, url, data=None):
+    conf = client['conf']
+    retries = int(conf[C.CF_API_RETRIES])
+    loop = asyncio.get_running_loop()
+
+    count = 0
+    while True:
+        # wait for the rate limiter (it may sleep)
+        await loop.run_in_executor(None, RATE.acquire, conf)
+
+        wait = None
+        async with client['sem']:
+            try:
+                async with client['session'].request(method, url,
+                                                     data=data) as resp:
+                    if resp.status in API.THROTTLE_STATUS:
+                        wait = RATE.retry_after(resp, count)
+                        hold = True
+                    elif resp.status in API.RETRY_STATUS:
+                        wait = API.RETRY_BACKOFF * (2 ** count)
+                        hold = False
+                    elif resp.status != 200:
+                        err_msg = 'Cannot get data from Snipe-IT API ' + url
+                        return [2, err_msg]
+                    else:
+                        text = await resp.text(encoding='utf-8')
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                wait = API.RETRY_BACKOFF * (2 ** count)
+                hold = False
+
+        if wait == None:
+            break
+
+        if count >= retries:
+            err_msg = 'Cannot connect Snipe-IT API ' + url
+            return [2, err_msg]
+
+        if hold:
+            # throttled ; hold all processes
+            await loop.run_in_executor(None, RATE.hold, conf, wait)
+        else:
+            await asyncio.sleep(wait)
+        count += 1
+
+    try:
+        return [0, json.loads(text)]
+    except ValueError:
+        err_msg = 'Cannot read data from Snipe-IT API ' + url
+        return [2, err_msg]
+
+# END OF request_json()
+
+"""
+| get_json(client, url):
+|  GET JSON data from Snipe-IT API
+|  (private function)
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+| url : str
+|     URL to get
+|
+| Return value
+| ------------
+| same as snipeit_api.get_json()
+"""
+async def get_json(client, url):
+    code, data = await request_json(client, 'GET', url)
+    if code != 0:
+        return [code, data]
+
+    # check if error occurred
+    code, err_msg = API.check_status(data)
+    if code != 0:
+        return [code, err_msg]
+
+    return [0, data]
+
+# END OF get_json()
+
+"""
+| search_by_tag(client, tag, DMAP):
+|  Search asset by tag from Snipe-IT
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+| tag : str
+|     asset tag for serarch
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| same as snipeit_api.search_by_tag()
+"""
+async def search_by_tag(client, tag, DMAP):
+    conf = client['conf']
+    url = API.URL_HW_BYTAG.format(conf[C.CF_API_URL], tag)
+
+    # do search
+    code, data = await get_json(client, url)
+    if code != 0:
+        return [code, data]
+
+    return [0, API.build_asset(conf, data, DMAP)]
+
+# END OF search_by_tag()
+
+"""
+| search_by_name(client, computer_name, DMAP):
+|  Search asset by computer name from Snipe-IT
+|  Pages are requested one by one until the asset whose ComputerName
+|  is exactly the same is found (the asset index is not used).
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+| computer_name : str
+|     computer name for serarch
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| same as snipeit_api.search_by_name()
+"""
+async def search_by_name(client, computer_name, DMAP):
+    conf = client['conf']
+    url_top = conf[C.CF_API_URL]
+    window = int(conf[C.CF_SIT_SEARCH_WINDOW])
+    sort = conf[C.CF_SIT_NAME_SORT]
+    search_key = DMAP[C.DMAP_COMPUTERNAME]
+
+    offset = 0
+    # total is unknown until the first page
+    total = 1
+    while offset < total:
+        url_search = API.URL_SEARCH.format(url_top, computer_name,
+                                           window, offset)
+        if sort != '':
+            url_search += API.URL_SORT.format(sort, 'asc')
+
+        # do search
+        code, data = await get_json(client, url_search)
+        if code != 0:
+            return [code, data]
+
+        try:
+            total = int(data[C.JSON_TOTAL])
+            rtop = data[C.JSON_ROWS]
+        except (KeyError, TypeError, ValueError):
+            # no total or rows ; no asset found
+            break
+
+        # search computer_name from candidate
+        for adata in rtop:
+            try:
+                mycn = adata[C.JSON_CFIELD][search_key][C.JSON_VALUE]
+            except:
+                # no custom_filed or DMAP_COMPUTERNAME; ignore this
+                continue
+
+            if mycn == computer_name:
+                # found it
+                return [0, API.build_asset(conf, adata, DMAP)]
+
+        if len(rtop) == 0:
+            # no more rows
+            break
+
+        offset += window
+
+    # no asset found
+    return [1, 'Asset not found']
+
+# END OF search_by_name()
+
+"""
+| search_by_col(client, key, value):
+|  Search assets whose custom field is exactly the value
+|  The first page gives the total number of assets, and the rest of
+|  pages are requested at the same time (up to the concurrency cap).
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+| key : str
+|     name of the custom field (e.g. AutoCollectKey of get_snao)
+| value : str
+|     value of the custom field (e.g. AutoCollectValue of get_snao)
+|
+| Return value
+| ------------
+| {code, rows}
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| rows : list / str
+|     asset records in the order of Snipe-IT
+|     str of error message if error detected
+"""
+async def search_by_col(client, key, value):
+    conf = client['conf']
+    url_top = conf[C.CF_API_URL]
+    window = int(conf[C.CF_SIT_SEARCH_WINDOW])
+
+    def page_url(offset):
+        return API.URL_SEARCH.format(url_top, value, window, offset)
+
+    # first page
+    code, data = await get_json(client, page_url(0))
+    if code != 0:
+        return [code, data]
+
+    try:
+        total = int(data[C.JSON_TOTAL])
+        pages = [data]
+    except (KeyError, TypeError, ValueError):
+        # no total ; no asset found
+        return [0, []]
+
+    # rest of pages
+    results = await asyncio.gather(
+        *[get_json(client, page_url(offset))
+          for offset in range(window, total, window)])
+    for code, data in results:
+        if code != 0:
+            return [code, data]
+        pages.append(data)
+
+    rows = []
+    for data in pages:
+        try:
+            rtop = data[C.JSON_ROWS]
+        except (KeyError, TypeError):
+            continue
+        for adata in rtop:
+            try:
+                if adata[C.JSON_CFIELD][key][C.JSON_VALUE] == value:
+                    rows.append(adata)
+            except (KeyError, TypeError):
+                continue
+
+    return [0, rows]
+
+# END OF search_by_col()
+
+"""
+| update_snipeit(client, id, put_arr):
+|  Update Snipe-IT
+|
+| Parameters
+| ----------
+| client : dict
+|     client made by open_client()
+| id : str
+|     ID of the asset to be updated
+| put_arr : dict
+|     dict data from make_snipeit_json()
+|
+| Return value
+| ------------
+| same as snipeit_api.update_snipeit()
+"""
+async def update_snipeit(client, id, put_arr):
+    conf = client['conf']
+    url = API.URL_HW_BYID.format(conf[C.CF_API_URL], id)
+
+    # do update
+    code, data = await request_json(client, 'PATCH', url,
+                                    json.dumps(put_arr))
+    if code != 0:
+        return [code, data]
+
+    # check if error occurred
+    try:
+        if data[C.JSON_STATUS] == C.JVAL_SUCCESS:
+            pass
+        elif data[C.JSON_STATUS] == C.JVAL_ERR:
+            err_msg = data[C.JSON_MSG]
+            return [1, err_msg]
+        else:
+            err_msg = 'Unknown error (' + str(data[C.JSON_STATUS]) + ')'
+            return [2, err_msg]
+    except (KeyError, TypeError):
+        # do nothing
+        err_msg = ''
+
+    return [0, '']
+
+# END OF update_snipeit()
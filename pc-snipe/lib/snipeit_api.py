@@ -26,18 +26,60 @@ import sys
 import os
 import re
 import datetime
+import time
+import threading
 import requests
 import json
+import html
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 myprefix = os.path.join(os.path.dirname(__file__), '..')
 sys.path.append(myprefix)
 from lib import common_defs as C
+from lib import pcs_index as IDX
+from lib import pcs_json as J
+from lib import pcs_rate as RATE
 
 URL_HW_BYTAG = '{}/hardware/bytag/{}'
 URL_HW = '{}/hardware'
 URL_HW_BYID = '{}/hardware/{}'
-URL_TOTAL = '{}/hardware?search={}&limit=0'
 URL_SEARCH = '{}/hardware?search={}&limit={}&offset={}'
+URL_SORT = '&sort={}&order={}'
+URL_FIELDSETS = '{}/fieldsets'
+
+# status codes to be retried by the session
+RETRY_STATUS = [502, 504]
+# status codes of throttling (retried by api_request with Retry-After)
+THROTTLE_STATUS = [429, 503]
+# backoff factor of retries (seconds)
+RETRY_BACKOFF = 0.5
+
+# shared API client
+#  CLIENT['conf']    : [API URL, API key file, pool size, retries]
+#  CLIENT['session'] : requests.Session
+CLIENT = {}
+
+# stderr is suppressed while any request is in progress
+#  STDERR['count'] : number of requests in progress
+#  STDERR['saved'] : original sys.stderr
+STDERR = {'count': 0, 'saved': None}
+STDERR_LOCK = threading.Lock()
+
+# custom field schema (fieldset of each model)
+#  SCHEMA['url']     : API URL the schema is from
+#  SCHEMA['fetched'] : time the schema was fetched
+#  SCHEMA['models']  : {model id : {display name : db column}}
+SCHEMA = {}
+
+# format version of custom field cache file
+FIELD_CACHE_VERSION = 2
+
+# DMAP elements not updated by make_snipeit_json()
+MAKE_SKIP_LIST = [
+    C.DMAP_COMPUTERNAME,
+    C.DMAP_COMMUNITY
+]
 
 """
 | get_apikey(keyfile):
@@ -76,32 +118,40 @@ def get_apikey(keyfile):
 # END OF get_apikey()
 
 """
-| search_by_tag(conf, tag, DMAP):
-|  Search asset by tag from Snipe-IT
+| get_client(conf):
+|  Get shared API client
+|  The client has pooled keep-alive connections, retry policy and
+|  the API key in its headers. It is made once and reused while the
+|  configuration is the same.
 |
 | Parameters
 | ----------
 | conf : dict
 |     configuration dictionary
-| tag : str
-|     asset tag for serarch
-| DMAP : dict
-|     custom filed definision map
 |
 | Return value
 | ------------
-| {code, resp_data}
+| {code, session}
 | code:
 |     0: no error
-|     1: error from API expressly
 |     2: system error
-| resp_data : dict / str
-|     dictionary of asset data if the asset found
-|     str of error message if error detected
+| session : requests.Session / str
+|     session if no error (code=0)
+|     error message if error detected (code=2)
 """
-def search_by_tag(conf, tag, DMAP):
-    url_top = conf[C.CF_API_URL]
-    timeo = conf[C.CF_API_TIMEO]
+def get_client(conf):
+    cl_conf = [
+        conf[C.CF_API_URL],
+        conf[C.CF_KEYFILE],
+        int(conf[C.CF_API_POOLSIZE]),
+        int(conf[C.CF_API_RETRIES])
+    ]
+    try:
+        if CLIENT['conf'] == cl_conf:
+            return [0, CLIENT['session']]
+        CLIENT['session'].close()
+    except KeyError:
+        pass
 
     # setup API key
     api_ret = get_apikey(conf[C.CF_KEYFILE])
@@ -110,46 +160,143 @@ def search_by_tag(conf, tag, DMAP):
         return api_ret
     api_key = api_ret[1]
 
-    # setup URL and parameters
-    url = URL_HW_BYTAG.format(url_top, tag)
-
-    # setup header
-    hdr = {
+    # setup retry policy
+    retries = Retry(total=cl_conf[3], connect=cl_conf[3], read=cl_conf[3],
+                    status=cl_conf[3], backoff_factor=RETRY_BACKOFF,
+                    status_forcelist=RETRY_STATUS,
+                    allowed_methods=['GET', 'PATCH'],
+                    raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=cl_conf[2],
+                          pool_maxsize=cl_conf[2], max_retries=retries)
+
+    # setup session
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.verify = False
+    session.headers.update({
         'Accept'        : 'application/json',
         'Authorization' : 'Bearer ' + api_key,
         'Content-Type'  : 'application/json'
-    }
+    })
 
-    # do search
-    try:
-        tmp_syserr = sys.stderr
-        sys.stderr = None
-        resp = requests.get(url, headers=hdr,
-                            timeout=float(timeo), verify=False)
-        sys.stderr = tmp_syserr
-    except:
-        # error status
-        err_msg = 'Cannot connect Snipe-IT API ' + url
-        return [2, err_msg]
+    CLIENT['conf'] = cl_conf
+    CLIENT['session'] = session
+    return [0, session]
 
-    if resp.status_code != 200:
-        err_msg = 'Cannot get data from Snipe-IT API ' + url
-        return [2, err_msg]
+# END OF get_client()
 
-    data = json.loads(resp.text)
-
-    # check if error occurred
-    try:
-        if data[C.JSON_STATUS] == C.JVAL_ERR:
-            err_msg = data[C.JSON_MSG]
-            return [1, err_msg]
+"""
+| quiet_stderr(quiet)
+|  Suppress / restore stderr around requests
+|  Requests may run in threads at the same time (e.g. replay of the
+|  journal), so stderr is restored when the last of them is finished.
+|  (private function)
+|
+| Parameters
+| ----------
+| quiet : bool
+|     True to suppress, False to restore
+"""
+def quiet_stderr(quiet):
+    with STDERR_LOCK:
+        if quiet:
+            if STDERR['count'] == 0:
+                STDERR['saved'] = sys.stderr
+                sys.stderr = None
+            STDERR['count'] += 1
         else:
-            err_msg = 'Unknown error'
+            STDERR['count'] -= 1
+            if STDERR['count'] == 0:
+                sys.stderr = STDERR['saved']
+
+# END OF quiet_stderr()
+
+"""
+| api_request(conf, method, url, data=None, stream=False):
+|  Send request to Snipe-IT API by shared API client
+|  Requests are limited by the rate limiter, and throttled requests
+|  (429 / 503) are retried after Retry-After seconds.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| method : str
+|     HTTP method
+| url : str
+|     URL to request
+| data : str
+|     request body
+| stream : bool
+|     True not to read the response body at once
+|     (the caller must close the response)
+|
+| Return value
+| ------------
+| {code, resp}
+| code:
+|     0: no error
+|     2: system error
+| resp : requests.Response / str
+|     response if no error (code=0)
+|     error message if error detected (code=2)
+"""
+def api_request(conf, method, url, data=None, stream=False):
+    timeo = conf[C.CF_API_TIMEO]
+
+    code, session = get_client(conf)
+    if code != 0:
+        return [code, session]
+
+    count = 0
+    while True:
+        # wait for the rate limiter
+        RATE.acquire(conf)
+
+        quiet_stderr(True)
+        try:
+            resp = session.request(method, url, data=data,
+                                   timeout=float(timeo), stream=stream)
+        except:
+            # error status
+            err_msg = 'Cannot connect Snipe-IT API ' + url
             return [2, err_msg]
-    except KeyError:
-        # do nothing
-        err_msg = ''
+        finally:
+            quiet_stderr(False)
+
+        if resp.status_code not in THROTTLE_STATUS or \
+           count >= int(conf[C.CF_API_RETRIES]):
+            break
+
+        # throttled ; hold all processes and retry
+        RATE.hold(conf, RATE.retry_after(resp, count))
+        resp.close()
+        count += 1
 
+    return [0, resp]
+
+# END OF api_request()
+
+"""
+| build_asset(conf, data, DMAP):
+|  Build asset data structure from an asset record of Snipe-IT
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| data : dict
+|     asset record returned by Snipe-IT API
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| resp_data : dict
+|     dictionary of asset data
+"""
+def build_asset(conf, data, DMAP):
     resp_data = {
         C.JSON_ID           : '',
         C.JSON_ATAG         : '',
@@ -172,7 +319,7 @@ def search_by_tag(conf, tag, DMAP):
     for k, v in DMAP.items():
         try:
             resp_data[C.JSON_CFIELD][k] = data[C.JSON_CFIELD][v][C.JSON_VALUE]
-        except KeyError:
+        except (KeyError, TypeError):
             resp_data[C.JSON_CFIELD][k] = ''
             continue
 
@@ -184,20 +331,380 @@ def search_by_tag(conf, tag, DMAP):
     # store raw data
     resp_data[C.JSON_RAW] = data
 
-    return [0,resp_data]
+    return resp_data
 
-# END OF search_by_tag()
+# END OF build_asset()
 
 """
-| search_by_name():
-|  Search asset by computer name from Snipe-IT
+| check_status(data):
+|  Check if the decoded JSON data is an error response
+|  (also used by get_snao)
+|
+| Parameters
+| ----------
+| data : dict
+|     decoded JSON data (or members except rows)
+|
+| Return value
+| ------------
+| {code, err_msg}
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| err_msg : str
+"""
+def check_status(data):
+    try:
+        if data[C.JSON_STATUS] == C.JVAL_ERR:
+            err_msg = data[C.JSON_MSG]
+            return [1, err_msg]
+        else:
+            err_msg = 'Unknown error'
+            return [2, err_msg]
+    except (KeyError, TypeError):
+        # do nothing
+        err_msg = ''
+
+    return [0, err_msg]
+
+# END OF check_status()
+
+"""
+| get_json(conf, url):
+|  GET JSON data from Snipe-IT API
 |
 | Parameters
 | ----------
 | conf : dict
 |     configuration dictionary
-| computer_name : str
-|     computer name for serarch
+| url : str
+|     URL to get
+|
+| Return value
+| ------------
+| {code, data}
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| data : dict / str
+|     decoded JSON data if no error
+|     str of error message if error detected
+"""
+def get_json(conf, url):
+    code, resp = api_request(conf, 'GET', url)
+    if code != 0:
+        return [code, resp]
+
+    if resp.status_code != 200:
+        err_msg = 'Cannot get data from Snipe-IT API ' + url
+        return [2, err_msg]
+
+    try:
+        data = json.loads(resp.text)
+    except ValueError:
+        err_msg = 'Bad data from Snipe-IT API ' + url
+        return [2, err_msg]
+
+    # check if error occurred
+    code, err_msg = check_status(data)
+    if code != 0:
+        return [code, err_msg]
+
+    return [0, data]
+
+# END OF get_json()
+
+"""
+| search_rows(conf, search, sort='', order='asc'):
+|  Streaming paginator of hardware search
+|  Pages of SnipeIT_SearchWindow rows are requested one by one while
+|  the caller consumes the rows. The total number of rows is taken from
+|  the first page, so the caller can stop on the row it needs without
+|  requesting the rest. Each page is parsed incrementally, so only one
+|  row is decoded in memory at a time.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| search : str
+|     search word
+| sort : str
+|     column to sort by ('': default order of Snipe-IT)
+| order : str
+|     'asc' or 'desc'
+|
+| Yield value
+| -----------
+| [code, adata]
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| adata : dict / str
+|     asset record if no error
+|     str of error message if error detected (the last value)
+"""
+def search_rows(conf, search, sort='', order='asc'):
+    url_top = conf[C.CF_API_URL]
+    window = int(conf[C.CF_SIT_SEARCH_WINDOW])
+
+    offset = 0
+    # total is unknown until the first page
+    total = 1
+    while offset < total:
+        url_search = URL_SEARCH.format(url_top, search, window, offset)
+        if sort != '':
+            url_search += URL_SORT.format(sort, order)
+
+        # do search
+        code, resp = api_request(conf, 'GET', url_search, stream=True)
+        if code != 0:
+            yield [code, resp]
+            return
+
+        try:
+            if resp.status_code != 200:
+                err_msg = 'Cannot get data from Snipe-IT API ' + url_search
+                yield [2, err_msg]
+                return
+
+            # stream rows of the page
+            head = {}
+            nrows = 0
+            try:
+                for adata in J.stream_rows(J.iter_text(resp), head):
+                    nrows += 1
+                    yield [0, adata]
+            except (ValueError, requests.RequestException):
+                err_msg = 'Cannot read data from Snipe-IT API ' + url_search
+                yield [2, err_msg]
+                return
+        finally:
+            resp.close()
+
+        # check if error occurred
+        code, err_msg = check_status(head)
+        if code != 0:
+            yield [code, err_msg]
+            return
+
+        try:
+            total = int(head[C.JSON_TOTAL])
+        except (KeyError, TypeError, ValueError):
+            # no total ; no asset found
+            return
+
+        if nrows == 0:
+            # no more rows
+            return
+
+        offset += window
+
+# END OF search_rows()
+
+"""
+| index_row(adata, DMAP):
+|  Make a row of the asset index from an asset record
+|  (private function)
+|
+| Parameters
+| ----------
+| adata : dict
+|     asset record returned by Snipe-IT API
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| [id, asset_tag, name, updated_at]
+"""
+def index_row(adata, DMAP):
+    try:
+        name = adata[C.JSON_CFIELD][DMAP[C.DMAP_COMPUTERNAME]][C.JSON_VALUE]
+    except (KeyError, TypeError):
+        name = ''
+    try:
+        updated = adata[C.JSON_UPDATED][C.JSON_DATETIME]
+    except (KeyError, TypeError):
+        updated = ''
+    return [adata[C.JSON_ID], adata.get(C.JSON_ATAG, ''), name, updated]
+
+# END OF index_row()
+
+"""
+| update_index(conf, DMAP, db):
+|  Build or refresh the asset index
+|  The index is built by paging all assets in the order of id into the
+|  build table, which replaces the assets at the end. It is refreshed
+|  by paging assets in descending order of updated_at until an asset
+|  older than the latest one in the index appears. Each page is
+|  committed by itself, so that searches of other processes are not
+|  blocked while paging. Errors are ignored ; the index is used as it
+|  is.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| DMAP : dict
+|     custom filed definision map
+| db : sqlite3.Connection
+|     opened index
+"""
+def update_index(conf, DMAP, db):
+    source = conf[C.CF_API_URL] + ' ' + DMAP[C.DMAP_COMPUTERNAME]
+    interval = int(conf[C.CF_INDEX_REFRESH])
+    window = int(conf[C.CF_SIT_SEARCH_WINDOW])
+
+    mode, watermark = IDX.refresh_state(db, source, interval)
+    if mode == '':
+        return
+
+    lock_fd = IDX.lock_update(conf)
+    if lock_fd == None:
+        # another process is updating the index
+        return
+
+    try:
+        # check again ; another process may have updated it
+        mode, watermark = IDX.refresh_state(db, source, interval)
+        if mode == '':
+            return
+
+        if mode == 'build':
+            if not IDX.start_build(db):
+                return
+            table = IDX.TBL_BUILD
+            rows = search_rows(conf, '', C.JSON_ID, 'asc')
+        else:
+            table = IDX.TBL_ASSETS
+            rows = search_rows(conf, '', C.JSON_UPDATED, 'desc')
+
+        latest = watermark
+        irows = []
+        for code, adata in rows:
+            if code != 0:
+                return
+            try:
+                irow = index_row(adata, DMAP)
+            except (KeyError, TypeError, AttributeError):
+                continue
+            if mode == 'refresh' and irow[3] < watermark:
+                # older assets are already in the index
+                rows.close()
+                break
+            irows.append(irow)
+            if irow[3] > latest:
+                latest = irow[3]
+            if len(irows) >= window:
+                if not IDX.store_assets(db, irows, table):
+                    return
+                irows = []
+
+        if not IDX.store_assets(db, irows, table):
+            return
+        if mode == 'build':
+            IDX.finish_build(db, source, latest)
+        else:
+            IDX.finish_refresh(db, latest)
+    finally:
+        IDX.unlock_update(lock_fd)
+
+# END OF update_index()
+
+"""
+| search_by_index(conf, column, value, DMAP):
+|  Search asset via the asset index
+|  Candidates in the index are fetched by id and checked whether they
+|  still have the value. Stale entries are corrected in the index.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| column : str
+|     IDX.COL_NAME or IDX.COL_TAG
+| value : str
+|     ComputerName or asset tag
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| {code, resp_data} / None
+|     same as search_by_name()
+|     None if the index is disabled or the asset is not in the index
+"""
+def search_by_index(conf, column, value, DMAP):
+    db = IDX.open_index(conf)
+    if db == None:
+        return None
+
+    update_index(conf, DMAP, db)
+
+    for id in IDX.lookup(db, column, value):
+        url = URL_HW_BYID.format(conf[C.CF_API_URL], id)
+        code, data = get_json(conf, url)
+        if code == 1:
+            # deleted asset
+            IDX.remove_asset(db, id)
+            continue
+        elif code != 0:
+            return [code, data]
+
+        resp_data = build_asset(conf, data, DMAP)
+        if column == IDX.COL_NAME:
+            found = resp_data[C.JSON_COMPUTERNAME] == value
+        else:
+            found = resp_data[C.JSON_ATAG] == value
+        if found:
+            return [0, resp_data]
+
+        # changed after the last refresh
+        IDX.store_assets(db, [index_row(data, DMAP)])
+
+    return None
+
+# END OF search_by_index()
+
+"""
+| index_asset(conf, resp_data, DMAP):
+|  Store an asset found by searching Snipe-IT into the asset index
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| resp_data : dict
+|     asset data returned by search_by_tag() or search_by_name()
+| DMAP : dict
+|     custom filed definision map
+"""
+def index_asset(conf, resp_data, DMAP):
+    db = IDX.open_index(conf)
+    if db == None:
+        return
+
+    try:
+        IDX.store_assets(db, [index_row(resp_data[C.JSON_RAW], DMAP)])
+    except (KeyError, TypeError, AttributeError):
+        pass
+
+# END OF index_asset()
+
+"""
+| search_by_tag(conf, tag, DMAP):
+|  Search asset by tag from Snipe-IT
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| tag : str
+|     asset tag for serarch
 | DMAP : dict
 |     custom filed definision map
 |
@@ -212,223 +719,408 @@ def search_by_tag(conf, tag, DMAP):
 |     dictionary of asset data if the asset found
 |     str of error message if error detected
 """
-def search_by_name(conf, computer_name, DMAP):
+def search_by_tag(conf, tag, DMAP):
     url_top = conf[C.CF_API_URL]
-    timeo = conf[C.CF_API_TIMEO]
-    window = int(conf[C.CF_SIT_SEARCH_WINDOW])
-    search_key = DMAP[C.DMAP_COMPUTERNAME]
 
-    # setup API key
-    api_ret = get_apikey(conf[C.CF_KEYFILE])
-    if api_ret[0] != 0:
-        # error state
-        return api_ret
-    api_key = api_ret[1]
+    # setup URL and parameters
+    url = URL_HW_BYTAG.format(url_top, tag)
 
-    # setup URL of total number of search result
-    url_total = URL_TOTAL.format(url_top, computer_name)
+    # do search
+    code, data = get_json(conf, url)
+    if code != 0:
+        return [code, data]
 
-    # setup header
-    hdr = {
-        'Accept'        : 'application/json',
-        'Authorization' : 'Bearer ' + api_key,
-        'Content-Type'  : 'application/json'
-    }
+    resp_data = build_asset(conf, data, DMAP)
+    index_asset(conf, resp_data, DMAP)
 
-    # do search
+    return [0, resp_data]
+
+# END OF search_by_tag()
+
+"""
+| load_asset(conf, path, tag, DMAP):
+|  Load asset record from a file instead of search_by_tag()
+|  The file holds the JSON of an asset record which the caller (e.g.
+|  get_snao) has already fetched from Snipe-IT.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| path : str
+|     path to the asset record file
+| tag : str
+|     asset tag the record must have
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| {code, resp_data}
+| code:
+|     0: no error
+|     1: the file cannot be used (call search_by_tag() instead)
+| resp_data : dict / str
+|     dictionary of asset data if no error
+|     str of error message if error detected
+"""
+def load_asset(conf, path, tag, DMAP):
     try:
-        tmp_syserr = sys.stderr
-        sys.stderr = None
-        resp = requests.get(url_total, headers=hdr,
-                            timeout=float(timeo), verify=False)
-        sys.stderr = tmp_syserr
-    except:
-        # error status
-        err_msg = 'Cannot connect Snipe-IT API ' + url_total
-        return [2, err_msg]
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        err_msg = 'Cannot read asset record file: ' + path
+        return [1, err_msg]
 
-    if resp.status_code != 200:
-        err_msg = 'Cannot get data from Snipe-IT API ' + url_total
-        return [2, err_msg]
+    return use_asset(conf, data, tag, DMAP)
 
-    data = json.loads(resp.text)
+# END OF load_asset()
 
-    # check if error occurred
+"""
+| use_asset(conf, data, tag, DMAP):
+|  Use asset record which the caller has already fetched instead of
+|  search_by_tag()
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| data : dict
+|     asset record returned by Snipe-IT API
+| tag : str
+|     asset tag the record must have
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| same as load_asset()
+"""
+def use_asset(conf, data, tag, DMAP):
     try:
-        if data[C.JSON_STATUS] == C.JVAL_ERR:
-            err_msg = data[C.JSON_MSG]
-            return [2, err_msg]
-        else:
-            err_msg = 'Unknown error'
-            return [2, err_msg]
-    except KeyError:
-        # do nothing
-        err_msg = ''
+        atag = data[C.JSON_ATAG]
+    except (KeyError, TypeError):
+        atag = None
 
-    resp_data = {
-        C.JSON_TOTAL : 0,
-    }
+    if atag != tag:
+        err_msg = 'Asset record is not for ' + tag
+        return [1, err_msg]
 
-    try:
-        if data[C.JSON_TOTAL]:
-            resp_data[C.JSON_TOTAL] = int(data[C.JSON_TOTAL])
-    except KeyError:
-        resp_data[C.JSON_TOTAL] = 0
+    return [0, build_asset(conf, data, DMAP)]
 
-    total = resp_data[C.JSON_TOTAL]
-    offset = 0
+# END OF use_asset()
 
-    resp_data = {
-        C.JSON_ID           : '',
-        C.JSON_ATAG         : '',
-        C.JSON_COMPUTERNAME : '',
-        C.JSON_COMMUNITY    : conf[C.CF_DEFAULT_COMM],
-        C.JSON_CFIELD       : {}
-    }
-    found_flg = 0
+"""
+| search_by_name(conf, computer_name, DMAP):
+|  Search asset by computer name from Snipe-IT
+|  Rows are streamed page by page and the search stops on the first
+|  asset whose ComputerName is exactly the same.
+|  If SnipeIT_NameSortColumn is set, rows are sorted by the column so
+|  that the exact name comes before longer names that begin with it.
+|  If AssetIndexFile is set, the asset index is consulted first and
+|  only the asset found in it is fetched.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| computer_name : str
+|     computer name for serarch
+| DMAP : dict
+|     custom filed definision map
+|
+| Return value
+| ------------
+| {code, resp_data}
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| resp_data : dict / str
+|     dictionary of asset data if the asset found
+|     str of error message if error detected
+"""
+def search_by_name(conf, computer_name, DMAP):
+    search_key = DMAP[C.DMAP_COMPUTERNAME]
+    sort = conf[C.CF_SIT_NAME_SORT]
 
-    while offset < total:
-        url_search = URL_SEARCH.format(url_top, computer_name, window, offset)
+    ret = search_by_index(conf, IDX.COL_NAME, computer_name, DMAP)
+    if ret != None:
+        return ret
 
-        # do search
+    rows = search_rows(conf, computer_name, sort)
+    for code, adata in rows:
+        if code != 0:
+            return [code, adata]
+
+        # search computer_name from candidate
         try:
-            tmp_syserr = sys.stderr
-            sys.stderr = None
-            resp = requests.get(url_search, headers=hdr,
-                                timeout=float(timeo), verify=False)
-            sys.stderr = tmp_syserr
+            mycn = adata[C.JSON_CFIELD][search_key][C.JSON_VALUE]
         except:
-            # error status
-            err_msg = 'Cannot connect Snipe-IT API ' + url_search
-            return [2, err_msg]
+            # no custom_filed or DMAP_COMPUTERNAME; ignore this
+            continue
 
-        if resp.status_code != 200:
-            err_msg = 'Cannot get data from Snipe-IT API ' + url_search
-            return [2, err_msg]
+        if mycn == computer_name:
+            # found it ; stop paging
+            rows.close()
+            resp_data = build_asset(conf, adata, DMAP)
+            index_asset(conf, resp_data, DMAP)
+            return [0, resp_data]
 
-        data = json.loads(resp.text)
+    # no asset found
+    return [1, 'Asset not found']
 
-        # check if error occurred
+# END OF search_by_name()
+
+"""
+| read_field_cache(conf):
+|  Read custom field schema from the cache file
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| schema : dict / None
+|     same format as SCHEMA, None if no valid cache
+"""
+def read_field_cache(conf):
+    path = conf[C.CF_FIELD_CACHE]
+    if path == '':
+        return None
+
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+        if cache['version'] != FIELD_CACHE_VERSION:
+            return None
+        schema = {
+            'url'     : cache['url'],
+            'fetched' : float(cache['fetched']),
+            'models'  : dict(cache['models'])
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    return schema
+
+# END OF read_field_cache()
+
+"""
+| write_field_cache(conf, schema):
+|  Write custom field schema to the cache file
+|  Errors are ignored ; the schema is fetched again next time.
+|  (private function)
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| schema : dict
+|     same format as SCHEMA
+"""
+def write_field_cache(conf, schema):
+    path = conf[C.CF_FIELD_CACHE]
+    if path == '':
+        return
+
+    cache = {
+        'version' : FIELD_CACHE_VERSION,
+        'url'     : schema['url'],
+        'fetched' : schema['fetched'],
+        'models'  : schema['models']
+    }
+    tmpfile = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmpfile, 'w') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmpfile, path)
+    except (OSError, TypeError, ValueError):
         try:
-            if data[C.JSON_STATUS] == C.JVAL_ERR:
-                err_msg = data[C.JSON_MSG]
-                return [1, err_msg]
-            else:
-                err_msg = 'Unknown error'
-                return [2, err_msg]
-        except KeyError:
-            # do nothing
-            err_msg = ''
+            os.unlink(tmpfile)
+        except OSError:
+            pass
 
-        rtop = data[C.JSON_ROWS]
+# END OF write_field_cache()
 
-        # search computer_name from candidate
-        for adata in rtop:
-            try:
-                mycn = adata[C.JSON_CFIELD][search_key][C.JSON_VALUE]
-                if mycn == computer_name:
-                    # found it
-                    found_flg = 1
-                    try:
-                        if adata[C.JSON_ID]:
-                            resp_data[C.JSON_ID] = adata[C.JSON_ID]
-                    except KeyError:
-                        resp_data[C.JSON_ID] = ''
-
-                    try:
-                        if adata[C.JSON_ATAG]:
-                            resp_data[C.JSON_ATAG] = adata[C.JSON_ATAG]
-                    except KeyError:
-                        resp_data[C.JSON_ATAG] = ''
-
-                    for k, v in DMAP.items():
-                        try:
-                            resp_data[C.JSON_CFIELD][k] = \
-                                    adata[C.JSON_CFIELD][v][C.JSON_VALUE]
-                        except KeyError:
-                            resp_data[C.JSON_CFIELD][k] = ''
-                            continue
-
-                        if k == C.DMAP_COMPUTERNAME:
-                            resp_data[C.JSON_COMPUTERNAME] = \
-                                    adata[C.JSON_CFIELD][v][C.JSON_VALUE]
-
-                        elif k == C.JSON_COMMUNITY:
-                            resp_data[C.JSON_COMMUNITY] = \
-                                    adata[C.JSON_CFIELD][v][C.JSON_VALUE]
-
-                    resp_data[C.JSON_RAW] = adata
-                    break
-
-            except:
-                # no custom_filed or DMAP_COMPUTERNAME; ignore this
-                pass
-
-        if found_flg == 1:
-            break
+"""
+| get_schema(conf):
+|  Get custom field schema of Snipe-IT
+|  The fieldset of each model is read from /fieldsets of Snipe-IT once,
+|  and kept in SnipeIT_FieldCacheFile for SnipeIT_FieldCacheTTL seconds.
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+|
+| Return value
+| ------------
+| {code, models}
+| code:
+|     0: no error
+|     1: error from API expressly
+|     2: system error
+| models : dict / str
+|     {model id : {display name of custom field : db column}} if no error
+|     str of error message if error detected
+"""
+def get_schema(conf):
+    url_top = conf[C.CF_API_URL]
+    ttl = int(conf[C.CF_FIELD_CACHE_TTL])
+
+    def fresh(schema):
+        return schema != None and schema['url'] == url_top and \
+               time.time() - schema['fetched'] < ttl
+
+    # memory, then file
+    if fresh(SCHEMA.get('schema')):
+        return [0, SCHEMA['schema']['models']]
+    schema = read_field_cache(conf)
+    if fresh(schema):
+        SCHEMA['schema'] = schema
+        return [0, schema['models']]
+
+    # fetch from Snipe-IT
+    url = URL_FIELDSETS.format(url_top)
+    code, data = get_json(conf, url)
+    if code != 0:
+        return [code, data]
+
+    models = {}
+    try:
+        for fieldset in data[C.JSON_ROWS]:
+            fields = {}
+            for field in fieldset[C.JSON_FIELDS][C.JSON_ROWS]:
+                fields[field[C.JSON_NAME]] = field[C.JSON_DBCOLUMN]
+            for model in fieldset[C.JSON_MODELS][C.JSON_ROWS]:
+                # str key ; same as the key read from the cache file
+                models[str(model[C.JSON_ID])] = fields
+    except (KeyError, TypeError):
+        err_msg = 'Bad fieldset data from Snipe-IT API ' + url
+        return [2, err_msg]
 
-        offset += window
+    schema = {
+        'url'     : url_top,
+        'fetched' : time.time(),
+        'models'  : models
+    }
+    SCHEMA['schema'] = schema
+    write_field_cache(conf, schema)
 
-    if found_flg == 1:
-        # found asset
-        return [0, resp_data]
-    else:
-        # no asset found
-        return [1, 'Asset not found']
+    return [0, models]
 
-# END OF search_by_name()
+# END OF get_schema()
+
+"""
+| no_custom_fields(before):
+|  Check if the raw record of 'before' has no custom fields at all
+|  (e.g. a record without the custom_fields member)
+|
+| Parameters
+| ----------
+| before : dict
+|
+| Return value
+| ------------
+| True if the raw record has no custom_fields
+"""
+def no_custom_fields(before):
+    try:
+        return before[C.JSON_RAW][C.JSON_CFIELD] == None
+    except (KeyError, TypeError):
+        return True
+
+# END OF no_custom_fields()
 
 """
-| make_snipeit_json()
+| make_snipeit_json(dmap, before, after, stats=None, schema=None)
 |  Build dictionary data to make JSON to update Snipe-IT
+|  Only the fields whose value differs from 'before' are included.
+|  The db column of each field is taken from the fieldset of the model
+|  of the asset in schema, or from the raw record of 'before' if the
+|  model is not in schema. Fields outside the fieldset are skipped.
 |
 | Parameters
 | ----------
 | dmap : dict
 | before : dict
 | after : dict
+| stats : dict
+|     if given, the numbers of fields are stored as below
+|      stats['changed']   : fields included in patch_data
+|      stats['unchanged'] : fields whose value is the same as 'before'
+| schema : dict
+|     {model id : {display name : db column}} from get_schema()
 |
 | Return value
 | ------------
 | patch_data : dict
-|     to make JSON data
-| False : if the asset has no custom field
+|     to make JSON data (empty if nothing changed)
+| False : if the asset has no custom field and its model is not in schema
 """
-def make_snipeit_json(dmap, before, after):
-    try:
+def make_snipeit_json(dmap, before, after, stats=None, schema=None):
+    # old values (none if the record has no custom field)
+    btop = {}
+    if not no_custom_fields(before):
         btop = before[C.JSON_RAW][C.JSON_CFIELD]
-    except:
-        # no custom field
-        return False
 
-    skip_list = [
-        C.DMAP_COMPUTERNAME,
-        C.DMAP_COMMUNITY
-    ]
+    # db columns of the fieldset
+    columns = None
+    try:
+        model = before[C.JSON_RAW][C.JSON_MODEL][C.JSON_ID]
+        columns = schema[str(model)]
+    except (KeyError, TypeError):
+        pass
+    if columns == None:
+        if no_custom_fields(before):
+            return False
+        columns = {}
+        for sit_fname, cfield in btop.items():
+            try:
+                columns[sit_fname] = cfield[C.JSON_FIELD]
+            except (KeyError, TypeError):
+                continue
+
     patch_data = {}
+    unchanged = 0
     for elem, sit_fname in dmap.items():
-        skip_f = 0
-        for skip in skip_list:
-            if elem == skip:
-                skip_f = 1
-                break
-        if skip_f == 1:
+        if elem in MAKE_SKIP_LIST:
             continue
 
         # get DB Field
         try:
-            field = btop[sit_fname][C.JSON_FIELD]
-        except:
-            # no data found from before
+            field = columns[sit_fname]
+        except KeyError:
+            # not in the fieldset of the asset
             continue
+        try:
+            old_val = btop[sit_fname][C.JSON_VALUE]
+        except (KeyError, TypeError):
+            old_val = None
 
         # get new data
         try:
-            patch_data[field] = after[C.JSON_CFIELD][elem]
+            new_val = after[C.JSON_CFIELD][elem]
         except:
             # no data found from after
             continue
 
+        # compare with before
+        # (Snipe-IT API returns HTML escaped values)
+        if old_val != None and html.unescape(str(old_val)) == str(new_val):
+            unchanged += 1
+            continue
+
+        patch_data[field] = new_val
+
+    if stats != None:
+        stats[C.JSON_CHANGED] = len(patch_data)
+        stats[C.JSON_UNCHANGED] = unchanged
+
     return patch_data
 
 # END OF make_snipeit_json()
@@ -458,39 +1150,17 @@ def make_snipeit_json(dmap, before, after):
 """
 def update_snipeit(conf, id, put_arr):
     url_top = conf[C.CF_API_URL]
-    timeo = conf[C.CF_API_TIMEO]
 
     # product JSON
     put_json = json.dumps(put_arr)
 
-    # setup API key
-    api_ret = get_apikey(conf[C.CF_KEYFILE])
-    if api_ret[0] != 0:
-        # error state
-        return api_ret
-    api_key = api_ret[1]
-
     # setup URL and parameters
     url = URL_HW_BYID.format(url_top, id)
 
-    # setup header
-    hdr = {
-        'Accept'        : 'application/json',
-        'Authorization' : 'Bearer ' + api_key,
-        'Content-Type'  : 'application/json'
-    }
-
-    # do search
-    try:
-        tmp_syserr = sys.stderr
-        sys.stderr = None
-        resp = requests.patch(url, headers=hdr, data=put_json,
-                              timeout=float(timeo), verify=False)
-        sys.stderr = tmp_syserr
-    except:
-        # error status
-        err_msg = 'Cannot connect Snipe-IT API ' + url
-        return [2, err_msg]
+    # do update
+    code, resp = api_request(conf, 'PATCH', url, put_json)
+    if code != 0:
+        return [code, resp]
 
     if resp.status_code != 200:
         err_msg = 'Cannot patch data from Snipe-IT API ' + url
@@ -0,0 +1,132 @@
+#
+# conftest.py
+#  fixtures of pc-snipe tests (run with pytest)
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+prefix = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, prefix)
+sys.path.insert(0, os.path.join(prefix, 'tools'))
+
+import mock_snipeit
+from lib import common_defs as C
+from lib import pcs_config
+
+# ComputerName of mock assets (asset tags are A000001, A000002, ...)
+NAMES = ['PC-1', 'PC-2', 'PC-3']
+
+"""
+| write_conf(etc, url, extra=None)
+|  Write pc-snipe.conf and mapping.conf for the mock server
+|
+| Parameters
+| ----------
+| etc : pathlib.Path
+|     directory to write files
+| url : str
+|     API URL of the mock server
+| extra : dict
+|     additional configurations
+|
+| Return value
+| ------------
+| conf_file : str
+|     path to pc-snipe.conf
+"""
+def write_conf(etc, url, extra=None):
+    (etc / 'api.key').write_text('test-key\n')
+    (etc / 'mapping.conf').write_text(
+        'ComputerName=ComputerName\n'
+        'IPaddr=IPaddr\n'
+        'Community=Community\n'
+        'ComputerInfo=ComputerInfo\n')
+    lines = [
+        'SnipeIT_API_URL=' + url,
+        'SnipeIT_API_KeyFile=' + str(etc / 'api.key'),
+        'SnipeIT_API_Timeout=2',
+        'SnipeIT_API_Retries=0',
+        'DefaultCommunity=public',
+        'DNS_Domain=example.com',
+        'MappingFile=' + str(etc / 'mapping.conf'),
+        'TemplatePath=' + os.path.join(prefix, 'sample', 'tmpl'),
+        'SnipeIT_FieldCacheFile=' + str(etc / 'fields.json'),
+    ]
+    for key, value in (extra or {}).items():
+        lines.append(key + '=' + value)
+    conf_file = etc / 'pc-snipe.conf'
+    conf_file.write_text('\n'.join(lines) + '\n')
+    return str(conf_file)
+
+# END OF write_conf()
+
+@pytest.fixture
+def snipeit():
+    """mock Snipe-IT server with NAMES assets (server.url is API URL)"""
+    server, url = mock_snipeit.start_server(mock_snipeit.make_assets(NAMES))
+    server.url = url
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def make_conf(tmp_path):
+    """make_conf(url, extra=None) returns [conf, dmap, conf_file]"""
+    def make(url, extra=None):
+        conf_file = write_conf(tmp_path, url, extra)
+        code, conf = pcs_config.read_conf(conf_file)
+        assert code == 0, conf
+        code, dmap = pcs_config.read_dmap(conf[C.CF_MAPPINGFILE])
+        assert code == 0, dmap
+        return [conf, dmap, conf_file]
+
+    return make
+
+@pytest.fixture
+def fake_pc(monkeypatch):
+    """fake_pc(name) replaces DNS and SNMP of collect() by a PC"""
+    from lib import pcs_main as M
+
+    def fake(name, ipaddr='10.0.0.1'):
+        monkeypatch.setattr(M.pcs_dns, 'get_ipaddr',
+                            lambda conf, fqdn: [0, ipaddr])
+        monkeypatch.setattr(M.SNMP, 'get_snmp',
+                            lambda *args, **kwargs: [0, {}])
+        after = {
+            C.JSON_CFIELD : {
+                C.JSON_COMPUTERNAME : name,
+                C.DMAP_IPADDR       : ipaddr,
+                C.JSON_COMPUTERINFO : 'Windows 10'
+            },
+            C.JSON_DIFF : {
+                C.JDIF_COMPUTERNAME : False,
+                C.JDIF_OSNAME       : False
+            }
+        }
+        monkeypatch.setattr(M.SNMP, 'accumulate_after',
+                            lambda *args: [0, after])
+
+    return fake
@@ -0,0 +1,41 @@
+#
+# test_pcs_config.py
+#  tests of reading pc-snipe.conf
+#
+
+import pytest
+
+from conftest import write_conf
+from lib import common_defs as C
+from lib import pcs_config
+
+# configurations of file paths whose directory must exist
+FILE_KEYS = [
+    C.CF_TMPL_CACHE,
+    C.CF_API_RATEFILE,
+    C.CF_FIELD_CACHE,
+    C.CF_INDEX_FILE,
+    C.CF_JOURNAL_FILE,
+    C.CF_DNS_CACHE
+]
+
+@pytest.mark.parametrize('key', FILE_KEYS)
+def test_file_in_current_dir(key, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    conf_file = write_conf(tmp_path, 'http://127.0.0.1:1/api/v1',
+                           {key: 'cache.file'})
+
+    code, conf = pcs_config.read_conf(conf_file)
+
+    assert code == 0, conf
+    assert conf[key] == 'cache.file'
+
+@pytest.mark.parametrize('key', FILE_KEYS)
+def test_file_in_no_dir(key, tmp_path):
+    conf_file = write_conf(tmp_path, 'http://127.0.0.1:1/api/v1',
+                           {key: str(tmp_path / 'none' / 'cache.file')})
+
+    code, err_msgs = pcs_config.read_conf(conf_file)
+
+    assert code != 0
+    assert key + ': directory of' in str(err_msgs)
@@ -0,0 +1,387 @@
+#
+# test_pcs_dns.py
+#  tests of name resolution and its caches
+#
+
+import json
+import time
+import socket
+import asyncio
+
+import pytest
+import dns.exception
+import dns.resolver
+import dns.rdatatype
+
+from lib import common_defs as C
+from lib import pcs_dns as DNS
+
+@pytest.fixture(autouse=True)
+def clean_cache(monkeypatch):
+    """each test starts with empty caches"""
+    monkeypatch.setattr(DNS, 'DNS_CACHE', {})
+    monkeypatch.setattr(DNS, 'DNS_STATS', {})
+    monkeypatch.setattr(DNS, 'FILE_CACHE', {})
+    monkeypatch.setattr(DNS, 'REFRESH', {})
+
+"""
+| stale_conf(make_conf, tmp_path, ip_addr)
+|  Make a system mode conf whose DNS cache file has an expired entry
+|  of pc-1.example.com
+|
+| Parameters
+| ----------
+| make_conf : function
+|     make_conf fixture
+| tmp_path : pathlib.Path
+| ip_addr : str
+|     cached address
+|
+| Return value
+| ------------
+| conf : dict
+"""
+def stale_conf(make_conf, tmp_path, ip_addr):
+    cache_file = tmp_path / 'dns-cache.json'
+    now = time.time()
+    cache_file.write_text(json.dumps({
+        'version' : DNS.DNS_CACHE_VERSION,
+        'entries' : {'|pc-1.example.com' : [now - 100, now - 100, ip_addr]}
+    }))
+    conf, dmap, conf_file = make_conf('http://127.0.0.1:1/api/v1', {
+        'DNS_CacheFile'     : str(cache_file),
+        'DNS_CacheMaxStale' : '3600'
+    })
+    return conf
+
+# END OF stale_conf()
+
+"""
+| gai_error(errno)
+|  Make a gethostbyname() replacement raising socket.gaierror
+|
+| Parameters
+| ----------
+| errno : int
+|     EAI_* error number
+|
+| Return value
+| ------------
+| gethostbyname : function
+"""
+def gai_error(errno):
+    def gethostbyname(host):
+        raise socket.gaierror(errno, 'mock error')
+    return gethostbyname
+
+# END OF gai_error()
+
+def test_sys_temporary_failure(monkeypatch):
+    monkeypatch.setattr(socket, 'gethostbyname', gai_error(socket.EAI_AGAIN))
+    assert DNS.get_ipaddr_by_sys('pc-1.example.com')[0] == 2
+
+    monkeypatch.setattr(socket, 'gethostbyname', gai_error(socket.EAI_NONAME))
+    assert DNS.get_ipaddr_by_sys('pc-1.example.com')[0] == 1
+
+def test_serve_stale_on_temporary_failure(make_conf, tmp_path, monkeypatch):
+    conf = stale_conf(make_conf, tmp_path, '10.0.0.1')
+
+    monkeypatch.setattr(socket, 'gethostbyname', gai_error(socket.EAI_AGAIN))
+    assert DNS.get_ipaddr(conf, 'pc-1.example.com') == [0, '10.0.0.1']
+
+    # no such host is not hidden by the stale entry
+    monkeypatch.setattr(socket, 'gethostbyname', gai_error(socket.EAI_NONAME))
+    assert DNS.get_ipaddr(conf, 'pc-1.example.com')[0] == 1
+
+def test_serve_stale_on_slow_answer(make_conf, tmp_path, monkeypatch):
+    conf = stale_conf(make_conf, tmp_path, '10.0.0.1')
+    monkeypatch.setattr(DNS, 'DNS_STALE_WAIT', 0.05)
+
+    slow = [0.5]
+    def gethostbyname(host):
+        # only the first lookup is slow
+        time.sleep(slow.pop() if slow else 0)
+        return '10.0.0.2'
+    monkeypatch.setattr(socket, 'gethostbyname', gethostbyname)
+
+    start = time.time()
+    assert DNS.get_ipaddr(conf, 'pc-1.example.com') == [0, '10.0.0.1']
+    assert time.time() - start < 0.4
+
+    # the refresh goes on and updates the entry
+    th, result = DNS.REFRESH['|pc-1.example.com']
+    th.join()
+    assert result == [0, '10.0.0.2']
+    assert DNS.get_ipaddr(conf, 'pc-1.example.com') == [0, '10.0.0.2']
+
+def test_stale_refreshed_in_time(make_conf, tmp_path, monkeypatch):
+    conf = stale_conf(make_conf, tmp_path, '10.0.0.1')
+    monkeypatch.setattr(socket, 'gethostbyname', lambda host: '10.0.0.2')
+
+    assert DNS.get_ipaddr(conf, 'pc-1.example.com') == [0, '10.0.0.2']
+    assert DNS.FILE_CACHE['dirty']['|pc-1.example.com'][2] == '10.0.0.2'
+
+"""
+| StubResolver
+|  Resolver answering after a delay (result is an answer or exception)
+|  stub.cancelled is set when the query is cancelled.
+"""
+class StubResolver:
+    def __init__(self, delay, result):
+        self.delay = delay
+        self.result = result
+        self.queries = 0
+        self.cancelled = False
+
+    async def resolve(self, host, rdtype, search=True):
+        self.queries += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+# END OF StubResolver
+
+"""
+| StubAnswer
+|  A records of dns.resolver.Answer (list of addresses with expiration)
+"""
+class StubAnswer(list):
+    def __init__(self, addrs, ttl=300):
+        super().__init__(addrs)
+        self.expiration = time.time() + ttl
+
+# END OF StubAnswer
+
+"""
+| stub_servers(monkeypatch, servers)
+|  Replace resolvers of name servers by stubs
+|
+| Parameters
+| ----------
+| monkeypatch : pytest.MonkeyPatch
+| servers : dict
+|     {nameserver : StubResolver}
+|
+| Return value
+| ------------
+| (void)
+"""
+def stub_servers(monkeypatch, servers):
+    monkeypatch.setattr(DNS, 'get_resolver',
+                        lambda nameserver, dnstimeo: servers[nameserver])
+
+# END OF stub_servers()
+
+"""
+| race(servers)
+|  Run race_servers() for pc-1.example.com
+|
+| Parameters
+| ----------
+| servers : dict
+|     {nameserver : StubResolver}
+|
+| Return value
+| ------------
+| [code, answer] of race_servers()
+"""
+def race(servers):
+    return asyncio.run(DNS.race_servers(list(servers.keys()), 2,
+                                        'pc-1.example.com'))
+
+# END OF race()
+
+def test_race_first_answer(monkeypatch):
+    servers = {
+        'ns1' : StubResolver(0.3, StubAnswer(['10.0.0.1'])),
+        'ns2' : StubResolver(0.01, StubAnswer(['10.0.0.2']))
+    }
+    stub_servers(monkeypatch, servers)
+
+    code, answer = race(servers)
+
+    # the slow query is cancelled
+    assert [code, answer[0]] == [0, '10.0.0.2']
+    assert servers['ns1'].cancelled
+    stats = DNS.get_dns_stats()
+    assert stats['ns2']['wins'] == 1
+    assert stats['ns1']['cancel'] == 1
+    assert stats['ns1']['queries'] == 0
+
+def test_race_error_then_answer(monkeypatch):
+    servers = {
+        'ns1' : StubResolver(0.01, dns.exception.Timeout()),
+        'ns2' : StubResolver(0.1, StubAnswer(['10.0.0.2']))
+    }
+    stub_servers(monkeypatch, servers)
+
+    code, answer = race(servers)
+
+    # an error of a server does not end the race
+    assert [code, answer[0]] == [0, '10.0.0.2']
+    stats = DNS.get_dns_stats()
+    assert stats['ns1']['errors'] == 1
+    assert stats['ns2']['wins'] == 1
+
+def test_race_nxdomain_over_error(monkeypatch):
+    servers = {
+        'ns1' : StubResolver(0.01, dns.resolver.NoNameservers()),
+        'ns2' : StubResolver(0.1, dns.resolver.NXDOMAIN())
+    }
+    stub_servers(monkeypatch, servers)
+
+    code, answer = race(servers)
+
+    # NXDOMAIN is an answer ; it is used instead of the earlier error
+    assert code == 1
+    assert isinstance(answer, dns.resolver.NXDOMAIN)
+
+def test_race_all_errors(monkeypatch):
+    servers = {
+        'ns1' : StubResolver(0.01, dns.exception.Timeout()),
+        'ns2' : StubResolver(0.05, dns.resolver.NoNameservers())
+    }
+    stub_servers(monkeypatch, servers)
+
+    code, answer = race(servers)
+
+    # the first error is reported
+    assert code == 2
+    assert isinstance(answer, dns.exception.Timeout)
+    assert DNS.get_dns_stats()['ns2']['errors'] == 1
+
+def test_dns_stats_average():
+    DNS.record_stats('ns1', 0.1, 'wins')
+    DNS.record_stats('ns1', 0.3, '')
+    DNS.record_stats('ns1', 0, 'cancel')
+    DNS.record_stats('ns2', 0, 'cancel')
+
+    stats = DNS.get_dns_stats()
+
+    assert stats['ns1']['queries'] == 2
+    assert stats['ns1']['wins'] == 1
+    assert stats['ns1']['cancel'] == 1
+    assert stats['ns1']['avg'] == pytest.approx(0.2)
+    assert stats['ns1']['max'] == pytest.approx(0.3)
+    assert 'time' not in stats['ns1']
+    assert stats['ns2']['avg'] == 0.0
+
+"""
+| dns_conf(make_conf, nameservers)
+|  Make a DNS mode conf
+|
+| Parameters
+| ----------
+| make_conf : function
+|     make_conf fixture
+| nameservers : str
+|     DNS_Address
+|
+| Return value
+| ------------
+| conf : dict
+"""
+def dns_conf(make_conf, nameservers):
+    conf, dmap, conf_file = make_conf('http://127.0.0.1:1/api/v1',
+                                      {'DNS_Address': nameservers})
+    return conf
+
+# END OF dns_conf()
+
+"""
+| NegAnswer
+|  NXDOMAIN response with SOA in the authority section
+"""
+class NegAnswer:
+    def __init__(self, ttl, minimum):
+        soa = type('SOA', (), {'minimum': minimum})()
+        rrset = type('RRset', (list,), {})([soa])
+        rrset.rdtype = dns.rdatatype.SOA
+        rrset.ttl = ttl
+        self.authority = [rrset]
+
+# END OF NegAnswer
+
+"""
+| nxdomain(ttl, minimum)
+|  Make NXDOMAIN of a response with SOA
+|
+| Parameters
+| ----------
+| ttl : int
+|     TTL of SOA
+| minimum : int
+|     MINIMUM of SOA
+|
+| Return value
+| ------------
+| e : dns.resolver.NXDOMAIN
+"""
+def nxdomain(ttl, minimum):
+    e = dns.resolver.NXDOMAIN()
+    e.responses = lambda: {'pc-1.example.com.': NegAnswer(ttl, minimum)}
+    return e
+
+# END OF nxdomain()
+
+def test_answer_cached_for_ttl(make_conf, monkeypatch):
+    conf = dns_conf(make_conf, '192.0.2.1')
+    servers = {'192.0.2.1': StubResolver(0, StubAnswer(['10.0.0.1'], 60))}
+    stub_servers(monkeypatch, servers)
+
+    assert DNS.get_ipaddr_by_dns(conf, 'pc-1.example.com') == [0, '10.0.0.1']
+    assert DNS.get_ipaddr_by_dns(conf, 'PC-1.example.com') == [0, '10.0.0.1']
+    assert servers['192.0.2.1'].queries == 1
+
+    # expired
+    servers['192.0.2.1'].result = StubAnswer(['10.0.0.2'], 60)
+    DNS.DNS_CACHE[('192.0.2.1', 'pc-1.example.com')][0] = time.time() - 1
+    assert DNS.get_ipaddr_by_dns(conf, 'pc-1.example.com') == [0, '10.0.0.2']
+    assert servers['192.0.2.1'].queries == 2
+
+def test_nxdomain_cached(make_conf, monkeypatch):
+    conf = dns_conf(make_conf, '192.0.2.1')
+    servers = {'192.0.2.1': StubResolver(0, nxdomain(300, 120))}
+    stub_servers(monkeypatch, servers)
+
+    start = time.time()
+    assert DNS.get_ipaddr_by_dns(conf, 'pc-1.example.com')[0] == 1
+    assert DNS.get_ipaddr_by_dns(conf, 'pc-1.example.com')[0] == 1
+    assert servers['192.0.2.1'].queries == 1
+
+    # the smaller of SOA TTL and SOA MINIMUM
+    expire = DNS.DNS_CACHE[('192.0.2.1', 'pc-1.example.com')][0]
+    assert start + 120 <= expire <= time.time() + 120
+
+def test_neg_ttl():
+    assert DNS.neg_ttl(nxdomain(30, 600)) == 30
+    assert DNS.neg_ttl(nxdomain(86400, 86400)) == DNS.DNS_MAX_NEG_TTL
+    # no SOA in the response
+    assert DNS.neg_ttl(dns.resolver.NXDOMAIN()) == DNS.DNS_NEG_TTL
+
+def test_error_not_cached(make_conf, monkeypatch):
+    conf = dns_conf(make_conf, '192.0.2.1')
+    servers = {'192.0.2.1': StubResolver(0, dns.exception.Timeout())}
+    stub_servers(monkeypatch, servers)
+
+    assert DNS.get_ipaddr_by_dns(conf, 'pc-1.example.com')[0] == 2
+    servers['192.0.2.1'].result = StubAnswer(['10.0.0.1'])
+    assert DNS.get_ipaddr_by_dns(conf, 'pc-1.example.com') == [0, '10.0.0.1']
+    assert servers['192.0.2.1'].queries == 2
+
+def test_cache_per_nameserver(make_conf, monkeypatch):
+    servers = {
+        '192.0.2.1': StubResolver(0, StubAnswer(['10.0.0.1'])),
+        '192.0.2.2': StubResolver(0, StubAnswer(['10.0.0.2']))
+    }
+    stub_servers(monkeypatch, servers)
+
+    assert DNS.get_ipaddr_by_dns(dns_conf(make_conf, '192.0.2.1'),
+                                 'pc-1.example.com') == [0, '10.0.0.1']
+    assert DNS.get_ipaddr_by_dns(dns_conf(make_conf, '192.0.2.2'),
+                                 'pc-1.example.com') == [0, '10.0.0.2']
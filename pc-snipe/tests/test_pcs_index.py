@@ -0,0 +1,57 @@
+#
+# test_pcs_index.py
+#  tests of the local asset index against the mock Snipe-IT server
+#
+
+import time
+import sqlite3
+import threading
+
+from lib import common_defs as C
+from lib import pcs_index as IDX
+from lib import snipeit_api as API
+
+def index_conf(snipeit, make_conf, tmp_path):
+    return make_conf(snipeit.url, {
+        'AssetIndexFile'       : str(tmp_path / 'index.db'),
+        'SnipeIT_SearchWindow' : '1'
+    })
+
+def test_search_by_name_builds_index(snipeit, make_conf, tmp_path):
+    conf, dmap, conf_file = index_conf(snipeit, make_conf, tmp_path)
+
+    code, asset = API.search_by_name(conf, 'PC-2', dmap)
+
+    assert code == 0
+    assert asset[C.JSON_ATAG] == 'A000002'
+    db = sqlite3.connect(conf[C.CF_INDEX_FILE])
+    assert db.execute('SELECT count(*) FROM assets').fetchone()[0] == 3
+    assert db.execute('SELECT count(*) FROM assets_build').fetchone()[0] == 0
+
+def test_build_does_not_block_writers(snipeit, make_conf, tmp_path):
+    conf, dmap, conf_file = index_conf(snipeit, make_conf, tmp_path)
+    snipeit.delay = 0.3
+
+    def build():
+        # a connection is used in the thread that opened it
+        db = sqlite3.connect(conf[C.CF_INDEX_FILE], timeout=60,
+                             isolation_level=None)
+        for sql in IDX.INDEX_SCHEMA:
+            db.execute(sql)
+        API.update_index(conf, dmap, db)
+
+    th = threading.Thread(target=build)
+    th.start()
+    time.sleep(0.4)
+
+    # another process stores an asset while the index is being built
+    other = sqlite3.connect(conf[C.CF_INDEX_FILE], timeout=60,
+                            isolation_level=None)
+    start = time.time()
+    assert IDX.store_assets(other, [[9, 'A000009', 'PC-9', '']])
+    assert time.time() - start < 0.2
+
+    # the build is not started twice
+    assert IDX.lock_update(conf) == None
+    th.join()
+    assert IDX.lookup(other, IDX.COL_NAME, 'PC-3') == [3]
@@ -0,0 +1,75 @@
+#
+# test_pcs_journal.py
+#  tests of the write-behind journal against the mock Snipe-IT server
+#
+
+import pytest
+
+pytest.importorskip('pysnmp.hlapi')
+pytest.importorskip('chardet')
+
+from lib import common_defs as C
+from lib import pcs_journal as J
+from lib import pcs_main as M
+
+def test_flush_replays_entries(snipeit, make_conf, tmp_path):
+    conf, dmap, conf_file = make_conf(
+        snipeit.url, {'UpdateJournalFile': str(tmp_path / 'journal.jsonl')})
+    J.append(conf, 1, 'A000001', {'_snipeit_ipaddr_3': '10.0.0.1'})
+    J.append(conf, 1, 'A000001', {'_snipeit_ipaddr_3': '10.0.0.2'})
+
+    code, result = J.flush(conf)
+
+    assert code == 0
+    assert result[C.JSON_REPLAYED] == 1
+    assert snipeit.counts.get('PATCH /hardware/1') == 1
+    cf = snipeit.assets[0]['custom_fields']['IPaddr']
+    assert cf['value'] == '10.0.0.2'
+    assert J.pending(conf, 1) == False
+
+def test_update_queued_behind_pending(snipeit, make_conf, fake_pc,
+                                      tmp_path):
+    conf, dmap, conf_file = make_conf(
+        snipeit.url, {'UpdateJournalFile': str(tmp_path / 'journal.jsonl')})
+    # an older update failed and was queued
+    J.append(conf, 1, 'A000001', {'_snipeit_ipaddr_3': '10.0.0.7'})
+    fake_pc('PC-1', '10.0.0.8')
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    # the newer update is not sent before the older one
+    assert code == C.ERRCODE_QUEUED
+    assert 'PATCH /hardware/1' not in snipeit.counts
+
+    code, result = J.flush(conf)
+
+    assert code == 0
+    assert snipeit.counts.get('PATCH /hardware/1') == 1
+    cf = snipeit.assets[0]['custom_fields']['IPaddr']
+    assert cf['value'] == '10.0.0.8'
+
+def test_update_direct_without_pending(snipeit, make_conf, fake_pc,
+                                       tmp_path):
+    conf, dmap, conf_file = make_conf(
+        snipeit.url, {'UpdateJournalFile': str(tmp_path / 'journal.jsonl')})
+    J.append(conf, 2, 'A000002', {'_snipeit_ipaddr_3': '10.0.0.7'})
+    fake_pc('PC-1')
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    assert code == C.ERRCODE_SUCCESS
+    assert snipeit.counts.get('PATCH /hardware/1') == 1
+
+def test_update_always_queued(snipeit, make_conf, fake_pc, tmp_path):
+    conf, dmap, conf_file = make_conf(
+        snipeit.url, {'UpdateJournalFile': str(tmp_path / 'journal.jsonl'),
+                      'UpdateJournalMode': 'always'})
+    fake_pc('PC-1')
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    # not sent yet ; reported as queued, not as success
+    assert code == C.ERRCODE_QUEUED
+    assert ret_arr[C.JSON_STATUS] == C.ERRCODE_QUEUED
+    assert 'PATCH /hardware/1' not in snipeit.counts
+    assert J.pending(conf, 1) == True
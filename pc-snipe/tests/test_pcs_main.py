@@ -0,0 +1,109 @@
+#
+# test_pcs_main.py
+#  tests of collect() against the mock Snipe-IT server
+#
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+pytest.importorskip('pysnmp.hlapi')
+pytest.importorskip('chardet')
+
+from lib import common_defs as C
+from lib import pcs_main as M
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   '..', 'bin', 'pc-snipe')
+
+def test_collect_updates_asset(snipeit, make_conf, fake_pc):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+    fake_pc('PC-1')
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    assert code == C.ERRCODE_SUCCESS
+    assert ret_arr[C.JSON_STATUS] == C.ERRCODE_SUCCESS
+    assert ret_arr[C.JSON_TAG] == 'A000001'
+    assert snipeit.counts.get('PATCH /hardware/1') == 1
+
+def test_collect_unknown_tag(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'NONE'))
+
+    assert code == C.ERRCODE_NOTAG
+    assert ret_arr[C.JSON_STATUS] == C.ERRCODE_NOTAG
+
+def test_collect_api_unreachable(make_conf):
+    conf, dmap, conf_file = make_conf('http://127.0.0.1:1/api/v1')
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    assert code == C.ERRCODE_SYS_API
+    assert ret_arr[C.JSON_STATUS] == C.ERRCODE_SYS_API
+
+def test_collect_ipaddr_hint(snipeit, make_conf, monkeypatch):
+    conf, dmap, conf_file = make_conf(snipeit.url, {'UseIPaddrHint': 'yes'})
+    snipeit.assets[0]['custom_fields']['IPaddr']['value'] = '10.0.0.9'
+    checked = []
+
+    def check_sysname(conf, ip, comm, computer_name):
+        checked.append(ip)
+        return [1, 'another PC']
+
+    monkeypatch.setattr(M.SNMP, 'check_sysname', check_sysname)
+    monkeypatch.setattr(M.pcs_dns, 'get_ipaddr',
+                        lambda conf, fqdn: [1, 'NXDOMAIN'])
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    assert checked == ['10.0.0.9']
+    assert code == C.ERRCODE_NOIP
+    assert ret_arr[C.JSON_STATUS] == C.ERRCODE_NOIP
+
+def test_collect_ipaddr_hint_resolved(snipeit, make_conf, fake_pc,
+                                      monkeypatch):
+    conf, dmap, conf_file = make_conf(snipeit.url, {'UseIPaddrHint': 'yes'})
+    snipeit.assets[0]['custom_fields']['IPaddr']['value'] = '10.0.0.9'
+    fake_pc('PC-1')
+    checked = []
+
+    def check_sysname(conf, ip, comm, computer_name):
+        checked.append(ip)
+        return [0, {}]
+
+    monkeypatch.setattr(M.SNMP, 'check_sysname', check_sysname)
+    job = M.new_job(M.SMODE_TAG, 'A000001')
+    job['ipaddr'] = '10.0.0.1'
+
+    code, ret_arr = M.collect(conf, dmap, job)
+
+    # the address resolved by the caller is used without the hint check
+    assert checked == []
+    assert code == C.ERRCODE_SUCCESS
+
+def test_command_error_json(make_conf):
+    conf, dmap, conf_file = make_conf('http://127.0.0.1:1/api/v1')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+
+    proc = subprocess.run([sys.executable, BIN, '-c', conf_file,
+                           '-t', 'A000001'],
+                          capture_output=True, text=True, env=env)
+
+    assert proc.returncode == C.ERRCODE_SYS_API
+    assert json.loads(proc.stdout)[C.JSON_STATUS] == C.ERRCODE_SYS_API
+
+def test_collect_skips_unchanged(snipeit, make_conf, fake_pc):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+    snipeit.assets[0]['custom_fields']['IPaddr']['value'] = '10.0.0.1'
+    fake_pc('PC-1')
+
+    code, ret_arr = M.collect(conf, dmap, M.new_job(M.SMODE_TAG, 'A000001'))
+
+    assert code == C.ERRCODE_SUCCESS
+    assert 'PATCH /hardware/1' not in snipeit.counts
+    assert snipeit.counts['/fieldsets'] == 1
@@ -0,0 +1,45 @@
+#
+# test_pcs_rate.py
+#  tests of the rate limiter of Snipe-IT API calls
+#
+
+import os
+import time
+
+from lib import common_defs as C
+from lib import pcs_rate as RATE
+
+def make_rate_conf(tmp_path, rate):
+    return {
+        C.CF_API_RATE     : str(rate),
+        C.CF_API_RATEFILE : str(tmp_path / 'pc-snipe.rate')
+    }
+
+def test_no_limit_uses_no_file(tmp_path):
+    conf = make_rate_conf(tmp_path, 0)
+
+    RATE.acquire(conf)
+    RATE.hold(conf, 0.2)
+    start = time.time()
+    RATE.acquire(conf)
+
+    # held in this process only
+    assert time.time() - start >= 0.15
+    assert not os.path.exists(conf[C.CF_API_RATEFILE])
+
+def test_limit_shares_state_file(tmp_path):
+    conf = make_rate_conf(tmp_path, 600)
+
+    RATE.acquire(conf)
+
+    assert os.path.isfile(conf[C.CF_API_RATEFILE])
+
+def test_state_file_symlink_not_followed(tmp_path):
+    conf = make_rate_conf(tmp_path, 600)
+    target = tmp_path / 'target'
+    target.write_text('keep\n')
+    os.symlink(target, conf[C.CF_API_RATEFILE])
+
+    RATE.acquire(conf)
+
+    assert target.read_text() == 'keep\n'
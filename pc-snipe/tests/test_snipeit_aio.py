@@ -0,0 +1,167 @@
+#
+# test_snipeit_aio.py
+#  tests of the asyncio API client against the mock Snipe-IT server
+#
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+from lib import common_defs as C
+from lib import pcs_rate as RATE
+from lib import snipeit_aio as AIO
+
+"""
+| run(conf, func)
+|  Run func(client) with a client opened in a new event loop
+|
+| Parameters
+| ----------
+| conf : dict
+|     configuration dictionary
+| func : coroutine function
+|     takes the client made by open_client()
+|
+| Return value
+| ------------
+| the return value of func
+"""
+def run(conf, func):
+    async def main():
+        code, client = await AIO.open_client(conf)
+        assert code == 0, client
+        try:
+            return await func(client)
+        finally:
+            await AIO.close_client(client)
+
+    return asyncio.run(main())
+
+# END OF run()
+
+@pytest.fixture(autouse=True)
+def no_hold(monkeypatch):
+    """Retry-After holds of a test do not delay the next one"""
+    monkeypatch.setattr(RATE, 'HOLD', {'until': 0.0})
+
+def test_search_by_tag(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+
+    async def func(client):
+        return await asyncio.gather(AIO.search_by_tag(client, 'A000002', dmap),
+                                    AIO.search_by_tag(client, 'NONE', dmap))
+
+    found, missing = run(conf, func)
+
+    assert found[0] == 0
+    assert found[1][C.JSON_ATAG] == 'A000002'
+    assert found[1][C.JSON_COMPUTERNAME] == 'PC-2'
+    assert missing[0] == 1
+
+def test_search_by_name(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url,
+                                      {'SnipeIT_SearchWindow': '1'})
+
+    async def func(client):
+        return await asyncio.gather(AIO.search_by_name(client, 'PC-3', dmap),
+                                    AIO.search_by_name(client, 'PC-9', dmap))
+
+    found, missing = run(conf, func)
+
+    assert found[0] == 0
+    assert found[1][C.JSON_ATAG] == 'A000003'
+    assert missing == [1, 'Asset not found']
+
+def test_search_by_col(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url,
+                                      {'SnipeIT_SearchWindow': '1'})
+    snipeit.assets[1]['custom_fields']['AutoCollect']['value'] = 'no'
+    snipeit.assets[2]['custom_fields']['Community']['value'] = 'yes'
+
+    code, rows = run(conf, lambda client:
+                     AIO.search_by_col(client, 'AutoCollect', 'yes'))
+
+    # pages are fetched at the same time and kept in the order of offset ;
+    # rows matched by other fields are dropped
+    assert code == 0
+    assert [row[C.JSON_ATAG] for row in rows] == ['A000001', 'A000003']
+    assert snipeit.counts['/hardware'] == 2
+
+def test_update_snipeit(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+    patch = {'_snipeit_ipaddr_3': '10.0.0.5'}
+
+    async def func(client):
+        return await asyncio.gather(AIO.update_snipeit(client, 1, patch),
+                                    AIO.update_snipeit(client, 99, patch))
+
+    updated, missing = run(conf, func)
+
+    assert updated == [0, '']
+    assert snipeit.assets[0]['custom_fields']['IPaddr']['value'] == \
+        '10.0.0.5'
+    assert missing[0] == 1
+
+def test_concurrency_cap(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url,
+                                      {'SnipeIT_API_PoolSize': '2'})
+    snipeit.delay = 0.1
+
+    async def func(client):
+        return await asyncio.gather(
+            *[AIO.search_by_tag(client, 'A00000' + str(n % 3 + 1), dmap)
+              for n in range(6)])
+
+    results = run(conf, func)
+
+    assert [code for code, data in results] == [0] * 6
+    assert snipeit.peak == 2
+
+def test_throttle_retry(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url,
+                                      {'SnipeIT_API_Retries': '3'})
+    snipeit.throttle = [1, 1]
+
+    async def func(client):
+        return await asyncio.gather(
+            *[AIO.search_by_tag(client, tag, dmap)
+              for tag in ['A000001', 'A000002']])
+
+    results = run(conf, func)
+
+    # the throttled request waits for Retry-After and succeeds
+    assert [code for code, data in results] == [0, 0]
+    assert snipeit.counts['429'] >= 1
+    assert snipeit.counts['/hardware/bytag/A000001'] == 1
+    assert snipeit.counts['/hardware/bytag/A000002'] == 1
+
+def test_throttle_no_retry(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+    snipeit.throttle = [0, 1]
+
+    code, err_msg = run(conf, lambda client:
+                        AIO.search_by_tag(client, 'A000001', dmap))
+
+    assert code == 2
+    assert snipeit.counts['429'] == 1
+
+def test_connection_retry(make_conf):
+    conf, dmap, conf_file = make_conf('http://127.0.0.1:1/api/v1',
+                                      {'SnipeIT_API_Retries': '1'})
+
+    code, err_msg = run(conf, lambda client:
+                        AIO.search_by_tag(client, 'A000001', dmap))
+
+    assert code == 2
+    assert err_msg.startswith('Cannot connect Snipe-IT API')
+
+def test_without_aiohttp(make_conf, monkeypatch):
+    conf, dmap, conf_file = make_conf('http://127.0.0.1:1/api/v1')
+    monkeypatch.setattr(AIO, 'HAVE_AIOHTTP', False)
+
+    code, err_msg = asyncio.run(AIO.open_client(conf))
+
+    assert code == 2
+    assert err_msg == 'aiohttp is not installed'
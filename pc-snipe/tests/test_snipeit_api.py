@@ -0,0 +1,99 @@
+#
+# test_snipeit_api.py
+#  tests of the Snipe-IT API client against the mock server
+#
+
+import sys
+import concurrent.futures
+
+from lib import common_defs as C
+from lib import snipeit_api as API
+
+def test_search_by_tag(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+
+    code, asset = API.search_by_tag(conf, 'A000002', dmap)
+
+    assert code == 0
+    assert asset[C.JSON_ID] == 2
+    assert asset[C.JSON_COMPUTERNAME] == 'PC-2'
+
+def test_search_by_name(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+
+    code, asset = API.search_by_name(conf, 'PC-3', dmap)
+
+    assert code == 0
+    assert asset[C.JSON_ATAG] == 'A000003'
+
+def test_stderr_restored_by_threads(snipeit, make_conf):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+    snipeit.delay = 0.01
+    stderr = sys.stderr
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(API.update_snipeit, conf, 1 + i % 3,
+                                   {'_snipeit_ipaddr_3': str(i)})
+                   for i in range(48)]
+        codes = [f.result()[0] for f in futures]
+
+    assert codes == [0] * 48
+    assert sys.stderr is stderr
+
+def test_get_schema_cached(snipeit, make_conf, monkeypatch):
+    conf, dmap, conf_file = make_conf(snipeit.url)
+    monkeypatch.setattr(API, 'SCHEMA', {})
+
+    code, models = API.get_schema(conf)
+
+    assert code == 0
+    assert models['1']['IPaddr'] == '_snipeit_ipaddr_3'
+
+    # another process reads the cache file
+    monkeypatch.setattr(API, 'SCHEMA', {})
+    assert API.get_schema(conf) == [0, models]
+    assert snipeit.counts['/fieldsets'] == 1
+
+def test_patch_by_fieldset_of_model(snipeit):
+    raw = snipeit.assets[0]
+    del raw['custom_fields']['IPaddr']
+    before = {C.JSON_RAW: raw}
+    after = {C.JSON_CFIELD: {'IPaddr': '10.0.0.1', 'AutoCollect': 'yes',
+                             'ComputerInfo': 'Windows 10'}}
+    dmap = {'IPaddr': 'IPaddr', 'AutoCollect': 'AutoCollect',
+            'ComputerInfo': 'ComputerInfo'}
+    schema = {'1': {'IPaddr': '_snipeit_ipaddr_3',
+                    'AutoCollect': '_snipeit_autocollect_4'}}
+    stats = {}
+
+    patch = API.make_snipeit_json(dmap, before, after, stats, schema)
+
+    # IPaddr is in the fieldset but not in the record, AutoCollect is
+    # unchanged, ComputerInfo is not in the fieldset
+    assert patch == {'_snipeit_ipaddr_3': '10.0.0.1'}
+    assert stats[C.JSON_UNCHANGED] == 1
+
+def test_patch_only_fieldset_of_asset(snipeit):
+    before = {C.JSON_RAW: snipeit.assets[0]}
+    after = {C.JSON_CFIELD: {'IPaddr': '', 'ComputerInfo': 'Windows 10'}}
+    dmap = {'IPaddr': 'IPaddr', 'ComputerInfo': 'ComputerInfo'}
+    stats = {}
+
+    # the model is not in schema ; columns are taken from the record
+    patch = API.make_snipeit_json(dmap, before, after, stats, {})
+
+    assert patch == {}
+    assert stats[C.JSON_UNCHANGED] == 1
+
+def test_patch_by_schema_without_custom_fields():
+    before = {C.JSON_RAW: {'id': 1, 'asset_tag': 'A000001',
+                           'model': {'id': 1}}}
+    after = {C.JSON_CFIELD: {'IPaddr': '10.0.0.1'}}
+    dmap = {'IPaddr': 'IPaddr'}
+
+    assert API.make_snipeit_json(dmap, before, after) == False
+    assert API.make_snipeit_json(dmap, before, after,
+                                 schema={'2': {'IPaddr': 'x'}}) == False
+    patch = API.make_snipeit_json(dmap, before, after,
+                                  schema={'1': {'IPaddr': '_snipeit_ipaddr_3'}})
+    assert patch == {'_snipeit_ipaddr_3': '10.0.0.1'}
@@ -0,0 +1,156 @@
+#
+# bench_aio.py
+#  compare snipeit_api and snipeit_aio against mock_snipeit
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import time
+import asyncio
+import tempfile
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+sys.path.append(os.path.dirname(__file__))
+
+from lib import common_defs as C
+from lib import snipeit_api as API
+from lib import snipeit_aio as AIO
+import mock_snipeit as M
+import bench_search_by_name as B
+
+#
+# constant definision
+#
+NUM_ASSETS = 500
+NUM_TAGS = 100
+# response time of the mock API (seconds)
+DELAY = 0.02
+
+DMAP = {
+    C.DMAP_COMPUTERNAME : 'ComputerName',
+    C.DMAP_COMMUNITY    : 'Community'
+}
+
+"""
+| run_sync(conf, tags):
+|  Search assets by tag and patch them with snipeit_api
+|
+| Parameters
+| ----------
+| conf : dict
+| tags : list
+|
+| Return value
+| ------------
+| results : list
+|     [asset tag, ComputerName, code of update] of each asset
+"""
+def run_sync(conf, tags):
+    results = []
+    for tag in tags:
+        code, before = API.search_by_tag(conf, tag, DMAP)
+        ucode, msg = API.update_snipeit(conf, before[C.JSON_ID],
+                                        {'_snipeit_ipaddr_3': tag})
+        results.append([tag, before[C.JSON_COMPUTERNAME], ucode])
+    return results
+
+# END OF run_sync()
+
+"""
+| run_async(conf, tags):
+|  Search assets by tag and patch them with snipeit_aio
+|
+| Parameters
+| ----------
+| conf : dict
+| tags : list
+|
+| Return value
+| ------------
+| results : list
+|     same as run_sync()
+"""
+async def run_async(conf, tags):
+    code, client = await AIO.open_client(conf)
+    if code != 0:
+        print(client)
+        sys.exit(1)
+
+    async def one(tag):
+        code, before = await AIO.search_by_tag(client, tag, DMAP)
+        ucode, msg = await AIO.update_snipeit(client, before[C.JSON_ID],
+                                              {'_snipeit_ipaddr_3': tag})
+        return [tag, before[C.JSON_COMPUTERNAME], ucode]
+
+    try:
+        results = await asyncio.gather(*[one(tag) for tag in tags])
+        # other operations
+        code, asset = await AIO.search_by_name(client, 'PC-00042', DMAP)
+        print('search_by_name: {} {}'.format(code, asset[C.JSON_ATAG]))
+        code, rows = await AIO.search_by_col(client, 'AutoCollect', 'yes')
+        print('search_by_col: {} {} rows'.format(code, len(rows)))
+    finally:
+        await AIO.close_client(client)
+    return results
+
+# END OF run_async()
+
+#
+# Main
+#
+if __name__ == '__main__':
+    names = []
+    for i in range(NUM_ASSETS):
+        names.append(f"PC-{i:05d}")
+    server, url = M.start_server(M.make_assets(names))
+    server.delay = DELAY
+
+    tags = []
+    for i in range(NUM_TAGS):
+        tags.append(f"A{i + 1:06d}")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        keyfile = os.path.join(tmpdir, 'api.key')
+        with open(keyfile, 'w') as f:
+            f.write('mock-api-key\n')
+        conf = B.make_conf(url, keyfile, '')
+        conf[C.CF_API_RATEFILE] = os.path.join(tmpdir, 'rate')
+
+        start = time.time()
+        sync_res = run_sync(conf, tags)
+        print('snipeit_api: {:.2f}s'.format(time.time() - start))
+
+        start = time.time()
+        aio_res = asyncio.run(run_async(conf, tags))
+        print('snipeit_aio: {:.2f}s (concurrency {})'.format(
+            time.time() - start, conf[C.CF_API_POOLSIZE]))
+
+    print('same results: {}'.format(sync_res == aio_res))
+    server.shutdown()
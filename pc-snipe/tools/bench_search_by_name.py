@@ -0,0 +1,127 @@
+#
+# bench_search_by_name.py
+#  count API requests of search_by_name() against mock_snipeit
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import os
+import time
+import tempfile
+
+#
+# import from our library
+#
+myprefix = os.path.join(os.path.dirname(__file__), '..')
+sys.path.append(myprefix)
+sys.path.append(os.path.dirname(__file__))
+
+from lib import common_defs as C
+from lib import snipeit_api as API
+import mock_snipeit as M
+
+#
+# constant definision
+#
+NUM_ASSETS = 2000
+WINDOW = '50'
+
+# ComputerName to search
+#  PC-0 matches all assets with free-text search
+TARGETS = ['PC-0', 'PC-00010', 'PC-01990', 'NO-SUCH-PC']
+
+"""
+| make_conf(url, keyfile, sort):
+|  Make configuration dictionary for the mock server
+|
+| Parameters
+| ----------
+| url : str
+|     API URL of the mock server
+| keyfile : str
+|     path to API key file
+| sort : str
+|     SnipeIT_NameSortColumn
+|
+| Return value
+| ------------
+| conf : dict
+"""
+def make_conf(url, keyfile, sort):
+    return {
+        C.CF_API_URL           : url,
+        C.CF_API_TIMEO         : C.DEF_APITIMEO,
+        C.CF_KEYFILE           : keyfile,
+        C.CF_DEFAULT_COMM      : C.DEF_DEFAULTCOMM,
+        C.CF_SIT_SEARCH_WINDOW : WINDOW,
+        C.CF_API_POOLSIZE      : C.DEF_API_POOLSIZE,
+        C.CF_API_RETRIES       : C.DEF_API_RETRIES,
+        C.CF_SIT_NAME_SORT     : sort,
+        C.CF_INDEX_FILE        : C.DEF_INDEX_FILE,
+        C.CF_INDEX_REFRESH     : C.DEF_INDEX_REFRESH,
+        C.CF_API_RATE          : C.DEF_API_RATE,
+        C.CF_API_RATEFILE      : C.DEF_API_RATEFILE,
+        C.CF_FIELD_CACHE       : C.DEF_FIELD_CACHE,
+        C.CF_FIELD_CACHE_TTL   : C.DEF_FIELD_CACHE_TTL,
+    }
+
+# END OF make_conf()
+
+#
+# Main
+#
+if __name__ == '__main__':
+    # assets are registered in reverse order of the name,
+    # so PC-0 is the last one in default order
+    names = []
+    for i in range(NUM_ASSETS):
+        names.append(f"PC-{i:05d}")
+    names.reverse()
+    names.append('PC-0')
+
+    server, url = M.start_server(M.make_assets(names))
+    dmap = {C.DMAP_COMPUTERNAME: 'ComputerName'}
+
+    with tempfile.NamedTemporaryFile('w', suffix='.key') as keyfile:
+        keyfile.write('mock-api-key\n')
+        keyfile.flush()
+
+        for sort in ['', M.CFIELDS['ComputerName']]:
+            conf = make_conf(url, keyfile.name, sort)
+            print('SnipeIT_NameSortColumn=' + sort)
+            for name in TARGETS:
+                server.counts = {}
+                start = time.time()
+                code, data = API.search_by_name(conf, name, dmap)
+                elapsed = time.time() - start
+                if code == 0:
+                    result = data[C.JSON_ATAG]
+                else:
+                    result = data
+                print('  {:<12} {:>4} requests {:8.3f}s  {}'.format(
+                    name, server.counts.get('/hardware', 0), elapsed,
+                    result))
+
+    server.shutdown()
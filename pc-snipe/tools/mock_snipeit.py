@@ -0,0 +1,410 @@
+#
+# mock_snipeit.py
+#  local mock of Snipe-IT hardware API for benchmarks and tests
+#
+
+"""
+    pc-snipe
+        A core program of Snipe-PCView software suit
+
+    Copyright (C) 2023  DesigNET, INC.
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+#
+# import from system library
+#
+import sys
+import time
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#
+# constant definision
+#
+API_PREFIX = '/api/v1'
+
+# custom fields of mock assets
+#  display name : db column
+CFIELDS = {
+    'ComputerName' : '_snipeit_computername_1',
+    'Community'    : '_snipeit_community_2',
+    'IPaddr'       : '_snipeit_ipaddr_3',
+    'AutoCollect'  : '_snipeit_autocollect_4'
+}
+
+# model of mock assets (its fieldset has all CFIELDS)
+MODEL = {'id' : 1, 'name' : 'Mock PC'}
+
+"""
+| make_assets(names, autocol='yes'):
+|  Make asset records in the format of Snipe-IT API
+|
+| Parameters
+| ----------
+| names : list
+|     ComputerName of each asset
+| autocol : str
+|     value of AutoCollect custom field
+|
+| Return value
+| ------------
+| assets : list
+|     asset records (id and asset tag are numbered from 1)
+"""
+def make_assets(names, autocol='yes'):
+    assets = []
+    num = 0
+    for name in names:
+        num += 1
+        values = {
+            'ComputerName' : name,
+            'Community'    : 'public',
+            'IPaddr'       : '',
+            'AutoCollect'  : autocol
+        }
+        cfields = {}
+        for fname, column in CFIELDS.items():
+            cfields[fname] = {
+                'field'        : column,
+                'value'        : values[fname],
+                'field_format' : 'ANY'
+            }
+        assets.append({
+            'id'            : num,
+            'asset_tag'     : f"A{num:06d}",
+            'name'          : name,
+            'model'         : dict(MODEL),
+            'custom_fields' : cfields,
+            'updated_at'    : {
+                'datetime'  : f"2023-01-01 00:00:{num % 60:02d}",
+                'formatted' : f"2023-01-01 00:00:{num % 60:02d}"
+            }
+        })
+    return assets
+
+# END OF make_assets()
+
+"""
+| match_asset(asset, search):
+|  Full-text search of an asset (case insensitive substring match)
+|
+| Parameters
+| ----------
+| asset : dict
+|     asset record
+| search : str
+|     search word
+|
+| Return value
+| ------------
+| True if matched
+"""
+def match_asset(asset, search):
+    if search == '':
+        return True
+    word = search.casefold()
+    texts = [asset['asset_tag'], asset['name']]
+    for cf in asset['custom_fields'].values():
+        texts.append(str(cf['value']))
+    for text in texts:
+        if word in text.casefold():
+            return True
+    return False
+
+# END OF match_asset()
+
+"""
+| filter_asset(asset, afilter):
+|  Filter an asset by columns (substring match like Snipe-IT)
+|
+| Parameters
+| ----------
+| asset : dict
+|     asset record
+| afilter : dict
+|     column : value
+|
+| Return value
+| ------------
+| True if matched
+"""
+def filter_asset(asset, afilter):
+    for column, value in afilter.items():
+        if str(value).casefold() not in str(sort_value(asset, column)).casefold():
+            return False
+    return True
+
+# END OF filter_asset()
+
+"""
+| sort_value(asset, column):
+|  Get the value of an asset to sort by
+|
+| Parameters
+| ----------
+| asset : dict
+|     asset record
+| column : str
+|     column name or db column of custom field
+|
+| Return value
+| ------------
+| value : str / int
+"""
+def sort_value(asset, column):
+    for cf in asset['custom_fields'].values():
+        if cf['field'] == column:
+            return str(cf['value'])
+    try:
+        value = asset[column]
+    except KeyError:
+        return ''
+    if isinstance(value, dict):
+        # date and time
+        return value['datetime']
+    return value
+
+# END OF sort_value()
+
+"""
+| MockHandler
+|  Request handler of the mock API
+|  Requests are counted in server.counts[path].
+"""
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # be quiet
+        return
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def wait(self):
+        # response delay ; the peak of requests in it is kept
+        with self.server.lock:
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.active -= 1
+
+    def count(self, path):
+        with self.server.lock:
+            try:
+                self.server.counts[path] += 1
+            except KeyError:
+                self.server.counts[path] = 1
+
+    def throttled(self):
+        # fixed window throttle like Snipe-IT (server.throttle=[limit, sec])
+        if self.server.throttle == None:
+            return False
+        limit, window = self.server.throttle
+        now = time.time()
+        with self.server.lock:
+            if now >= self.server.window[0] + window:
+                self.server.window = [now, 0]
+            self.server.window[1] += 1
+            if self.server.window[1] <= limit:
+                return False
+            self.server.counts['429'] = self.server.counts.get('429', 0) + 1
+            wait = int(self.server.window[0] + window - now) + 1
+        body = b'{"message":"Too Many Requests"}'
+        self.send_response(429)
+        self.send_header('Retry-After', str(wait))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def find_asset(self, key, value):
+        for asset in self.server.assets:
+            if str(asset[key]) == value:
+                return asset
+        return None
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path[len(API_PREFIX):]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if self.throttled():
+            return
+        self.wait()
+        self.count(path)
+
+        if path in ['/fields', '/fieldsets']:
+            rows = []
+            num = 0
+            for fname, column in CFIELDS.items():
+                num += 1
+                rows.append({
+                    'id'             : num,
+                    'name'           : fname,
+                    'db_column_name' : column
+                })
+            if path == '/fieldsets':
+                rows = [{
+                    'id'     : 1,
+                    'name'   : 'Mock fieldset',
+                    'fields' : {'total' : len(rows), 'rows' : rows},
+                    'models' : {'total' : 1, 'rows' : [dict(MODEL)]}
+                }]
+            self.send_json({'total' : len(rows), 'rows' : rows})
+            return
+
+        if path == '/hardware':
+            afilter = json.loads(query.get('filter', '{}'))
+            for column in afilter.keys():
+                if column not in CFIELDS.values():
+                    self.send_json({
+                        'status'   : 'error',
+                        'messages' : 'Invalid filter column'
+                    })
+                    return
+            rows = []
+            for asset in self.server.assets:
+                if match_asset(asset, query.get('search', '')) and \
+                   filter_asset(asset, afilter):
+                    rows.append(asset)
+            if 'sort' in query:
+                rev = query.get('order', 'asc') == 'desc'
+                rows.sort(key=lambda a: sort_value(a, query['sort']),
+                          reverse=rev)
+            offset = int(query.get('offset', 0))
+            limit = int(query.get('limit', 50))
+            self.send_json({
+                'total' : len(rows),
+                'rows'  : rows[offset:offset + limit]
+            })
+            return
+
+        if path.startswith('/hardware/bytag/'):
+            asset = self.find_asset('asset_tag', path.split('/')[-1])
+        elif path.startswith('/hardware/'):
+            asset = self.find_asset('id', path.split('/')[-1])
+        else:
+            self.send_json({'status': 'error', 'messages': 'Not found'}, 404)
+            return
+
+        if asset == None:
+            self.send_json({
+                'status'   : 'error',
+                'messages' : 'Asset does not exist.'
+            })
+            return
+        self.send_json(asset)
+
+    def do_PATCH(self):
+        url = urllib.parse.urlsplit(self.path)
+        path = url.path[len(API_PREFIX):]
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.throttled():
+            return
+        self.wait()
+        self.count('PATCH ' + path)
+
+        patch = json.loads(body or b'{}')
+        asset = self.find_asset('id', path.split('/')[-1])
+        if asset == None:
+            self.send_json({
+                'status'   : 'error',
+                'messages' : 'Asset does not exist.'
+            })
+            return
+
+        for cf in asset['custom_fields'].values():
+            if cf['field'] in patch:
+                cf['value'] = patch[cf['field']]
+        self.send_json({
+            'status'   : 'success',
+            'messages' : 'Asset updated successfully.',
+            'payload'  : asset
+        })
+
+# END OF MockHandler
+
+"""
+| start_server(assets, port=0):
+|  Start mock API server in a background thread
+|
+| Parameters
+| ----------
+| assets : list
+|     asset records from make_assets()
+| port : int
+|     TCP port to listen (0: any free port)
+|
+| Return value
+| ------------
+| [server, url]
+| server : ThreadingHTTPServer
+|     server.counts holds the number of requests of each path
+|     server.throttle = [limit, seconds] enables 429 responses
+|     server.delay = seconds delays each response
+|     server.peak is the most requests seen in the delay at once
+| url : str
+|     API URL (SnipeIT_API_URL)
+"""
+def start_server(assets, port=0):
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockHandler)
+    server.daemon_threads = True
+    server.assets = assets
+    server.counts = {}
+    server.lock = threading.Lock()
+    server.throttle = None
+    server.delay = 0
+    server.active = 0
+    server.peak = 0
+    server.window = [0, 0]
+    th = threading.Thread(target=server.serve_forever, daemon=True)
+    th.start()
+    url = 'http://127.0.0.1:{}{}'.format(server.server_address[1],
+                                         API_PREFIX)
+    return [server, url]
+
+# END OF start_server()
+
+#
+# Main
+#  run the mock server in foreground: mock_snipeit.py [PORT [ASSETS]]
+#
+if __name__ == '__main__':
+    port = 8080
+    num = 1000
+    if len(sys.argv) > 1:
+        port = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        num = int(sys.argv[2])
+    names = []
+    for i in range(num):
+        names.append(f"PC-{i:05d}")
+    server, url = start_server(make_assets(names), port)
+    print('Mock Snipe-IT API: ' + url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()